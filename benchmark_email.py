@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark do envio de emails em massa do MEIControl
+Sobe um servidor SMTP local (aiosmtpd) com latência simulada e mede mensagens/s
+do envio com threads (PoolSMTP) e com o motor asyncio (MotorEmailAsync)
+
+Uso: python benchmark_email.py [--mensagens 2000] [--latencia-ms 20] [--motor threads|asyncio|ambos]
+"""
+
+import argparse
+import asyncio
+import time
+
+from aiosmtpd.controller import Controller
+
+from src.config import Config
+
+DOMINIOS = ['gmail.com', 'hotmail.com', 'yahoo.com.br', 'uol.com.br']
+
+class ServidorSMTPLento:
+    """Aceita e descarta as mensagens, esperando `latencia` segundos em cada DATA"""
+    
+    def __init__(self, latencia):
+        self.latencia = latencia
+        self.recebidas = 0
+        self.conexoes = 0
+    
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.conexoes += 1
+        session.host_name = hostname
+        return responses
+    
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latencia)
+        self.recebidas += 1
+        return '250 OK'
+
+def configurar_smtp(porta, motor):
+    """Aponta o envio para o servidor local, sem TLS nem autenticação"""
+    Config.SMTP_SERVER = '127.0.0.1'
+    Config.SMTP_PORT = porta
+    Config.SMTP_USE_TLS = False
+    Config.SMTP_AUTENTICAR = False
+    Config.EMAIL_MOTOR = motor
+
+def executar(motor, quantidade, latencia, porta):
+    configurar_smtp(porta, motor)
+    from src.services.email import enviar_lote_emails
+    
+    servidor = ServidorSMTPLento(latencia)
+    controller = Controller(servidor, hostname='127.0.0.1', port=porta)
+    controller.start()
+    try:
+        mensagens = [
+            (i, f'usuario{i}@{DOMINIOS[i % len(DOMINIOS)]}', 'Benchmark', '<p>Teste de envio</p>')
+            for i in range(quantidade)
+        ]
+        inicio = time.perf_counter()
+        erros = enviar_lote_emails(mensagens)
+        duracao = time.perf_counter() - inicio
+    finally:
+        controller.stop()
+    
+    print(f"{motor:8} {quantidade} mensagens em {duracao:.2f}s = {quantidade / duracao:.1f} mensagens/s "
+          f"(falhas: {len(erros)}, recebidas: {servidor.recebidas}, conexões: {servidor.conexoes})")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do envio de emails em massa')
+    parser.add_argument('--mensagens', type=int, default=2000)
+    parser.add_argument('--latencia-ms', type=float, default=20)
+    parser.add_argument('--motor', choices=['threads', 'asyncio', 'ambos'], default='ambos')
+    parser.add_argument('--porta', type=int, default=8025)
+    args = parser.parse_args()
+    
+    print(f"Latência simulada do servidor: {args.latencia_ms}ms por mensagem")
+    print(f"Threads: {Config.EMAIL_THREADS} (pool de {Config.EMAIL_POOL_CONEXOES} conexões); "
+          f"asyncio: {Config.EMAIL_CONCORRENCIA} workers, {Config.EMAIL_CONEXOES_POR_DOMINIO} por domínio")
+    
+    motores = ['threads', 'asyncio'] if args.motor == 'ambos' else [args.motor]
+    for indice, motor in enumerate(motores):
+        executar(motor, args.mensagens, args.latencia_ms / 1000, args.porta + indice)
+
+if __name__ == "__main__":
+    main()
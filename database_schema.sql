@@ -18,10 +18,13 @@ CREATE TABLE IF NOT EXISTS users (
     categoria_mei VARCHAR(50) NOT NULL CHECK (categoria_mei IN ('comercio', 'servicos', 'industria', 'outros')),
     data_abertura DATE,
     plano VARCHAR(20) DEFAULT 'basico' CHECK (plano IN ('basico', 'avancado')),
-    status_pagamento VARCHAR(20) DEFAULT 'ativo' CHECK (status_pagamento IN ('ativo', 'inadimplente', 'cancelado')),
+    status_pagamento VARCHAR(20) DEFAULT 'ativo' CHECK (status_pagamento IN ('ativo', 'inadimplente', 'cancelado', 'vencido')),
     data_vencimento DATE,
+    stripe_customer_id VARCHAR(255) UNIQUE,
+    stripe_ultimo_evento INTEGER,
     is_admin BOOLEAN DEFAULT FALSE,
     is_active BOOLEAN DEFAULT TRUE,
+    versao_dados INTEGER NOT NULL DEFAULT 0,
     configuracoes_notificacao JSONB DEFAULT '{}',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -89,11 +92,145 @@ CREATE TABLE IF NOT EXISTS relatorios_mensais (
     UNIQUE(user_id, mes, ano)
 );
 
+-- Sugestões de associação nota fiscal x receita/despesa (mantidas a cada escrita)
+CREATE TABLE IF NOT EXISTS sugestoes_associacao (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    nota_fiscal_id INTEGER NOT NULL REFERENCES notas_fiscais(id) ON DELETE CASCADE,
+    tipo VARCHAR(20) NOT NULL CHECK (tipo IN ('receita', 'despesa')),
+    item_id INTEGER NOT NULL,
+    confianca INTEGER NOT NULL,
+    diff_dias INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_sugestoes_associacao_par UNIQUE(nota_fiscal_id, tipo, item_id)
+);
+
+-- Chaves de idempotência (header Idempotency-Key) das operações de escrita
+CREATE TABLE IF NOT EXISTS chaves_idempotencia (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    chave VARCHAR(255) NOT NULL,
+    rota VARCHAR(200) NOT NULL,
+    impressao VARCHAR(64),
+    status_code INTEGER,
+    resposta TEXT,
+    mimetype VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expira_em TIMESTAMP NOT NULL,
+    CONSTRAINT uq_chaves_idempotencia_user_chave UNIQUE(user_id, chave)
+);
+
+-- Refresh tokens (rotação por família) e revogações de access tokens
+CREATE TABLE IF NOT EXISTS refresh_tokens (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    jti VARCHAR(36) UNIQUE NOT NULL,
+    familia VARCHAR(36) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expira_em TIMESTAMP NOT NULL,
+    usado_em TIMESTAMP,
+    revogado BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS revogacoes_token (
+    id SERIAL PRIMARY KEY,
+    jti VARCHAR(36),
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    revogado_antes INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expira_em TIMESTAMP NOT NULL
+);
+
+-- Caixa de entrada dos eventos do webhook do Stripe (processados em lote)
+CREATE TABLE IF NOT EXISTS eventos_stripe (
+    id SERIAL PRIMARY KEY,
+    stripe_id VARCHAR(255) UNIQUE NOT NULL,
+    tipo VARCHAR(100) NOT NULL,
+    payload TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente' CHECK (status IN ('pendente', 'processado', 'erro')),
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    erro TEXT,
+    recebido_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    processado_em TIMESTAMP
+);
+
+-- Uso mensal dos recursos limitados por plano (ex.: notas_fiscais)
+CREATE TABLE IF NOT EXISTS uso_quotas (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    recurso VARCHAR(50) NOT NULL,
+    periodo VARCHAR(7) NOT NULL,
+    quantidade INTEGER NOT NULL DEFAULT 0 CHECK (quantidade >= 0),
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_uso_quotas_user_recurso_periodo UNIQUE(user_id, recurso, periodo)
+);
+
+-- Outbox das notificações por email (histórico de entrega e retentativas)
+CREATE TABLE IF NOT EXISTS notificacoes_outbox (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    tipo VARCHAR(50) NOT NULL,
+    periodo VARCHAR(30) NOT NULL,
+    destinatario VARCHAR(255) NOT NULL,
+    assunto VARCHAR(255) NOT NULL,
+    corpo TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente' CHECK (status IN ('pendente', 'enviando', 'enviado', 'falhou')),
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    proxima_tentativa_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    bloqueado_em TIMESTAMP,
+    ultimo_erro TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    enviado_em TIMESTAMP,
+    CONSTRAINT uq_notificacoes_outbox_user_tipo_periodo UNIQUE(user_id, tipo, periodo)
+);
+
+-- Estado das obrigações por usuário e ano (bit mes-1 = relatório mensal gerado)
+CREATE TABLE IF NOT EXISTS estado_obrigacoes (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    ano INTEGER NOT NULL,
+    meses_entregues INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_estado_obrigacoes_user_ano UNIQUE(user_id, ano)
+);
+
+-- Tarefas periódicas do agendador (lease garante uma execução por vez entre workers)
+CREATE TABLE IF NOT EXISTS tarefas_agendadas (
+    nome VARCHAR(100) PRIMARY KEY,
+    proxima_execucao TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    bloqueado_ate TIMESTAMP,
+    dono VARCHAR(255),
+    ultima_execucao TIMESTAMP,
+    ultima_duracao_ms INTEGER,
+    ultimo_resultado VARCHAR(255),
+    ultimo_erro TEXT,
+    execucoes INTEGER NOT NULL DEFAULT 0,
+    falhas INTEGER NOT NULL DEFAULT 0,
+    duracao_total_ms BIGINT NOT NULL DEFAULT 0,
+    duracao_maxima_ms INTEGER NOT NULL DEFAULT 0
+);
+
 -- Índices para performance
+CREATE INDEX IF NOT EXISTS idx_users_vencimento_ativos ON users(data_vencimento) WHERE status_pagamento = 'ativo';
+CREATE INDEX IF NOT EXISTS idx_users_ativos ON users(id) WHERE is_active;
 CREATE INDEX IF NOT EXISTS idx_receitas_user_data ON receitas(user_id, data_receita);
 CREATE INDEX IF NOT EXISTS idx_despesas_user_data ON despesas(user_id, data_despesa);
 CREATE INDEX IF NOT EXISTS idx_notas_fiscais_user ON notas_fiscais(user_id);
+CREATE INDEX IF NOT EXISTS idx_notas_fiscais_user_created ON notas_fiscais(user_id, created_at);
 CREATE INDEX IF NOT EXISTS idx_relatorios_user_periodo ON relatorios_mensais(user_id, ano, mes);
+CREATE INDEX IF NOT EXISTS idx_chaves_idempotencia_expira_em ON chaves_idempotencia(expira_em);
+CREATE INDEX IF NOT EXISTS idx_eventos_stripe_status ON eventos_stripe(status, id);
+CREATE INDEX IF NOT EXISTS idx_estado_obrigacoes_ano ON estado_obrigacoes(ano, user_id);
+CREATE INDEX IF NOT EXISTS idx_notificacoes_outbox_user_data ON notificacoes_outbox(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_notificacoes_outbox_fila ON notificacoes_outbox(status, proxima_tentativa_em);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user ON refresh_tokens(user_id);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_familia ON refresh_tokens(familia);
+CREATE INDEX IF NOT EXISTS idx_refresh_tokens_expira_em ON refresh_tokens(expira_em);
+CREATE INDEX IF NOT EXISTS idx_revogacoes_token_expira_em ON revogacoes_token(expira_em);
+CREATE INDEX IF NOT EXISTS idx_revogacoes_token_created_at ON revogacoes_token(created_at);
+CREATE INDEX IF NOT EXISTS idx_sugestoes_associacao_user_confianca ON sugestoes_associacao(user_id, confianca DESC);
+CREATE INDEX IF NOT EXISTS idx_sugestoes_associacao_nota ON sugestoes_associacao(nota_fiscal_id);
+CREATE INDEX IF NOT EXISTS idx_sugestoes_associacao_item ON sugestoes_associacao(tipo, item_id);
 
 -- Triggers para updated_at
 CREATE OR REPLACE FUNCTION update_updated_at_column()
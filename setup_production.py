@@ -241,8 +241,10 @@ RUN useradd --create-home --shell /bin/bash app \\
     && chown -R app:app /app
 USER app
 
-# Comando de inicialização
-CMD ["gunicorn", "--bind", "0.0.0.0:5001", "--workers", "4", "--timeout", "120", "src.main:app"]
+# Comando de inicialização (o gunicorn lê o número de workers de WEB_CONCURRENCY;
+# o rate limit em memória usa o mesmo valor para dividir os limites entre os workers)
+ENV WEB_CONCURRENCY=4
+CMD ["gunicorn", "--bind", "0.0.0.0:5001", "--timeout", "120", "src.main:app"]
 """
 
     with open('/home/ubuntu/meicontrol/Dockerfile', 'w') as f:
@@ -13,6 +13,10 @@ class Config:
     # Stripe Configuration
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
+    STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_WEBHOOK_TOLERANCIA_SEGUNDOS = int(os.environ.get('STRIPE_WEBHOOK_TOLERANCIA_SEGUNDOS') or 300)
+    STRIPE_EVENTOS_LOTE = int(os.environ.get('STRIPE_EVENTOS_LOTE') or 100)
+    STRIPE_EVENTOS_MAX_TENTATIVAS = int(os.environ.get('STRIPE_EVENTOS_MAX_TENTATIVAS') or 5)
     
     # Pagar.me Configuration
     PAGARME_API_KEY = os.environ.get('PAGARME_API_KEY')
@@ -21,11 +25,73 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Pool de conexões por worker: com N workers do gunicorn, o banco recebe até
+    # N * (DB_POOL_SIZE + DB_MAX_OVERFLOW) conexões (+ threads do agendador e do envio de emails)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 5)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 10)  # espera máxima por uma conexão livre
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 0)  # 0 = sem limite
+    # PgBouncer em modo transaction: sem prepared statements no servidor e sem parâmetros de sessão
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true'
+    DB_ESPERA_LENTA_MS = int(os.environ.get('DB_ESPERA_LENTA_MS') or 100)
+    
     # Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'txt'}
     
+    # Hash de senhas (bcrypt, argon2 ou pbkdf2); hashes antigos são refeitos no login
+    SENHA_ALGORITMO = os.environ.get('SENHA_ALGORITMO', 'bcrypt')
+    SENHA_BCRYPT_ROUNDS = int(os.environ.get('SENHA_BCRYPT_ROUNDS') or 11)
+    SENHA_PBKDF2_ITERACOES = int(os.environ.get('SENHA_PBKDF2_ITERACOES') or 600000)
+    SENHA_ARGON2_TEMPO = int(os.environ.get('SENHA_ARGON2_TEMPO') or 3)
+    SENHA_ARGON2_MEMORIA_KIB = int(os.environ.get('SENHA_ARGON2_MEMORIA_KIB') or 65536)
+    SENHA_ARGON2_PARALELISMO = int(os.environ.get('SENHA_ARGON2_PARALELISMO') or 1)
+    
+    # Tokens: access token curto com claims de plano/status + refresh token com rotação
+    JWT_CHAVES = os.environ.get('JWT_CHAVES')  # 'kid1:segredo1,kid2:segredo2' (vazio = SECRET_KEY)
+    JWT_KID_ATIVO = os.environ.get('JWT_KID_ATIVO')
+    JWT_CACHE_CAPACIDADE = int(os.environ.get('JWT_CACHE_CAPACIDADE') or 10000)
+    JWT_ACESSO_MINUTOS = int(os.environ.get('JWT_ACESSO_MINUTOS') or 15)
+    JWT_REFRESH_DIAS = int(os.environ.get('JWT_REFRESH_DIAS') or 30)
+    JWT_REVOGACAO_SINCRONIA_SEGUNDOS = int(os.environ.get('JWT_REVOGACAO_SINCRONIA_SEGUNDOS') or 5)
+    # Janela relida a cada sincronia: maior que a duração de uma transação + diferença de relógio
+    JWT_REVOGACAO_MARGEM_SEGUNDOS = int(os.environ.get('JWT_REVOGACAO_MARGEM_SEGUNDOS') or 60)
+    JWT_REVOGACAO_BLOOM_BITS = int(os.environ.get('JWT_REVOGACAO_BLOOM_BITS') or 1 << 20)
+    JWT_REVOGACAO_BLOOM_HASHES = int(os.environ.get('JWT_REVOGACAO_BLOOM_HASHES') or 7)
+    
+    # Rate limit (token bucket) de login/cadastro; limites em 'capacidade/por_minuto'
+    RATE_LIMIT_ATIVO = os.environ.get('RATE_LIMIT_ATIVO', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memoria')  # memoria, redis
+    # Backend memoria: cada worker tem seus baldes, então os limites são divididos pelo número
+    # de workers do gunicorn (WEB_CONCURRENCY) para que o total fique próximo do configurado
+    RATE_LIMIT_WORKERS = int(os.environ.get('WEB_CONCURRENCY') or 1)
+    RATE_LIMIT_CONFIAR_PROXY = os.environ.get('RATE_LIMIT_CONFIAR_PROXY', 'false').lower() == 'true'
+    RATE_LIMIT_LOGIN_IP = os.environ.get('RATE_LIMIT_LOGIN_IP', '20/10')
+    RATE_LIMIT_LOGIN_EMAIL = os.environ.get('RATE_LIMIT_LOGIN_EMAIL', '5/2')
+    RATE_LIMIT_REGISTER_IP = os.environ.get('RATE_LIMIT_REGISTER_IP', '5/1')
+    REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
+    
+    # Cache (por processo) do usuário autenticado em token_required
+    CACHE_USUARIO_TTL_SEGUNDOS = int(os.environ.get('CACHE_USUARIO_TTL_SEGUNDOS') or 30)
+    CACHE_USUARIO_CAPACIDADE = int(os.environ.get('CACHE_USUARIO_CAPACIDADE') or 10000)
+    
+    # Importação em lote de receitas/despesas (CSV/OFX)
+    IMPORTACAO_TAMANHO_LOTE = int(os.environ.get('IMPORTACAO_TAMANHO_LOTE') or 1000)
+    
+    # Idempotency-Key nas operações financeiras de escrita
+    IDEMPOTENCIA_BACKEND = os.environ.get('IDEMPOTENCIA_BACKEND', 'db')  # db, memoria
+    IDEMPOTENCIA_TTL_HORAS = int(os.environ.get('IDEMPOTENCIA_TTL_HORAS') or 24)
+    IDEMPOTENCIA_LEASE_SEGUNDOS = int(os.environ.get('IDEMPOTENCIA_LEASE_SEGUNDOS') or 120)
+    IDEMPOTENCIA_CAPACIDADE_MEMORIA = int(os.environ.get('IDEMPOTENCIA_CAPACIDADE_MEMORIA') or 10000)
+    
+    # Associação automática nota fiscal x receita/despesa
+    ASSOCIACAO_AUTOMATICA_ATIVA = os.environ.get('ASSOCIACAO_AUTOMATICA_ATIVA', 'true').lower() == 'true'
+    ASSOCIACAO_AUTOMATICA_CONFIANCA_MINIMA = int(os.environ.get('ASSOCIACAO_AUTOMATICA_CONFIANCA_MINIMA') or 90)
+    ASSOCIACAO_SUGESTOES_POR_NOTA = int(os.environ.get('ASSOCIACAO_SUGESTOES_POR_NOTA') or 5)
+    
     # Email Configuration (para notificações)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
@@ -38,6 +104,46 @@ class Config:
     SMTP_PORT = int(os.environ.get('SMTP_PORT') or 587)
     EMAIL_USER = os.environ.get('EMAIL_USER')
     EMAIL_PASSWORD = os.environ.get('EMAIL_PASSWORD')
+    SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'true').lower() in ['true', 'on', '1']
+    SMTP_AUTENTICAR = os.environ.get('SMTP_AUTENTICAR', 'true').lower() in ['true', 'on', '1']
+    
+    # Disparo em massa: conexões SMTP reaproveitadas e envio concorrente limitado
+    EMAIL_POOL_CONEXOES = int(os.environ.get('EMAIL_POOL_CONEXOES') or 4)
+    EMAIL_MENSAGENS_POR_CONEXAO = int(os.environ.get('EMAIL_MENSAGENS_POR_CONEXAO') or 100)
+    EMAIL_THREADS = int(os.environ.get('EMAIL_THREADS') or 4)
+    
+    # Motor de envio: 'asyncio' (requer aiosmtplib; sem ele usa 'threads') ou 'threads'
+    EMAIL_MOTOR = os.environ.get('EMAIL_MOTOR', 'asyncio').lower()
+    EMAIL_CONCORRENCIA = int(os.environ.get('EMAIL_CONCORRENCIA') or 20)
+    EMAIL_CONEXOES_POR_DOMINIO = int(os.environ.get('EMAIL_CONEXOES_POR_DOMINIO') or 5)
+    EMAIL_TAMANHO_FILA = int(os.environ.get('EMAIL_TAMANHO_FILA') or 1000)
+    NOTIFICACOES_TAMANHO_LOTE = int(os.environ.get('NOTIFICACOES_TAMANHO_LOTE') or 500)
+    
+    # Outbox de notificações (retentativas com backoff exponencial)
+    OUTBOX_LOTE = int(os.environ.get('OUTBOX_LOTE') or 200)
+    OUTBOX_MAX_TENTATIVAS = int(os.environ.get('OUTBOX_MAX_TENTATIVAS') or 6)
+    OUTBOX_BACKOFF_BASE_SEGUNDOS = int(os.environ.get('OUTBOX_BACKOFF_BASE_SEGUNDOS') or 60)
+    OUTBOX_BACKOFF_MAXIMO_SEGUNDOS = int(os.environ.get('OUTBOX_BACKOFF_MAXIMO_SEGUNDOS') or 21600)
+    OUTBOX_LEASE_SEGUNDOS = int(os.environ.get('OUTBOX_LEASE_SEGUNDOS') or 600)
+    
+    # Cache HTTP (ETags); alterar a versão invalida os ETags já emitidos (ex.: mudança de formato)
+    CACHE_HTTP_VERSAO = os.environ.get('CACHE_HTTP_VERSAO', '1')
+    
+    # Cache de respostas por usuário (dashboard, prazos); invalidado nas escritas do usuário
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memoria')  # memoria, redis
+    CACHE_TTL_SEGUNDOS = int(os.environ.get('CACHE_TTL_SEGUNDOS') or 300)
+    CACHE_MEMORIA_MAX_MB = int(os.environ.get('CACHE_MEMORIA_MAX_MB') or 64)
+    
+    # Agendador de tarefas periódicas (uma execução por vez no cluster via lease no banco)
+    AGENDADOR_ATIVO = os.environ.get('AGENDADOR_ATIVO', 'false').lower() == 'true'
+    AGENDADOR_TICK_SEGUNDOS = int(os.environ.get('AGENDADOR_TICK_SEGUNDOS') or 30)
+    AGENDADOR_LEASE_SEGUNDOS = int(os.environ.get('AGENDADOR_LEASE_SEGUNDOS') or 900)
+    AGENDADOR_JITTER = float(os.environ.get('AGENDADOR_JITTER') or 0.1)
+    AGENDADOR_INTERVALOS = os.environ.get('AGENDADOR_INTERVALOS')  # ex.: "notificacoes:1800,outbox:120"
+    
+    # Relatórios temporários (PDF/Excel) removidos pela tarefa de limpeza
+    ARQUIVOS_TEMPORARIOS_PREFIXO = 'meicontrol_'
+    ARQUIVOS_TEMPORARIOS_IDADE_MAXIMA_SEGUNDOS = int(os.environ.get('ARQUIVOS_TEMPORARIOS_IDADE_MAXIMA_SEGUNDOS') or 3600)
     
     # Configurações de notificação
     NOTIFICACOES_ATIVAS = os.environ.get('NOTIFICACOES_ATIVAS', 'true').lower() == 'true'
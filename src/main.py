@@ -2,11 +2,14 @@ from flask import Flask
 from flask_cors import CORS
 import os
 import sys
+import click
 from dotenv import load_dotenv
 
 # Carregar variáveis de ambiente
 load_dotenv()
 
+from src.config import Config
+
 def create_app():
     app = Flask(__name__)
     
@@ -18,6 +21,10 @@ def create_app():
     cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
     CORS(app, origins=cors_origins, supports_credentials=True)
     
+    # Banco de dados: URL do Config (DATABASE_URL) e pool de conexões por worker
+    from src.services.banco import configurar_banco
+    configurar_banco(app)
+    
     # Importar e registrar blueprints
     # Importa os blueprints diretamente do pacote src.routes
     from src.routes.auth import auth_bp
@@ -26,6 +33,7 @@ def create_app():
     from src.routes.relatorios import relatorios_bp
     from src.routes.notificacoes import notificacoes_bp
     from src.routes.admin import admin_bp
+    from src.routes.planos import planos_bp
     
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(financeiro_bp, url_prefix="/api/financeiro")
@@ -33,6 +41,49 @@ def create_app():
     app.register_blueprint(relatorios_bp, url_prefix="/api/relatorios")
     app.register_blueprint(notificacoes_bp, url_prefix="/api/notificacoes")
     app.register_blueprint(admin_bp, url_prefix="/api/admin")
+    app.register_blueprint(planos_bp, url_prefix="/api/planos")
+    
+    # Varredura de planos vencidos (também executada pelo agendador, tarefa 'expirar-planos')
+    @app.cli.command("expirar-planos")
+    def expirar_planos_command():
+        from src.services.assinaturas import expirar_planos_vencidos
+        print(f"{expirar_planos_vencidos()} plano(s) marcado(s) como vencido")
+    
+    # Eventos do Stripe recebidos pelo webhook (também executado pelo agendador, tarefa 'processar-stripe')
+    @app.cli.command("processar-stripe")
+    def processar_stripe_command():
+        from src.services.stripe_eventos import processar_eventos_stripe
+        print(f"{processar_eventos_stripe()} evento(s) do Stripe processado(s)")
+    
+    # Carga inicial da tabela de sugestões de associação (usuários com notas anteriores a ela)
+    @app.cli.command("reconstruir-sugestoes")
+    def reconstruir_sugestoes_command():
+        from src.services.associacao import reconstruir_sugestoes_usuarios
+        print(f"{reconstruir_sugestoes_usuarios()} sugestão(ões) de associação gravada(s)")
+    
+    # Execução manual de uma tarefa do agendador (respeita o lease: não roda se outro processo a tem)
+    @app.cli.command("executar-tarefa")
+    @click.argument("nome")
+    def executar_tarefa_command(nome):
+        from src.services.agendador import TAREFAS, TAREFAS_LOCAIS, garantir_tarefas, executar_tarefa
+        if nome in TAREFAS_LOCAIS:
+            print(TAREFAS_LOCAIS[nome][0]())
+            return
+        if nome not in TAREFAS:
+            print(f"Tarefa desconhecida. Disponíveis: {', '.join(sorted([*TAREFAS, *TAREFAS_LOCAIS]))}")
+            return
+        garantir_tarefas()
+        resultado = executar_tarefa(nome, forcar=True)
+        print(resultado if resultado else f"Tarefa {nome} em execução em outro processo")
+    
+    # Agendador em segundo plano (notificações, varreduras e limpezas periódicas), iniciado
+    # na primeira requisição de cada worker: comandos CLI e o master do gunicorn não o executam
+    if Config.AGENDADOR_ATIVO:
+        from src.services.agendador import iniciar_agendador
+        
+        @app.before_request
+        def iniciar_agendador_worker():
+            iniciar_agendador(app)
     
     # Rota de health check
     @app.route("/health")
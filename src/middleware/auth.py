@@ -1,40 +1,119 @@
 from functools import wraps
-from flask import request, jsonify, g
-import jwt
-from src.models.user import User
+from collections import OrderedDict
+from threading import Lock
+import time
+from flask import jsonify, g
+from src.models.user import User, calcular_status_efetivo
+from src.services.tokens import dados_principal
+from src.services.autenticacao import autenticar_requisicao, ErroAutenticacao
 from src.config import Config
 from datetime import datetime
 
+class CacheUsuarios:
+    """Cache por processo (LRU com TTL) dos campos de autorização de cada usuário"""
+    
+    def __init__(self, ttl, capacidade):
+        self.ttl = ttl
+        self.capacidade = capacidade
+        self._dados = OrderedDict()
+        self._lock = Lock()
+    
+    def obter(self, user_id):
+        with self._lock:
+            entrada = self._dados.get(user_id)
+            if entrada is None:
+                return None
+            expira_em, dados = entrada
+            if expira_em < time.monotonic():
+                del self._dados[user_id]
+                return None
+            self._dados.move_to_end(user_id)
+            return dados
+    
+    def guardar(self, user_id, dados):
+        with self._lock:
+            self._dados[user_id] = (time.monotonic() + self.ttl, dados)
+            self._dados.move_to_end(user_id)
+            while len(self._dados) > self.capacidade:
+                self._dados.popitem(last=False)
+    
+    def invalidar(self, user_id):
+        with self._lock:
+            self._dados.pop(user_id, None)
+
+_cache_usuarios = CacheUsuarios(Config.CACHE_USUARIO_TTL_SEGUNDOS, Config.CACHE_USUARIO_CAPACIDADE)
+
+def invalidar_cache_usuario(user_id):
+    """Descarta o principal em cache (chamar após alterar perfil, plano ou status)"""
+    _cache_usuarios.invalidar(user_id)
+
+class UsuarioAutenticado:
+    """Principal da requisição.
+    
+    Os campos de autorização vêm do cache; qualquer outro atributo (nome, email, ...)
+    carrega o User do banco sob demanda, uma única vez por requisição.
+    """
+    __slots__ = ('id', 'is_active', 'is_admin', 'plano', 'status_pagamento', 'data_vencimento', '_usuario')
+    CAMPOS = __slots__[:-1]
+    
+    def __init__(self, dados, usuario=None):
+        for campo, valor in zip(self.CAMPOS, dados):
+            object.__setattr__(self, campo, valor)
+        object.__setattr__(self, '_usuario', usuario)
+    
+    @property
+    def status_efetivo(self):
+        return calcular_status_efetivo(self.status_pagamento, self.data_vencimento)
+    
+    @staticmethod
+    def dados_de(usuario):
+        return tuple(getattr(usuario, campo) for campo in UsuarioAutenticado.CAMPOS)
+    
+    def carregar(self):
+        """Retorna o User (ORM) do principal, consultando o banco apenas na primeira vez"""
+        if self._usuario is None:
+            object.__setattr__(self, '_usuario', User.query.get(self.id))
+        return self._usuario
+    
+    def __getattr__(self, nome):
+        return getattr(self.carregar(), nome)
+    
+    def __setattr__(self, nome, valor):
+        # Escritas sempre chegam ao User para serem persistidas no commit
+        if nome in self.CAMPOS:
+            object.__setattr__(self, nome, valor)
+        setattr(self.carregar(), nome, valor)
+
 def token_required(f):
     """Decorator para verificar token JWT"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        
-        if not token:
-            return jsonify({'error': 'Token não fornecido'}), 401
+        try:
+            payload = autenticar_requisicao()
+        except ErroAutenticacao as e:
+            return jsonify({'error': e.mensagem}), e.status
         
-        if token.startswith('Bearer '):
-            token = token[7:]
+        user_id = payload['user_id']
         
-        try:
-            payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-            user_id = payload['user_id']
-            
-            user = User.query.get(user_id)
-            if not user:
+        # Access tokens trazem as claims de autorização; tokens legados usam o cache
+        dados = dados_principal(payload) or _cache_usuarios.obter(user_id)
+        if dados is not None:
+            user = UsuarioAutenticado(dados)
+        else:
+            usuario = User.query.get(user_id)
+            if not usuario:
                 return jsonify({'error': 'Usuário não encontrado'}), 404
             
-            if not user.is_active:
-                return jsonify({'error': 'Conta desativada'}), 401
-            
-            # Adicionar usuário ao contexto da requisição
-            g.current_user = user
-            
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expirado'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token inválido'}), 401
+            dados = UsuarioAutenticado.dados_de(usuario)
+            _cache_usuarios.guardar(user_id, dados)
+            user = UsuarioAutenticado(dados, usuario)
+        
+        if not user.is_active:
+            return jsonify({'error': 'Conta desativada'}), 401
+        
+        # Adicionar usuário ao contexto da requisição
+        g.current_user = user
+        g.token_payload = payload
         
         return f(*args, **kwargs)
     
@@ -53,28 +132,26 @@ def admin_required(f):
     return decorated
 
 def plano_ativo_required(f):
-    """Decorator para verificar se o plano está ativo"""
+    """Decorator para verificar se o plano está ativo (somente leitura; a transição
+    para 'vencido' é persistida pela varredura expirar_planos_vencidos)"""
     @wraps(f)
     @token_required
     def decorated(*args, **kwargs):
         user = g.current_user
+        status = user.status_efetivo
         
-        # Verificar se o plano está ativo
-        if user.status_pagamento != 'ativo':
+        # Verificar se não está vencido
+        if status == 'vencido':
             return jsonify({
-                'error': 'Plano inativo. Regularize seu pagamento para continuar usando o sistema',
-                'status_pagamento': user.status_pagamento
+                'error': 'Plano vencido. Renove sua assinatura para continuar',
+                'data_vencimento': user.data_vencimento.isoformat() if user.data_vencimento else None
             }), 402  # Payment Required
         
-        # Verificar se não está vencido
-        if user.data_vencimento and user.data_vencimento < datetime.now().date():
-            user.status_pagamento = 'vencido'
-            from src.models.user import db
-            db.session.commit()
-            
+        # Verificar se o plano está ativo
+        if status != 'ativo':
             return jsonify({
-                'error': 'Plano vencido. Renove sua assinatura para continuar',
-                'data_vencimento': user.data_vencimento.isoformat()
+                'error': 'Plano inativo. Regularize seu pagamento para continuar usando o sistema',
+                'status_pagamento': status
             }), 402  # Payment Required
         
         return f(*args, **kwargs)
@@ -95,22 +172,3 @@ def plano_avancado_required(f):
         return f(*args, **kwargs)
     
     return decorated
-
-def verificar_limite_notas_fiscais(user):
-    """Verifica se o usuário atingiu o limite de notas fiscais do plano"""
-    from src.models.nota_fiscal import NotaFiscal
-    
-    if user.plano == 'avancado':
-        return True  # Plano avançado tem limite ilimitado
-    
-    # Plano básico: limite de 50 notas fiscais por mês
-    from datetime import datetime
-    inicio_mes = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    count = NotaFiscal.query.filter(
-        NotaFiscal.user_id == user.id,
-        NotaFiscal.created_at >= inicio_mes
-    ).count()
-    
-    return count < 50
-
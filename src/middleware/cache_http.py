@@ -0,0 +1,107 @@
+import hashlib
+from datetime import date
+from functools import wraps
+from flask import request, g, make_response, current_app
+from src.models.user import db, User
+from src.services.cache import get_cache, metricas_cache
+from src.config import Config
+
+def marcar_dados_alterados(user_id):
+    """Incrementa a versão dos dados do usuário (invalida os ETags e o cache de respostas).
+    O commit fica com quem chama."""
+    User.query.filter_by(id=user_id).update(
+        {'versao_dados': User.versao_dados + 1}, synchronize_session=False
+    )
+    g.pop('versao_dados', None)
+    get_cache().invalidar_usuario(user_id)
+
+def marcar_dados_alterados_usuarios(user_ids, tamanho_lote=1000):
+    """marcar_dados_alterados para vários usuários (tarefas em lote). O commit fica com quem chama."""
+    user_ids = list(user_ids)
+    for inicio in range(0, len(user_ids), tamanho_lote):
+        User.query.filter(User.id.in_(user_ids[inicio:inicio + tamanho_lote])).update(
+            {'versao_dados': User.versao_dados + 1}, synchronize_session=False
+        )
+    g.pop('versao_dados', None)
+    cache = get_cache()
+    for user_id in user_ids:
+        cache.invalidar_usuario(user_id)
+
+def versao_dados_usuario(user_id):
+    # Lida uma vez por requisição (etag_condicional e resposta_em_cache usam a mesma)
+    if 'versao_dados' not in g:
+        g.versao_dados = db.session.query(User.versao_dados).filter(User.id == user_id).scalar() or 0
+    return g.versao_dados
+
+def calcular_etag(user_id, versao, por_dia=False):
+    """ETag fraco: versão dos dados do usuário + rota/parâmetros (+ data, se a resposta depende do dia)"""
+    partes = [Config.CACHE_HTTP_VERSAO, str(user_id), str(versao), request.full_path]
+    if por_dia:
+        partes.append(date.today().isoformat())
+    return hashlib.sha1('|'.join(partes).encode()).hexdigest()
+
+def politica_cache(max_age):
+    # Respostas por usuário nunca ficam em caches compartilhados; max_age 0 = revalidar sempre
+    if max_age:
+        return f'private, max-age={max_age}, must-revalidate'
+    return 'private, no-cache'
+
+def etag_condicional(max_age=0, por_dia=False):
+    """Decorator de GET condicional com ETag derivado da versão dos dados do usuário.
+    
+    Deve ser aplicado abaixo de token_required/plano_ativo_required. Se o If-None-Match
+    do cliente ainda vale, responde 304 sem executar a view (nenhuma consulta pesada).
+    por_dia: a resposta também depende da data atual (prazos, dashboard do mês corrente).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            user_id = g.current_user.id
+            etag = calcular_etag(user_id, versao_dados_usuario(user_id), por_dia)
+            
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = politica_cache(max_age)
+            response.vary.add('Authorization')
+            return response
+        
+        return decorated
+    return decorator
+
+def resposta_em_cache(ttl=None, por_dia=False):
+    """Decorator que guarda a resposta 200 da view por usuário (backend em CACHE_BACKEND).
+    
+    A chave inclui a versão dos dados do usuário, então qualquer escrita marcada com
+    marcar_dados_alterados faz a próxima leitura recalcular. Aplicar abaixo de etag_condicional:
+    clientes com ETag válido recebem 304 antes; os demais recebem o corpo do cache.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            cache = get_cache()
+            user_id = g.current_user.id
+            chave = calcular_etag(user_id, versao_dados_usuario(user_id), por_dia)
+            rota = request.endpoint
+            
+            guardada = cache.obter(chave)
+            if guardada is not None:
+                metricas_cache.registrar(rota, True)
+                corpo, mimetype = guardada
+                return current_app.response_class(corpo, status=200, mimetype=mimetype)
+            
+            metricas_cache.registrar(rota, False)
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                corpo = response.get_data()
+                cache.guardar(chave, (corpo, response.mimetype), ttl or Config.CACHE_TTL_SEGUNDOS,
+                              user_id, len(corpo) + len(chave))
+            return response
+        
+        return decorated
+    return decorator
@@ -0,0 +1,220 @@
+import hashlib
+from functools import wraps
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from threading import Lock
+from flask import request, jsonify, g, make_response, current_app
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.idempotencia import ChaveIdempotencia
+from src.config import Config
+
+HEADER_IDEMPOTENCIA = 'Idempotency-Key'
+
+class ArmazenamentoMemoria:
+    """Armazenamento LRU em memória do processo (testes e desenvolvimento)"""
+    
+    def __init__(self, capacidade=10000):
+        self.capacidade = capacidade
+        self._registros = OrderedDict()
+        self._lock = Lock()
+    
+    def reservar(self, user_id, chave, rota, impressao, expira_em):
+        """Reserva a chave. Retorna None se reservada agora ou o registro já existente"""
+        agora = datetime.utcnow()
+        with self._lock:
+            registro = self._registros.get((user_id, chave))
+            if registro and registro['expira_em'] > agora:
+                self._registros.move_to_end((user_id, chave))
+                return registro
+            
+            self._registros[(user_id, chave)] = {
+                'rota': rota, 'impressao': impressao, 'status_code': None, 'resposta': None,
+                'mimetype': None, 'created_at': agora, 'expira_em': expira_em
+            }
+            while len(self._registros) > self.capacidade:
+                self._registros.popitem(last=False)
+            return None
+    
+    def concluir(self, user_id, chave, status_code, resposta, mimetype):
+        with self._lock:
+            registro = self._registros.get((user_id, chave))
+            if registro:
+                registro.update(status_code=status_code, resposta=resposta, mimetype=mimetype)
+    
+    def liberar(self, user_id, chave):
+        with self._lock:
+            self._registros.pop((user_id, chave), None)
+    
+    def limpar_expiradas(self):
+        agora = datetime.utcnow()
+        with self._lock:
+            expiradas = [k for k, r in self._registros.items() if r['expira_em'] <= agora]
+            for k in expiradas:
+                del self._registros[k]
+        return len(expiradas)
+
+class ArmazenamentoBanco:
+    """Armazenamento na tabela chaves_idempotencia (compartilhado entre workers)"""
+    
+    def reservar(self, user_id, chave, rota, impressao, expira_em):
+        agora = datetime.utcnow()
+        try:
+            db.session.add(ChaveIdempotencia(
+                user_id=user_id, chave=chave, rota=rota, impressao=impressao,
+                created_at=agora, expira_em=expira_em
+            ))
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+        
+        registro = ChaveIdempotencia.query.filter_by(user_id=user_id, chave=chave).first()
+        if registro is None:
+            return None
+        
+        # Chave expirada (ainda não varrida): reaproveitar para a nova requisição
+        if registro.expira_em <= agora:
+            registro.rota = rota
+            registro.impressao = impressao
+            registro.status_code = None
+            registro.resposta = None
+            registro.mimetype = None
+            registro.created_at = agora
+            registro.expira_em = expira_em
+            db.session.commit()
+            return None
+        
+        return {
+            'rota': registro.rota,
+            'impressao': registro.impressao,
+            'status_code': registro.status_code,
+            'resposta': registro.resposta,
+            'mimetype': registro.mimetype,
+            'created_at': registro.created_at,
+            'expira_em': registro.expira_em
+        }
+    
+    def concluir(self, user_id, chave, status_code, resposta, mimetype):
+        ChaveIdempotencia.query.filter_by(user_id=user_id, chave=chave).update({
+            'status_code': status_code,
+            'resposta': resposta,
+            'mimetype': mimetype
+        }, synchronize_session=False)
+        db.session.commit()
+    
+    def liberar(self, user_id, chave):
+        ChaveIdempotencia.query.filter_by(
+            user_id=user_id, chave=chave, status_code=None
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    
+    def limpar_expiradas(self):
+        removidas = ChaveIdempotencia.query.filter(
+            ChaveIdempotencia.expira_em <= datetime.utcnow()
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return removidas
+
+_armazenamento = None
+
+def get_armazenamento():
+    """Retorna o armazenamento configurado em IDEMPOTENCIA_BACKEND ('db' ou 'memoria')"""
+    global _armazenamento
+    if _armazenamento is None:
+        if Config.IDEMPOTENCIA_BACKEND == 'memoria':
+            _armazenamento = ArmazenamentoMemoria(Config.IDEMPOTENCIA_CAPACIDADE_MEMORIA)
+        else:
+            _armazenamento = ArmazenamentoBanco()
+    return _armazenamento
+
+def limpar_chaves_expiradas():
+    """Remove as chaves cujo TTL expirou (para ser chamada periodicamente)"""
+    return get_armazenamento().limpar_expiradas()
+
+def impressao_requisicao():
+    """Hash de método, caminho (com query string) e corpo: a mesma chave com outro conteúdo é erro do cliente"""
+    impressao = hashlib.sha256(f'{request.method} {request.full_path}\n'.encode())
+    
+    if request.mimetype == 'multipart/form-data':
+        # O boundary muda a cada envio: comparar campos e conteúdo dos arquivos, não os bytes brutos
+        for nome, valor in sorted(request.form.items(multi=True)):
+            impressao.update(f'{nome}={valor}\n'.encode())
+        for nome, arquivo in sorted(request.files.items(multi=True), key=lambda item: item[0]):
+            impressao.update(f'{nome}:{arquivo.filename}\n'.encode())
+            for bloco in iter(lambda: arquivo.stream.read(65536), b''):
+                impressao.update(bloco)
+            arquivo.stream.seek(0)
+    else:
+        # cache=True: o corpo continua disponível para request.get_json() na view
+        impressao.update(request.get_data(cache=True))
+    
+    return impressao.hexdigest()
+
+def idempotente(f):
+    """Decorator que repete a resposta armazenada quando o header Idempotency-Key é reenviado.
+
+    Deve ser aplicado abaixo de token_required/plano_ativo_required. Retentativas não
+    executam a view novamente (nenhum parsing de PDF, insert ou consumo de limite).
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        chave = request.headers.get(HEADER_IDEMPOTENCIA)
+        if not chave:
+            return f(*args, **kwargs)
+        
+        if len(chave) > 255:
+            return jsonify({'error': 'Idempotency-Key deve ter no máximo 255 caracteres'}), 400
+        
+        armazenamento = get_armazenamento()
+        user_id = g.current_user.id
+        rota = f'{request.method} {request.path}'
+        agora = datetime.utcnow()
+        
+        impressao = impressao_requisicao()
+        
+        existente = armazenamento.reservar(
+            user_id, chave, rota, impressao, agora + timedelta(hours=Config.IDEMPOTENCIA_TTL_HORAS)
+        )
+        
+        if existente:
+            if existente['rota'] != rota:
+                return jsonify({'error': 'Idempotency-Key já utilizada em outra operação'}), 422
+            
+            # Registros anteriores à impressão (nula) continuam sendo repetidos normalmente
+            if existente['impressao'] and existente['impressao'] != impressao:
+                return jsonify({'error': 'Idempotency-Key já utilizada com outro conteúdo'}), 422
+            
+            if existente['status_code'] is None:
+                # Reserva abandonada (worker caiu no meio): liberar para nova tentativa
+                lease = timedelta(seconds=Config.IDEMPOTENCIA_LEASE_SEGUNDOS)
+                if existente['created_at'] + lease < agora:
+                    armazenamento.liberar(user_id, chave)
+                return jsonify({'error': 'Requisição com esta Idempotency-Key ainda em processamento'}), 409
+            
+            response = current_app.response_class(
+                existente['resposta'],
+                status=existente['status_code'],
+                mimetype=existente['mimetype']
+            )
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            armazenamento.liberar(user_id, chave)
+            raise
+        
+        # Erros de servidor não são memorizados: o cliente pode tentar novamente
+        if response.status_code >= 500:
+            armazenamento.liberar(user_id, chave)
+        else:
+            armazenamento.concluir(
+                user_id, chave, response.status_code,
+                response.get_data(as_text=True), response.mimetype
+            )
+        
+        return response
+    
+    return decorated
@@ -0,0 +1,159 @@
+import hashlib
+import math
+import time
+from functools import wraps
+from collections import OrderedDict
+from threading import Lock
+from flask import request, jsonify
+from src.config import Config
+
+try:
+    import redis
+except ImportError:  # redis é opcional (apenas para RATE_LIMIT_BACKEND=redis)
+    redis = None
+
+class BaldesMemoria:
+    """Token buckets no processo (um conjunto por worker).
+    
+    Com `workers` > 1, capacidade e taxa de cada balde são divididas entre os workers:
+    as requisições se distribuem entre eles e a soma dos baldes aproxima o limite global.
+    """
+    
+    def __init__(self, capacidade_chaves=100000, workers=1):
+        self.capacidade_chaves = capacidade_chaves
+        self.workers = max(1, workers)
+        self._baldes = OrderedDict()
+        self._lock = Lock()
+    
+    def consumir(self, chave, capacidade, taxa, custo=1):
+        """Retorna (permitido, segundos_ate_proxima_ficha)"""
+        if self.workers > 1:
+            capacidade = max(custo, math.ceil(capacidade / self.workers))
+            taxa = taxa / self.workers
+        agora = time.monotonic()
+        with self._lock:
+            tokens, atualizado = self._baldes.get(chave, (capacidade, agora))
+            tokens = min(capacidade, tokens + (agora - atualizado) * taxa)
+            
+            if tokens >= custo:
+                tokens -= custo
+                espera = 0
+            else:
+                espera = (custo - tokens) / taxa
+            
+            self._baldes[chave] = (tokens, agora)
+            self._baldes.move_to_end(chave)
+            # Limita a memória sob ataque com muitos IPs/emails distintos
+            while len(self._baldes) > self.capacidade_chaves:
+                self._baldes.popitem(last=False)
+        
+        return espera == 0, espera
+
+# Estado do balde em um hash; o relógio é o do próprio Redis (sem skew entre workers)
+SCRIPT_BALDE = """
+local capacidade = tonumber(ARGV[1])
+local taxa = tonumber(ARGV[2])
+local custo = tonumber(ARGV[3])
+local relogio = redis.call('TIME')
+local agora = tonumber(relogio[1]) + tonumber(relogio[2]) / 1000000
+local estado = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(estado[1]) or capacidade
+local ts = tonumber(estado[2]) or agora
+tokens = math.min(capacidade, tokens + math.max(0, agora - ts) * taxa)
+local espera = 0
+if tokens >= custo then
+  tokens = tokens - custo
+else
+  espera = (custo - tokens) / taxa
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(agora))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacidade / taxa * 1000))
+return tostring(espera)
+"""
+
+class BaldesRedis:
+    """Token buckets compartilhados entre workers (script Lua atômico).
+    Aceita qualquer cliente compatível, p.ex. fakeredis.FakeRedis() nos testes."""
+    
+    def __init__(self, cliente, prefixo='rl:'):
+        self.cliente = cliente
+        self.prefixo = prefixo
+        self._script = cliente.register_script(SCRIPT_BALDE)
+        self._reserva = BaldesMemoria(workers=Config.RATE_LIMIT_WORKERS)
+    
+    def consumir(self, chave, capacidade, taxa, custo=1):
+        try:
+            espera = float(self._script(keys=[self.prefixo + chave], args=[capacidade, taxa, custo]))
+        except redis.RedisError:
+            # Redis fora do ar: continuar limitando por processo em vez de liberar tudo
+            return self._reserva.consumir(chave, capacidade, taxa, custo)
+        return espera == 0, espera
+
+_baldes = None
+
+def get_baldes():
+    """Retorna o backend configurado em RATE_LIMIT_BACKEND ('memoria' ou 'redis')"""
+    global _baldes
+    if _baldes is None:
+        if Config.RATE_LIMIT_BACKEND == 'redis':
+            if redis is None:
+                raise RuntimeError('RATE_LIMIT_BACKEND=redis requer o pacote redis')
+            _baldes = BaldesRedis(redis.Redis.from_url(Config.REDIS_URL, socket_timeout=0.2))
+        else:
+            _baldes = BaldesMemoria(workers=Config.RATE_LIMIT_WORKERS)
+    return _baldes
+
+def interpretar_limite(limite):
+    """'capacidade/por_minuto' -> (capacidade, fichas por segundo)"""
+    capacidade, por_minuto = limite.split('/')
+    return int(capacidade), float(por_minuto) / 60
+
+def _hash(valor):
+    return hashlib.sha256(valor.encode('utf-8')).hexdigest()[:32]
+
+def chave_ip():
+    """IP do cliente (primeiro do X-Forwarded-For apenas se o proxy for confiável)"""
+    if Config.RATE_LIMIT_CONFIAR_PROXY and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'desconhecido'
+
+def chave_email():
+    """Email do corpo JSON, normalizado como no login; None se ausente"""
+    dados = request.get_json(silent=True) or {}
+    email = dados.get('email')
+    if not isinstance(email, str) or not email.strip():
+        return None
+    return _hash(email.lower().strip())
+
+def limitar_taxa(nome, *regras):
+    """Decorator de rate limit por token bucket, avaliado antes de qualquer consulta ao banco.
+
+    regras: pares (dimensão, limite) com dimensão 'ip' ou 'email' e limite no formato
+    'capacidade/por_minuto'. Responde 429 com Retry-After quando algum balde esvazia.
+    """
+    extratores = {'ip': chave_ip, 'email': chave_email}
+    
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not Config.RATE_LIMIT_ATIVO:
+                return f(*args, **kwargs)
+            
+            baldes = get_baldes()
+            for dimensao, limite in regras:
+                valor = extratores[dimensao]()
+                if valor is None:
+                    continue
+                
+                capacidade, taxa = interpretar_limite(limite)
+                permitido, espera = baldes.consumir(f'{nome}:{dimensao}:{valor}', capacidade, taxa)
+                if not permitido:
+                    response = jsonify({'error': 'Muitas tentativas. Aguarde antes de tentar novamente'})
+                    response.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+                    return response, 429
+            
+            return f(*args, **kwargs)
+        
+        return decorated
+    
+    return decorator
@@ -0,0 +1,37 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class EventoStripe(db.Model):
+    __tablename__ = 'eventos_stripe'
+    __table_args__ = (
+        db.Index('idx_eventos_stripe_status', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Evento recebido no webhook (id evt_... garante que reenvios não sejam duplicados)
+    stripe_id = db.Column(db.String(255), unique=True, nullable=False)
+    tipo = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    
+    # Processamento assíncrono: pendente, processado, erro
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    erro = db.Column(db.Text)
+    
+    # Controle
+    recebido_em = db.Column(db.DateTime, default=datetime.utcnow)
+    processado_em = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'stripe_id': self.stripe_id,
+            'tipo': self.tipo,
+            'status': self.status,
+            'tentativas': self.tentativas,
+            'erro': self.erro,
+            'recebido_em': self.recebido_em.isoformat() if self.recebido_em else None,
+            'processado_em': self.processado_em.isoformat() if self.processado_em else None
+        }
@@ -22,19 +22,35 @@ class Receita(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
+    # Campos serializados nas listagens (consultas somente leitura por colunas)
+    CAMPOS_LISTAGEM = (
+        'id', 'user_id', 'descricao', 'valor', 'data_receita', 'categoria',
+        'comprovante_path', 'nota_fiscal_id', 'created_at', 'updated_at'
+    )
+    
+    @classmethod
+    def colunas_listagem(cls):
+        """Colunas selecionadas pelas listagens, sem hidratar objetos ORM"""
+        return [getattr(cls, campo) for campo in cls.CAMPOS_LISTAGEM]
+    
+    @staticmethod
+    def serializar(registro):
+        """Serializa uma instância ou uma linha projetada com as colunas de listagem"""
         return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'descricao': self.descricao,
-            'valor': float(self.valor),
-            'data_receita': self.data_receita.isoformat(),
-            'categoria': self.categoria,
-            'comprovante_path': self.comprovante_path,
-            'nota_fiscal_id': self.nota_fiscal_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'id': registro.id,
+            'user_id': registro.user_id,
+            'descricao': registro.descricao,
+            'valor': float(registro.valor),
+            'data_receita': registro.data_receita.isoformat(),
+            'categoria': registro.categoria,
+            'comprovante_path': registro.comprovante_path,
+            'nota_fiscal_id': registro.nota_fiscal_id,
+            'created_at': registro.created_at.isoformat(),
+            'updated_at': registro.updated_at.isoformat()
         }
+    
+    def to_dict(self):
+        return Receita.serializar(self)
 
 class Despesa(db.Model):
     __tablename__ = 'despesas'
@@ -56,17 +72,33 @@ class Despesa(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
+    # Campos serializados nas listagens (consultas somente leitura por colunas)
+    CAMPOS_LISTAGEM = (
+        'id', 'user_id', 'descricao', 'valor', 'data_despesa', 'categoria',
+        'comprovante_path', 'nota_fiscal_id', 'created_at', 'updated_at'
+    )
+    
+    @classmethod
+    def colunas_listagem(cls):
+        """Colunas selecionadas pelas listagens, sem hidratar objetos ORM"""
+        return [getattr(cls, campo) for campo in cls.CAMPOS_LISTAGEM]
+    
+    @staticmethod
+    def serializar(registro):
+        """Serializa uma instância ou uma linha projetada com as colunas de listagem"""
         return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'descricao': self.descricao,
-            'valor': float(self.valor),
-            'data_despesa': self.data_despesa.isoformat(),
-            'categoria': self.categoria,
-            'comprovante_path': self.comprovante_path,
-            'nota_fiscal_id': self.nota_fiscal_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'id': registro.id,
+            'user_id': registro.user_id,
+            'descricao': registro.descricao,
+            'valor': float(registro.valor),
+            'data_despesa': registro.data_despesa.isoformat(),
+            'categoria': registro.categoria,
+            'comprovante_path': registro.comprovante_path,
+            'nota_fiscal_id': registro.nota_fiscal_id,
+            'created_at': registro.created_at.isoformat(),
+            'updated_at': registro.updated_at.isoformat()
         }
+    
+    def to_dict(self):
+        return Despesa.serializar(self)
 
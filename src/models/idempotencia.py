@@ -0,0 +1,27 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class ChaveIdempotencia(db.Model):
+    __tablename__ = 'chaves_idempotencia'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'chave', name='uq_chaves_idempotencia_user_chave'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # Chave enviada pelo cliente no header Idempotency-Key
+    chave = db.Column(db.String(255), nullable=False)
+    rota = db.Column(db.String(200), nullable=False)
+    # SHA-256 de método + caminho + corpo da requisição original
+    impressao = db.Column(db.String(64))
+    
+    # Resposta armazenada (status_code nulo = requisição ainda em processamento)
+    status_code = db.Column(db.Integer)
+    resposta = db.Column(db.Text)
+    mimetype = db.Column(db.String(100))
+    
+    # Controle
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
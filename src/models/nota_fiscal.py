@@ -4,6 +4,9 @@ from src.models.user import db
 
 class NotaFiscal(db.Model):
     __tablename__ = 'notas_fiscais'
+    __table_args__ = (
+        db.Index('idx_notas_fiscais_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -38,25 +41,65 @@ class NotaFiscal(db.Model):
     receitas = db.relationship('Receita', backref='nota_fiscal', lazy=True)
     despesas = db.relationship('Despesa', backref='nota_fiscal', lazy=True)
     
-    def to_dict(self):
+    # Campos serializados nas listagens (consultas somente leitura por colunas)
+    CAMPOS_LISTAGEM = (
+        'id', 'user_id', 'numero', 'serie', 'data_emissao', 'valor_total', 'tipo',
+        'categoria', 'arquivo_path', 'arquivo_nome', 'arquivo_tipo', 'cnpj_cpf',
+        'nome_razao_social', 'processada', 'associada_receita', 'associada_despesa',
+        'created_at', 'updated_at'
+    )
+    
+    @classmethod
+    def colunas_listagem(cls):
+        """Colunas selecionadas pelas listagens, sem hidratar objetos ORM"""
+        return [getattr(cls, campo) for campo in cls.CAMPOS_LISTAGEM]
+    
+    @staticmethod
+    def serializar(registro):
+        """Serializa uma instância ou uma linha projetada com as colunas de listagem"""
         return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'numero': self.numero,
-            'serie': self.serie,
-            'data_emissao': self.data_emissao.isoformat(),
-            'valor_total': float(self.valor_total),
-            'tipo': self.tipo,
-            'categoria': self.categoria,
-            'arquivo_path': self.arquivo_path,
-            'arquivo_nome': self.arquivo_nome,
-            'arquivo_tipo': self.arquivo_tipo,
-            'cnpj_cpf': self.cnpj_cpf,
-            'nome_razao_social': self.nome_razao_social,
-            'processada': self.processada,
-            'associada_receita': self.associada_receita,
-            'associada_despesa': self.associada_despesa,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
+            'id': registro.id,
+            'user_id': registro.user_id,
+            'numero': registro.numero,
+            'serie': registro.serie,
+            'data_emissao': registro.data_emissao.isoformat(),
+            'valor_total': float(registro.valor_total),
+            'tipo': registro.tipo,
+            'categoria': registro.categoria,
+            'arquivo_path': registro.arquivo_path,
+            'arquivo_nome': registro.arquivo_nome,
+            'arquivo_tipo': registro.arquivo_tipo,
+            'cnpj_cpf': registro.cnpj_cpf,
+            'nome_razao_social': registro.nome_razao_social,
+            'processada': registro.processada,
+            'associada_receita': registro.associada_receita,
+            'associada_despesa': registro.associada_despesa,
+            'created_at': registro.created_at.isoformat(),
+            'updated_at': registro.updated_at.isoformat()
         }
+    
+    def to_dict(self):
+        return NotaFiscal.serializar(self)
 
+class SugestaoAssociacao(db.Model):
+    __tablename__ = 'sugestoes_associacao'
+    __table_args__ = (
+        db.UniqueConstraint('nota_fiscal_id', 'tipo', 'item_id', name='uq_sugestoes_associacao_par'),
+        db.Index('idx_sugestoes_associacao_user_confianca', 'user_id', 'confianca'),
+        db.Index('idx_sugestoes_associacao_item', 'tipo', 'item_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # Par sugerido: nota fiscal x receita/despesa
+    nota_fiscal_id = db.Column(db.Integer, db.ForeignKey('notas_fiscais.id', ondelete='CASCADE'), nullable=False, index=True)
+    tipo = db.Column(db.String(20), nullable=False)  # receita, despesa
+    item_id = db.Column(db.Integer, nullable=False)
+    
+    # Critério da sugestão
+    confianca = db.Column(db.Integer, nullable=False)
+    diff_dias = db.Column(db.Integer, nullable=False)
+    
+    # Controle
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,49 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class NotificacaoOutbox(db.Model):
+    __tablename__ = 'notificacoes_outbox'
+    __table_args__ = (
+        # Um aviso por usuário, tipo e período (prazo) mesmo se o job rodar várias vezes
+        db.UniqueConstraint('user_id', 'tipo', 'periodo', name='uq_notificacoes_outbox_user_tipo_periodo'),
+        db.Index('idx_notificacoes_outbox_user_data', 'user_id', 'created_at'),
+        db.Index('idx_notificacoes_outbox_fila', 'status', 'proxima_tentativa_em'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # Identificação do aviso
+    tipo = db.Column(db.String(50), nullable=False)  # relatorio_mensal, das, dasn_simei, teste_*
+    periodo = db.Column(db.String(30), nullable=False)  # prazo (AAAA-MM-DD) a que o aviso se refere
+    
+    # Mensagem renderizada no momento do enfileiramento
+    destinatario = db.Column(db.String(255), nullable=False)
+    assunto = db.Column(db.String(255), nullable=False)
+    corpo = db.Column(db.Text, nullable=False)
+    
+    # Entrega: pendente, enviando, enviado, falhou
+    status = db.Column(db.String(20), nullable=False, default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    proxima_tentativa_em = db.Column(db.DateTime, default=datetime.utcnow)
+    bloqueado_em = db.Column(db.DateTime)
+    ultimo_erro = db.Column(db.Text)
+    
+    # Controle
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    enviado_em = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'periodo': self.periodo,
+            'assunto': self.assunto,
+            'destinatario': self.destinatario,
+            'status': self.status,
+            'tentativas': self.tentativas,
+            'ultimo_erro': self.ultimo_erro,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'enviado_em': self.enviado_em.isoformat() if self.enviado_em else None
+        }
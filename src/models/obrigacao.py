@@ -0,0 +1,28 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class EstadoObrigacoes(db.Model):
+    __tablename__ = 'estado_obrigacoes'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'ano', name='uq_estado_obrigacoes_user_ano'),
+        db.Index('idx_estado_obrigacoes_ano', 'ano', 'user_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    ano = db.Column(db.Integer, nullable=False)
+    
+    # Relatórios mensais gerados no ano: bit (mes - 1) ligado = mês entregue
+    meses_entregues = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Controle
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'ano': self.ano,
+            'meses_entregues': [mes for mes in range(1, 13) if self.meses_entregues & (1 << (mes - 1))],
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
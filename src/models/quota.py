@@ -0,0 +1,30 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class UsoQuota(db.Model):
+    __tablename__ = 'uso_quotas'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'recurso', 'periodo', name='uq_uso_quotas_user_recurso_periodo'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    
+    # Recurso limitado pelo plano (ex.: notas_fiscais) e mês de referência (AAAA-MM)
+    recurso = db.Column(db.String(50), nullable=False)
+    periodo = db.Column(db.String(7), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Controle
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'recurso': self.recurso,
+            'periodo': self.periodo,
+            'quantidade': self.quantidade,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,37 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class TarefaAgendada(db.Model):
+    __tablename__ = 'tarefas_agendadas'
+    
+    # Uma linha por tarefa: o lease garante que só um worker/contêiner a execute por vez
+    nome = db.Column(db.String(100), primary_key=True)
+    proxima_execucao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    bloqueado_ate = db.Column(db.DateTime)
+    dono = db.Column(db.String(255))
+    
+    # Métricas da última execução e acumuladas
+    ultima_execucao = db.Column(db.DateTime)
+    ultima_duracao_ms = db.Column(db.Integer)
+    ultimo_resultado = db.Column(db.String(255))
+    ultimo_erro = db.Column(db.Text)
+    execucoes = db.Column(db.Integer, nullable=False, default=0)
+    falhas = db.Column(db.Integer, nullable=False, default=0)
+    duracao_total_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    duracao_maxima_ms = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        return {
+            'nome': self.nome,
+            'proxima_execucao': self.proxima_execucao.isoformat() if self.proxima_execucao else None,
+            'em_execucao_por': self.dono if self.bloqueado_ate and self.bloqueado_ate > datetime.utcnow() else None,
+            'ultima_execucao': self.ultima_execucao.isoformat() if self.ultima_execucao else None,
+            'ultima_duracao_ms': self.ultima_duracao_ms,
+            'ultimo_resultado': self.ultimo_resultado,
+            'ultimo_erro': self.ultimo_erro,
+            'execucoes': self.execucoes,
+            'falhas': self.falhas,
+            'duracao_media_ms': round(self.duracao_total_ms / self.execucoes, 1) if self.execucoes else None,
+            'duracao_maxima_ms': self.duracao_maxima_ms
+        }
@@ -0,0 +1,36 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class RefreshToken(db.Model):
+    __tablename__ = 'refresh_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    
+    # jti do token e família de rotação (reuso de um token já trocado revoga a família)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    familia = db.Column(db.String(36), nullable=False, index=True)
+    
+    # Controle
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+    usado_em = db.Column(db.DateTime)
+    revogado = db.Column(db.Boolean, default=False, nullable=False)
+
+class RevogacaoToken(db.Model):
+    __tablename__ = 'revogacoes_token'
+    __table_args__ = (
+        db.Index('idx_revogacoes_token_created_at', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Revogação de um access token (jti) ou de todos os emitidos antes de revogado_antes
+    jti = db.Column(db.String(36))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    revogado_antes = db.Column(db.Integer)  # epoch (s), comparado ao iat
+    
+    # Controle (created_at: janela de sincronização da lista de revogação dos workers)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
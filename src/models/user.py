@@ -1,11 +1,28 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import datetime, date
+from src.services.senhas import gerar_hash, verificar_senha
 
 db = SQLAlchemy()
 
+def calcular_status_efetivo(status_pagamento, data_vencimento, hoje=None):
+    """Status considerando o vencimento, mesmo antes da varredura persistir 'vencido'"""
+    hoje = hoje or date.today()
+    if status_pagamento == 'ativo' and data_vencimento and data_vencimento < hoje:
+        return 'vencido'
+    return status_pagamento
+
 class User(db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Varredura de planos vencidos: só interessa quem ainda está 'ativo'
+        db.Index(
+            'idx_users_vencimento_ativos', 'data_vencimento',
+            postgresql_where=db.text("status_pagamento = 'ativo'")
+        ),
+        # Varredura das notificações automáticas (paginação por id entre os ativos)
+        db.Index('idx_users_ativos', 'id', postgresql_where=db.text('is_active')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -22,15 +39,20 @@ class User(db.Model):
     
     # Plano de assinatura
     plano = db.Column(db.String(20), default='basico')  # basico, avancado
-    status_pagamento = db.Column(db.String(20), default='ativo')  # ativo, inadimplente, cancelado
+    status_pagamento = db.Column(db.String(20), default='ativo')  # ativo, inadimplente, cancelado, vencido
     data_vencimento = db.Column(db.Date)
+    stripe_customer_id = db.Column(db.String(255), unique=True)
+    stripe_ultimo_evento = db.Column(db.Integer)  # 'created' (epoch) do último evento aplicado ao status
     
     # Controle de acesso
     is_admin = db.Column(db.Boolean, default=False)
     is_active = db.Column(db.Boolean, default=True)
     
+    # Versão dos dados financeiros (incrementada a cada escrita; base dos ETags HTTP)
+    versao_dados = db.Column(db.Integer, nullable=False, default=0)
+    
     # Configurações de notificação
-    configuracoes_notificacao = db.Column(db.Text)  # JSON com configurações
+    configuracoes_notificacao = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))  # JSONB no PostgreSQL
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -42,11 +64,15 @@ class User(db.Model):
     notas_fiscais = db.relationship('NotaFiscal', backref='usuario', lazy=True)
     relatorios = db.relationship('RelatorioMensal', backref='usuario', lazy=True)
     
+    @property
+    def status_efetivo(self):
+        return calcular_status_efetivo(self.status_pagamento, self.data_vencimento)
+    
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = gerar_hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verificar_senha(self.password_hash, password)
     
     def to_dict(self):
         return {
@@ -6,7 +6,12 @@ from src.models.user import db, User
 from src.models.financeiro import Receita, Despesa
 from src.models.nota_fiscal import NotaFiscal
 from src.models.relatorio import RelatorioMensal
-from src.middleware.auth import token_required
+from src.middleware.auth import token_required, invalidar_cache_usuario
+from src.services.tokens import revogar_tokens_usuario
+from src.services.autenticacao import estatisticas_autenticacao
+from src.services.agendador import estatisticas_agendador
+from src.services.cache import estatisticas_cache
+from src.services.banco import estatisticas_pool
 import json
 
 admin_bp = Blueprint('admin', __name__)
@@ -314,7 +319,10 @@ def alterar_status_usuario(user_id):
             usuario.plano = novo_plano
         
         usuario.updated_at = datetime.utcnow()
+        # Access tokens carregam status/plano: forçar o refresh (ou bloquear se desativado)
+        revogar_tokens_usuario(usuario.id)
         db.session.commit()
+        invalidar_cache_usuario(usuario.id)
         
         return jsonify({
             'message': 'Status do usuário atualizado com sucesso',
@@ -516,6 +524,50 @@ def metricas_uso():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/admin/metricas/autenticacao', methods=['GET'])
+@token_required
+@admin_required
+def metricas_autenticacao():
+    """Tempo de autenticação por endpoint e eficiência do cache de tokens (por processo)"""
+    try:
+        return jsonify(estatisticas_autenticacao()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/metricas/agendador', methods=['GET'])
+@token_required
+@admin_required
+def metricas_agendador():
+    """Próxima execução, duração e falhas de cada tarefa agendada (compartilhado entre workers)"""
+    try:
+        return jsonify({'tarefas': estatisticas_agendador()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/metricas/cache', methods=['GET'])
+@token_required
+@admin_required
+def metricas_cache_respostas():
+    """Acertos/falhas por rota e ocupação do cache de respostas (por processo)"""
+    try:
+        return jsonify(estatisticas_cache()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/metricas/banco', methods=['GET'])
+@token_required
+@admin_required
+def metricas_banco():
+    """Uso do pool de conexões e tempo de espera por conexão (por processo)"""
+    try:
+        return jsonify(estatisticas_pool()), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/admin/exportar/usuarios', methods=['GET'])
 @token_required
 @admin_required
@@ -1,9 +1,17 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, g
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import jwt
 from src.models.user import db, User
 from src.config import Config
+from src.middleware.rate_limit import limitar_taxa
+from src.middleware.auth import token_required
+from src.middleware.cache_http import marcar_dados_alterados
+from src.services.tokens import (
+    emitir_tokens, decodificar_refresh_token, rotacionar_refresh_token,
+    revogar_familia, revogar_token_acesso
+)
+from src.services.senhas import precisa_rehash
 import re
 
 auth_bp = Blueprint('auth', __name__)
@@ -37,6 +45,7 @@ def validate_password(password):
     return True
 
 @auth_bp.route('/register', methods=['POST'])
+@limitar_taxa('register', ('ip', Config.RATE_LIMIT_REGISTER_IP))
 def register():
     try:
         data = request.get_json()
@@ -87,17 +96,15 @@ def register():
         user.set_password(password)
         
         db.session.add(user)
-        db.session.commit()
+        db.session.flush()
         
-        # Gerar token JWT
-        token = jwt.encode({
-            'user_id': user.id,
-            'exp': datetime.utcnow() + timedelta(hours=24)
-        }, Config.SECRET_KEY, algorithm='HS256')
+        # Gerar access token (curto) e refresh token
+        tokens = emitir_tokens(user)
+        db.session.commit()
         
         return jsonify({
             'message': 'Usuário cadastrado com sucesso',
-            'token': token,
+            **tokens,
             'user': user.to_dict()
         }), 201
         
@@ -106,6 +113,7 @@ def register():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@limitar_taxa('login', ('ip', Config.RATE_LIMIT_LOGIN_IP), ('email', Config.RATE_LIMIT_LOGIN_EMAIL))
 def login():
     try:
         data = request.get_json()
@@ -119,48 +127,102 @@ def login():
         # Buscar usuário
         user = User.query.filter_by(email=email).first()
         
-        if not user or not user.check_password(password):
+        if not user:
+            return jsonify({'error': 'Email ou senha inválidos'}), 401
+        
+        if not user.check_password(password):
             return jsonify({'error': 'Email ou senha inválidos'}), 401
         
         if not user.is_active:
             return jsonify({'error': 'Conta desativada'}), 401
         
-        # Gerar token JWT
-        token = jwt.encode({
-            'user_id': user.id,
-            'exp': datetime.utcnow() + timedelta(hours=24)
-        }, Config.SECRET_KEY, algorithm='HS256')
+        # Algoritmo ou custo mudou desde o cadastro: refazer o hash com a senha em mãos
+        if precisa_rehash(user.password_hash):
+            user.set_password(password)
+        
+        # Gerar access token (curto) e refresh token
+        tokens = emitir_tokens(user)
+        db.session.commit()
         
         return jsonify({
             'message': 'Login realizado com sucesso',
-            'token': token,
+            **tokens,
             'user': user.to_dict()
         }), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@auth_bp.route('/profile', methods=['GET'])
-def get_profile():
+@auth_bp.route('/refresh', methods=['POST'])
+def refresh():
+    """Troca um refresh token por um novo par (o refresh token usado deixa de valer)"""
     try:
-        # Verificar token
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Token não fornecido'}), 401
-        
-        if token.startswith('Bearer '):
-            token = token[7:]
+        data = request.get_json(silent=True) or {}
+        refresh_token = data.get('refresh_token')
+        if not refresh_token:
+            return jsonify({'error': 'refresh_token é obrigatório'}), 400
         
         try:
-            payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-            user_id = payload['user_id']
+            payload = decodificar_refresh_token(refresh_token)
         except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expirado'}), 401
+            return jsonify({'error': 'Refresh token expirado'}), 401
         except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token inválido'}), 401
+            return jsonify({'error': 'Refresh token inválido'}), 401
+        
+        familia = rotacionar_refresh_token(payload)
+        if familia is None:
+            # Persistir a revogação da família em caso de reuso
+            db.session.commit()
+            return jsonify({'error': 'Refresh token inválido ou já utilizado'}), 401
+        
+        # Única consulta ao usuário: claims novas de plano/status
+        user = User.query.get(payload['user_id'])
+        if not user or not user.is_active:
+            revogar_familia(familia)
+            db.session.commit()
+            return jsonify({'error': 'Conta desativada'}), 401
+        
+        tokens = emitir_tokens(user, familia)
+        db.session.commit()
+        
+        return jsonify(tokens), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+@token_required
+def logout():
+    """Revoga o access token atual e, se enviado, a família do refresh token"""
+    try:
+        payload = g.token_payload
+        if payload.get('jti'):
+            revogar_token_acesso(payload)
+        
+        refresh_token = (request.get_json(silent=True) or {}).get('refresh_token')
+        if refresh_token:
+            try:
+                refresh_payload = decodificar_refresh_token(refresh_token)
+                if refresh_payload['user_id'] == payload['user_id']:
+                    revogar_familia(refresh_payload['familia'])
+            except jwt.InvalidTokenError:
+                pass
+        
+        db.session.commit()
+        return jsonify({'message': 'Logout realizado com sucesso'}), 200
         
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/profile', methods=['GET'])
+@token_required
+def get_profile():
+    try:
         # Buscar usuário
-        user = User.query.get(user_id)
+        user = g.current_user.carregar()
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
@@ -170,26 +232,11 @@ def get_profile():
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/profile', methods=['PUT'])
+@token_required
 def update_profile():
     try:
-        # Verificar token
-        token = request.headers.get('Authorization')
-        if not token:
-            return jsonify({'error': 'Token não fornecido'}), 401
-        
-        if token.startswith('Bearer '):
-            token = token[7:]
-        
-        try:
-            payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-            user_id = payload['user_id']
-        except jwt.ExpiredSignatureError:
-            return jsonify({'error': 'Token expirado'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token inválido'}), 401
-        
         # Buscar usuário
-        user = User.query.get(user_id)
+        user = g.current_user.carregar()
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
@@ -202,6 +249,7 @@ def update_profile():
                 setattr(user, field, data[field])
         
         user.updated_at = datetime.utcnow()
+        marcar_dados_alterados(g.current_user.id)
         db.session.commit()
         
         return jsonify({
@@ -4,53 +4,97 @@ from sqlalchemy import func, extract
 from src.models.user import db
 from src.models.financeiro import Receita, Despesa
 from src.middleware.auth import token_required, plano_ativo_required
+from src.middleware.idempotencia import idempotente
+from src.middleware.cache_http import marcar_dados_alterados, etag_condicional, resposta_em_cache
+from src.services.importacao import ler_csv, ler_ofx, importar_lancamentos
+from src.services.associacao import (
+    tipo_lancamento, processar_novo_lancamento, remover_sugestoes_itens, reconstruir_sugestoes
+)
+from src.config import Config
 import calendar
 
 financeiro_bp = Blueprint('financeiro', __name__)
 
+CATEGORIAS_RECEITA = ['comercio', 'servicos', 'industria', 'outros']
+CATEGORIAS_DESPESA = ['material', 'equipamento', 'servicos', 'outros']
+
+def validar_lancamento(data, campo_data, categorias_validas):
+    """Valida os dados de uma receita/despesa. Retorna (dados, erro)"""
+    # Validação dos campos obrigatórios
+    required_fields = ['descricao', 'valor', campo_data, 'categoria']
+    for field in required_fields:
+        if not data.get(field):
+            return None, f'Campo {field} é obrigatório'
+    
+    # Validar categoria
+    if data['categoria'] not in categorias_validas:
+        return None, 'Categoria inválida'
+    
+    # Validar valor
+    try:
+        valor = float(data['valor'])
+        if valor <= 0:
+            return None, 'Valor deve ser maior que zero'
+    except (ValueError, TypeError):
+        return None, 'Valor inválido'
+    
+    # Validar data
+    try:
+        data_lancamento = datetime.strptime(data[campo_data], '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        return None, 'Data inválida. Use o formato YYYY-MM-DD'
+    
+    return {
+        'descricao': data['descricao'],
+        'valor': valor,
+        campo_data: data_lancamento,
+        'categoria': data['categoria'],
+        'comprovante_path': data.get('comprovante_path')
+    }, None
+
+def aplicar_filtros_lancamento(query, coluna_data, coluna_categoria, mes=None, ano=None, categoria=None):
+    """Aplica os filtros de período e categoria usados nas listagens e operações em lote"""
+    if mes and ano:
+        query = query.filter(
+            extract('month', coluna_data) == mes,
+            extract('year', coluna_data) == ano
+        )
+    elif ano:
+        query = query.filter(extract('year', coluna_data) == ano)
+    
+    if categoria:
+        query = query.filter(coluna_categoria == categoria)
+    
+    return query
+
+def validar_receita(data):
+    return validar_lancamento(data, 'data_receita', CATEGORIAS_RECEITA)
+
+def validar_despesa(data):
+    return validar_lancamento(data, 'data_despesa', CATEGORIAS_DESPESA)
+
 @financeiro_bp.route('/receitas', methods=['POST'])
 @plano_ativo_required
+@idempotente
 def criar_receita():
     """Criar nova receita"""
     try:
         data = request.get_json()
         
-        # Validação dos campos obrigatórios
-        required_fields = ['descricao', 'valor', 'data_receita', 'categoria']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'error': f'Campo {field} é obrigatório'}), 400
-        
-        # Validar categoria
-        categorias_validas = ['comercio', 'servicos', 'industria', 'outros']
-        if data['categoria'] not in categorias_validas:
-            return jsonify({'error': 'Categoria inválida'}), 400
-        
-        # Validar valor
-        try:
-            valor = float(data['valor'])
-            if valor <= 0:
-                return jsonify({'error': 'Valor deve ser maior que zero'}), 400
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Valor inválido'}), 400
-        
-        # Validar data
-        try:
-            data_receita = datetime.strptime(data['data_receita'], '%Y-%m-%d').date()
-        except ValueError:
-            return jsonify({'error': 'Data inválida. Use o formato YYYY-MM-DD'}), 400
+        # Validar campos (mesmas regras da importação em lote)
+        dados, erro = validar_receita(data)
+        if erro:
+            return jsonify({'error': erro}), 400
         
         # Criar receita
-        receita = Receita(
-            user_id=g.current_user.id,
-            descricao=data['descricao'],
-            valor=valor,
-            data_receita=data_receita,
-            categoria=data['categoria'],
-            comprovante_path=data.get('comprovante_path')
-        )
+        receita = Receita(user_id=g.current_user.id, **dados)
         
         db.session.add(receita)
+        db.session.flush()
+        
+        # Casar com notas fiscais pendentes (associa automaticamente se inequívoco)
+        processar_novo_lancamento('receita', receita)
+        marcar_dados_alterados(g.current_user.id)
         db.session.commit()
         
         return jsonify({
@@ -64,6 +108,7 @@ def criar_receita():
 
 @financeiro_bp.route('/receitas', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def listar_receitas():
     """Listar receitas do usuário"""
     try:
@@ -78,27 +123,21 @@ def listar_receitas():
         query = Receita.query.filter_by(user_id=g.current_user.id)
         
         # Aplicar filtros
-        if mes and ano:
-            query = query.filter(
-                extract('month', Receita.data_receita) == mes,
-                extract('year', Receita.data_receita) == ano
-            )
-        elif ano:
-            query = query.filter(extract('year', Receita.data_receita) == ano)
-        
-        if categoria:
-            query = query.filter(Receita.categoria == categoria)
+        query = aplicar_filtros_lancamento(query, Receita.data_receita, Receita.categoria, mes, ano, categoria)
         
         # Ordenar por data mais recente
         query = query.order_by(Receita.data_receita.desc())
         
+        # Projetar apenas as colunas serializadas (leitura sem hidratar objetos ORM)
+        query = query.with_entities(*Receita.colunas_listagem())
+        
         # Paginação
         receitas_paginadas = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'receitas': [receita.to_dict() for receita in receitas_paginadas.items],
+            'receitas': [Receita.serializar(linha) for linha in receitas_paginadas.items],
             'total': receitas_paginadas.total,
             'pages': receitas_paginadas.pages,
             'current_page': page,
@@ -126,6 +165,8 @@ def atualizar_receita(receita_id):
         if 'descricao' in data:
             receita.descricao = data['descricao']
         
+        valor_ou_data_alterados = 'valor' in data or 'data_receita' in data
+        
         if 'valor' in data:
             try:
                 valor = float(data['valor'])
@@ -142,12 +183,19 @@ def atualizar_receita(receita_id):
                 return jsonify({'error': 'Data inválida. Use o formato YYYY-MM-DD'}), 400
         
         if 'categoria' in data:
-            categorias_validas = ['comercio', 'servicos', 'industria', 'outros']
-            if data['categoria'] not in categorias_validas:
+            if data['categoria'] not in CATEGORIAS_RECEITA:
                 return jsonify({'error': 'Categoria inválida'}), 400
             receita.categoria = data['categoria']
         
         receita.updated_at = datetime.utcnow()
+        
+        # Sugestões dependem de valor e data: recalcular apenas para esta receita
+        if valor_ou_data_alterados and receita.nota_fiscal_id is None:
+            remover_sugestoes_itens('receita', [receita.id])
+            db.session.flush()
+            processar_novo_lancamento('receita', receita)
+        
+        marcar_dados_alterados(g.current_user.id)
         db.session.commit()
         
         return jsonify({
@@ -171,7 +219,9 @@ def deletar_receita(receita_id):
         if not receita:
             return jsonify({'error': 'Receita não encontrada'}), 404
         
+        remover_sugestoes_itens('receita', [receita.id])
         db.session.delete(receita)
+        marcar_dados_alterados(g.current_user.id)
         db.session.commit()
         
         return jsonify({'message': 'Receita deletada com sucesso'}), 200
@@ -182,47 +232,26 @@ def deletar_receita(receita_id):
 
 @financeiro_bp.route('/despesas', methods=['POST'])
 @plano_ativo_required
+@idempotente
 def criar_despesa():
     """Criar nova despesa"""
     try:
         data = request.get_json()
         
-        # Validação dos campos obrigatórios
-        required_fields = ['descricao', 'valor', 'data_despesa', 'categoria']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'error': f'Campo {field} é obrigatório'}), 400
-        
-        # Validar categoria
-        categorias_validas = ['material', 'equipamento', 'servicos', 'outros']
-        if data['categoria'] not in categorias_validas:
-            return jsonify({'error': 'Categoria inválida'}), 400
-        
-        # Validar valor
-        try:
-            valor = float(data['valor'])
-            if valor <= 0:
-                return jsonify({'error': 'Valor deve ser maior que zero'}), 400
-        except (ValueError, TypeError):
-            return jsonify({'error': 'Valor inválido'}), 400
-        
-        # Validar data
-        try:
-            data_despesa = datetime.strptime(data['data_despesa'], '%Y-%m-%d').date()
-        except ValueError:
-            return jsonify({'error': 'Data inválida. Use o formato YYYY-MM-DD'}), 400
+        # Validar campos (mesmas regras da importação em lote)
+        dados, erro = validar_despesa(data)
+        if erro:
+            return jsonify({'error': erro}), 400
         
         # Criar despesa
-        despesa = Despesa(
-            user_id=g.current_user.id,
-            descricao=data['descricao'],
-            valor=valor,
-            data_despesa=data_despesa,
-            categoria=data['categoria'],
-            comprovante_path=data.get('comprovante_path')
-        )
+        despesa = Despesa(user_id=g.current_user.id, **dados)
         
         db.session.add(despesa)
+        db.session.flush()
+        
+        # Casar com notas fiscais pendentes (associa automaticamente se inequívoco)
+        processar_novo_lancamento('despesa', despesa)
+        marcar_dados_alterados(g.current_user.id)
         db.session.commit()
         
         return jsonify({
@@ -236,6 +265,7 @@ def criar_despesa():
 
 @financeiro_bp.route('/despesas', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def listar_despesas():
     """Listar despesas do usuário"""
     try:
@@ -250,27 +280,21 @@ def listar_despesas():
         query = Despesa.query.filter_by(user_id=g.current_user.id)
         
         # Aplicar filtros
-        if mes and ano:
-            query = query.filter(
-                extract('month', Despesa.data_despesa) == mes,
-                extract('year', Despesa.data_despesa) == ano
-            )
-        elif ano:
-            query = query.filter(extract('year', Despesa.data_despesa) == ano)
-        
-        if categoria:
-            query = query.filter(Despesa.categoria == categoria)
+        query = aplicar_filtros_lancamento(query, Despesa.data_despesa, Despesa.categoria, mes, ano, categoria)
         
         # Ordenar por data mais recente
         query = query.order_by(Despesa.data_despesa.desc())
         
+        # Projetar apenas as colunas serializadas (leitura sem hidratar objetos ORM)
+        query = query.with_entities(*Despesa.colunas_listagem())
+        
         # Paginação
         despesas_paginadas = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'despesas': [despesa.to_dict() for despesa in despesas_paginadas.items],
+            'despesas': [Despesa.serializar(linha) for linha in despesas_paginadas.items],
             'total': despesas_paginadas.total,
             'pages': despesas_paginadas.pages,
             'current_page': page,
@@ -280,8 +304,234 @@ def listar_despesas():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def selecionar_lote(modelo, campo_data, data):
+    """Monta a query do lote a partir de uma lista de ids ou de um filtro, sempre restrita ao usuário"""
+    ids = data.get('ids')
+    filtro = data.get('filtro')
+    if filtro is None:
+        filtro = {}
+    if not isinstance(filtro, dict):
+        return None, 'Filtro inválido'
+    
+    query = modelo.query.filter(modelo.user_id == g.current_user.id)
+    
+    if ids:
+        if not isinstance(ids, list) or not all(isinstance(item_id, int) for item_id in ids):
+            return None, 'Lista de ids inválida'
+        return query.filter(modelo.id.in_(ids)), None
+    
+    # Presença pela chave (0 ou '' não podem virar "sem filtro" e ampliar o lote)
+    if all(filtro.get(campo) is None for campo in ('mes', 'ano', 'categoria')):
+        return None, 'Informe ids ou um filtro (mes, ano, categoria)'
+    
+    try:
+        mes = int(filtro['mes']) if filtro.get('mes') is not None else None
+        ano = int(filtro['ano']) if filtro.get('ano') is not None else None
+    except (ValueError, TypeError):
+        return None, 'Filtro de período inválido'
+    
+    # mes sem ano seria ignorado pelo filtro e o lote atingiria todos os lançamentos do usuário
+    if mes is not None:
+        if ano is None:
+            return None, 'Filtro por mes requer ano'
+        if not 1 <= mes <= 12:
+            return None, 'Mês inválido (1 a 12)'
+    if ano is not None and ano < 1:
+        return None, 'Ano inválido'
+    
+    categoria = filtro.get('categoria')
+    if categoria is not None and (not isinstance(categoria, str) or not categoria):
+        return None, 'Categoria inválida'
+    
+    return aplicar_filtros_lancamento(
+        query, getattr(modelo, campo_data), modelo.categoria, mes, ano, categoria
+    ), None
+
+def validar_campos_lote(campos, campo_data, categorias_validas):
+    """Valida os campos de uma atualização em lote. Retorna (valores, erro)"""
+    valores = {}
+    
+    if 'descricao' in campos:
+        if not campos['descricao']:
+            return None, 'Campo descricao é obrigatório'
+        valores['descricao'] = campos['descricao']
+    
+    if 'valor' in campos:
+        try:
+            valor = float(campos['valor'])
+            if valor <= 0:
+                return None, 'Valor deve ser maior que zero'
+            valores['valor'] = valor
+        except (ValueError, TypeError):
+            return None, 'Valor inválido'
+    
+    if campo_data in campos:
+        try:
+            valores[campo_data] = datetime.strptime(campos[campo_data], '%Y-%m-%d').date()
+        except (ValueError, TypeError):
+            return None, 'Data inválida. Use o formato YYYY-MM-DD'
+    
+    if 'categoria' in campos:
+        if campos['categoria'] not in categorias_validas:
+            return None, 'Categoria inválida'
+        valores['categoria'] = campos['categoria']
+    
+    if not valores:
+        return None, 'Nenhum campo para atualizar'
+    
+    return valores, None
+
+def atualizar_lote(modelo, campo_data, categorias_validas):
+    """UPDATE único (set-based) sobre as receitas/despesas selecionadas"""
+    data = request.get_json() or {}
+    
+    valores, erro = validar_campos_lote(data.get('campos') or {}, campo_data, categorias_validas)
+    if erro:
+        return jsonify({'error': erro}), 400
+    
+    query, erro = selecionar_lote(modelo, campo_data, data)
+    if erro:
+        return jsonify({'error': erro}), 400
+    
+    valores['updated_at'] = datetime.utcnow()
+    atualizadas = query.update(valores, synchronize_session=False)
+    
+    # Valor/data alterados em lote: recalcular as sugestões do usuário de uma vez
+    if 'valor' in valores or campo_data in valores:
+        reconstruir_sugestoes(g.current_user.id)
+    
+    marcar_dados_alterados(g.current_user.id)
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'{atualizadas} registros atualizados com sucesso',
+        'atualizadas': atualizadas
+    }), 200
+
+def deletar_lote(modelo, campo_data):
+    """DELETE único (set-based) sobre as receitas/despesas selecionadas"""
+    data = request.get_json() or {}
+    
+    query, erro = selecionar_lote(modelo, campo_data, data)
+    if erro:
+        return jsonify({'error': erro}), 400
+    
+    remover_sugestoes_itens(tipo_lancamento(modelo), query.with_entities(modelo.id))
+    deletadas = query.delete(synchronize_session=False)
+    marcar_dados_alterados(g.current_user.id)
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'{deletadas} registros deletados com sucesso',
+        'deletadas': deletadas
+    }), 200
+
+@financeiro_bp.route('/receitas/lote', methods=['PUT'])
+@plano_ativo_required
+def atualizar_receitas_lote():
+    """Atualizar várias receitas (por ids ou filtro) numa única transação"""
+    try:
+        return atualizar_lote(Receita, 'data_receita', CATEGORIAS_RECEITA)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@financeiro_bp.route('/receitas/lote', methods=['DELETE'])
+@plano_ativo_required
+def deletar_receitas_lote():
+    """Deletar várias receitas (por ids ou filtro) numa única transação"""
+    try:
+        return deletar_lote(Receita, 'data_receita')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@financeiro_bp.route('/despesas/lote', methods=['PUT'])
+@plano_ativo_required
+def atualizar_despesas_lote():
+    """Atualizar várias despesas (por ids ou filtro) numa única transação"""
+    try:
+        return atualizar_lote(Despesa, 'data_despesa', CATEGORIAS_DESPESA)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@financeiro_bp.route('/despesas/lote', methods=['DELETE'])
+@plano_ativo_required
+def deletar_despesas_lote():
+    """Deletar várias despesas (por ids ou filtro) numa única transação"""
+    try:
+        return deletar_lote(Despesa, 'data_despesa')
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def importar_arquivo(modelo, validar, campo_data, sinal_ofx):
+    """Importa receitas/despesas de um arquivo CSV ou OFX enviado no campo 'arquivo'"""
+    if 'arquivo' not in request.files:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+    
+    file = request.files['arquivo']
+    if file.filename == '':
+        return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+    
+    formato = (request.form.get('formato') or file.filename.rsplit('.', 1)[-1]).lower()
+    categoria_padrao = request.form.get('categoria', 'outros')
+    tudo_ou_nada = request.form.get('tudo_ou_nada', 'false').lower() == 'true'
+    
+    if formato == 'csv':
+        linhas = ler_csv(file.stream, campo_data, categoria_padrao)
+    elif formato == 'ofx':
+        linhas = ler_ofx(file.stream, campo_data, sinal_ofx, categoria_padrao)
+    else:
+        return jsonify({'error': 'Formato não suportado. Use CSV ou OFX'}), 400
+    
+    resumo = importar_lancamentos(
+        modelo, linhas, validar, g.current_user.id,
+        tamanho_lote=Config.IMPORTACAO_TAMANHO_LOTE
+    )
+    
+    # Uma única transação: os totais nunca refletem uma importação parcial
+    if tudo_ou_nada and resumo['total_erros']:
+        db.session.rollback()
+        resumo['importadas'] = 0
+        return jsonify({'error': 'Importação cancelada: o arquivo contém linhas inválidas', **resumo}), 400
+    
+    # Na mesma transação: sugestões de associação consistentes com os novos lançamentos
+    if resumo['importadas']:
+        reconstruir_sugestoes(g.current_user.id)
+    
+    marcar_dados_alterados(g.current_user.id)
+    db.session.commit()
+    
+    return jsonify({'message': f'{resumo["importadas"]} lançamentos importados', **resumo}), 200
+
+@financeiro_bp.route('/receitas/importar', methods=['POST'])
+@plano_ativo_required
+@idempotente
+def importar_receitas():
+    """Importar receitas em lote a partir de CSV ou extrato OFX (créditos)"""
+    try:
+        return importar_arquivo(Receita, validar_receita, 'data_receita', 1)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@financeiro_bp.route('/despesas/importar', methods=['POST'])
+@plano_ativo_required
+@idempotente
+def importar_despesas():
+    """Importar despesas em lote a partir de CSV ou extrato OFX (débitos)"""
+    try:
+        return importar_arquivo(Despesa, validar_despesa, 'data_despesa', -1)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @financeiro_bp.route('/dashboard', methods=['GET'])
 @plano_ativo_required
+@etag_condicional(por_dia=True)
+@resposta_em_cache(por_dia=True)
 def dashboard():
     """Dashboard com resumo financeiro"""
     try:
@@ -6,7 +6,13 @@ from datetime import datetime
 from src.models.user import db
 from src.models.nota_fiscal import NotaFiscal
 from src.models.financeiro import Receita, Despesa
-from src.middleware.auth import token_required, plano_ativo_required, verificar_limite_notas_fiscais
+from src.middleware.auth import token_required, plano_ativo_required
+from src.middleware.idempotencia import idempotente
+from src.middleware.cache_http import marcar_dados_alterados, etag_condicional
+from src.services.associacao import (
+    sugerir_associacoes, processar_nova_nota, remover_sugestoes_nota, associar, serializar_sugestao
+)
+from src.services.quotas import consumir_quota, liberar_quota, periodo_atual
 from src.config import Config
 import mimetypes
 
@@ -94,15 +100,11 @@ def process_nota_fiscal_text(text):
 
 @notas_fiscais_bp.route('/notas-fiscais/upload', methods=['POST'])
 @plano_ativo_required
+@idempotente
 def upload_nota_fiscal():
     """Upload de nota fiscal"""
+    quota_consumida = False
     try:
-        # Verificar limite do plano
-        if not verificar_limite_notas_fiscais(g.current_user):
-            return jsonify({
-                'error': 'Limite de notas fiscais atingido para o seu plano. Faça upgrade para o plano avançado.'
-            }), 403
-        
         # Verificar se há arquivo
         if 'arquivo' not in request.files:
             return jsonify({'error': 'Nenhum arquivo enviado'}), 400
@@ -114,6 +116,13 @@ def upload_nota_fiscal():
         if not allowed_file(file.filename):
             return jsonify({'error': 'Tipo de arquivo não permitido. Use PDF, JPG, PNG ou JPEG'}), 400
         
+        # Reservar uma nota da quota mensal do plano (atômico; devolvida se o upload falhar)
+        if consumir_quota(g.current_user.id, g.current_user.plano, 'notas_fiscais') is None:
+            return jsonify({
+                'error': 'Limite de notas fiscais atingido para o seu plano. Faça upgrade para o plano avançado.'
+            }), 403
+        quota_consumida = True
+        
         # Dados adicionais do formulário
         tipo = request.form.get('tipo', 'entrada')  # entrada ou saida
         categoria = request.form.get('categoria', '')
@@ -156,20 +165,30 @@ def upload_nota_fiscal():
         )
         
         db.session.add(nota_fiscal)
+        db.session.flush()
+        
+        # Casar apenas esta nota com as receitas/despesas pendentes
+        associacao = processar_nova_nota(nota_fiscal)
+        marcar_dados_alterados(g.current_user.id)
         db.session.commit()
         
         return jsonify({
             'message': 'Nota fiscal enviada com sucesso',
             'nota_fiscal': nota_fiscal.to_dict(),
-            'informacoes_extraidas': extracted_info
+            'informacoes_extraidas': extracted_info,
+            'associacao_automatica': serializar_sugestao(associacao) if associacao else None
         }), 201
         
     except Exception as e:
         db.session.rollback()
+        if quota_consumida:
+            liberar_quota(g.current_user.id, 'notas_fiscais')
+            db.session.commit()
         return jsonify({'error': str(e)}), 500
 
 @notas_fiscais_bp.route('/notas-fiscais', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def listar_notas_fiscais():
     """Listar notas fiscais do usuário"""
     try:
@@ -196,13 +215,16 @@ def listar_notas_fiscais():
         # Ordenar por data mais recente
         query = query.order_by(NotaFiscal.created_at.desc())
         
+        # Projetar apenas as colunas serializadas (leitura sem hidratar objetos ORM)
+        query = query.with_entities(*NotaFiscal.colunas_listagem())
+        
         # Paginação
         notas_paginadas = query.paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'notas_fiscais': [nota.to_dict() for nota in notas_paginadas.items],
+            'notas_fiscais': [NotaFiscal.serializar(linha) for linha in notas_paginadas.items],
             'total': notas_paginadas.total,
             'pages': notas_paginadas.pages,
             'current_page': page,
@@ -214,6 +236,7 @@ def listar_notas_fiscais():
 
 @notas_fiscais_bp.route('/notas-fiscais/<int:nota_id>', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def obter_nota_fiscal(nota_id):
     """Obter detalhes de uma nota fiscal"""
     try:
@@ -288,6 +311,15 @@ def atualizar_nota_fiscal(nota_id):
                 return jsonify({'error': 'Data inválida. Use o formato YYYY-MM-DD'}), 400
         
         nota.updated_at = datetime.utcnow()
+        
+        # Sugestões dependem de valor, data e tipo: recalcular apenas para esta nota
+        if any(campo in data for campo in ('valor_total', 'data_emissao', 'tipo')) and \
+                not (nota.associada_receita or nota.associada_despesa):
+            remover_sugestoes_nota(nota.id)
+            db.session.flush()
+            processar_nova_nota(nota)
+        
+        marcar_dados_alterados(g.current_user.id)
         db.session.commit()
         
         return jsonify({
@@ -315,7 +347,13 @@ def deletar_nota_fiscal(nota_id):
         if os.path.exists(nota.arquivo_path):
             os.remove(nota.arquivo_path)
         
+        # Notas enviadas no mês corrente voltam para a quota
+        if nota.created_at and nota.created_at.strftime('%Y-%m') == periodo_atual():
+            liberar_quota(g.current_user.id, 'notas_fiscais')
+        
+        remover_sugestoes_nota(nota.id)
         db.session.delete(nota)
+        marcar_dados_alterados(g.current_user.id)
         db.session.commit()
         
         return jsonify({'message': 'Nota fiscal deletada com sucesso'}), 200
@@ -348,8 +386,7 @@ def associar_nota_fiscal(nota_id):
             if not receita:
                 return jsonify({'error': 'Receita não encontrada'}), 404
             
-            receita.nota_fiscal_id = nota.id
-            nota.associada_receita = True
+            associar(nota, 'receita', receita)
             
         elif tipo_associacao == 'despesa':
             despesa = Despesa.query.filter_by(
@@ -359,13 +396,12 @@ def associar_nota_fiscal(nota_id):
             if not despesa:
                 return jsonify({'error': 'Despesa não encontrada'}), 404
             
-            despesa.nota_fiscal_id = nota.id
-            nota.associada_despesa = True
+            associar(nota, 'despesa', despesa)
             
         else:
             return jsonify({'error': 'Tipo de associação inválido'}), 400
         
-        nota.updated_at = datetime.utcnow()
+        marcar_dados_alterados(g.current_user.id)
         db.session.commit()
         
         return jsonify({
@@ -379,72 +415,18 @@ def associar_nota_fiscal(nota_id):
 
 @notas_fiscais_bp.route('/notas-fiscais/sugestoes-associacao', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def sugestoes_associacao():
     """Sugerir associações automáticas baseadas em valores e datas"""
     try:
-        # Buscar notas fiscais não associadas
-        notas_nao_associadas = NotaFiscal.query.filter_by(
-            user_id=g.current_user.id,
-            associada_receita=False,
-            associada_despesa=False
-        ).filter(NotaFiscal.valor_total > 0).all()
-        
-        sugestoes = []
-        
-        for nota in notas_nao_associadas:
-            # Buscar receitas/despesas com valores similares e datas próximas
-            if nota.tipo == 'entrada':
-                # Buscar receitas
-                receitas = Receita.query.filter_by(
-                    user_id=g.current_user.id,
-                    nota_fiscal_id=None
-                ).filter(
-                    Receita.valor.between(
-                        nota.valor_total * 0.9,
-                        nota.valor_total * 1.1
-                    )
-                ).all()
-                
-                for receita in receitas:
-                    # Calcular diferença de dias
-                    diff_dias = abs((receita.data_receita - nota.data_emissao).days)
-                    if diff_dias <= 7:  # Até 7 dias de diferença
-                        sugestoes.append({
-                            'nota_fiscal': nota.to_dict(),
-                            'item_sugerido': receita.to_dict(),
-                            'tipo': 'receita',
-                            'confianca': max(0, 100 - diff_dias * 10),
-                            'motivo': f'Valor similar (R$ {receita.valor}) e data próxima ({diff_dias} dias)'
-                        })
-            
-            else:
-                # Buscar despesas
-                despesas = Despesa.query.filter_by(
-                    user_id=g.current_user.id,
-                    nota_fiscal_id=None
-                ).filter(
-                    Despesa.valor.between(
-                        nota.valor_total * 0.9,
-                        nota.valor_total * 1.1
-                    )
-                ).all()
-                
-                for despesa in despesas:
-                    diff_dias = abs((despesa.data_despesa - nota.data_emissao).days)
-                    if diff_dias <= 7:
-                        sugestoes.append({
-                            'nota_fiscal': nota.to_dict(),
-                            'item_sugerido': despesa.to_dict(),
-                            'tipo': 'despesa',
-                            'confianca': max(0, 100 - diff_dias * 10),
-                            'motivo': f'Valor similar (R$ {despesa.valor}) e data próxima ({diff_dias} dias)'
-                        })
-        
-        # Ordenar por confiança
-        sugestoes.sort(key=lambda x: x['confianca'], reverse=True)
-        
-        return jsonify({'sugestoes': sugestoes[:10]}), 200  # Limitar a 10 sugestões
+        limite = max(1, min(request.args.get('limite', 10, type=int), 100))
+        
+        # modo=atribuicao: cada nota/item aparece em no máximo uma sugestão
+        um_para_um = request.args.get('modo') == 'atribuicao'
+        
+        sugestoes = sugerir_associacoes(g.current_user.id, limite, um_para_um)
+        
+        return jsonify({'sugestoes': sugestoes}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
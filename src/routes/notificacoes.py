@@ -1,246 +1,43 @@
 from flask import Blueprint, request, jsonify, g
 from datetime import datetime, date, timedelta
 from calendar import monthrange
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from sqlalchemy import and_, or_, func, case
 from src.models.user import db, User
 from src.models.relatorio import RelatorioMensal
 from src.middleware.auth import token_required, plano_ativo_required
+from src.middleware.cache_http import etag_condicional, resposta_em_cache
+from src.models.notificacao import NotificacaoOutbox
+from src.models.obrigacao import EstadoObrigacoes
+from src.services.email import smtp_configurado
+from src.services.templates_email import renderizar_alerta
+from src.services.calendario import proximos_vencimentos, competencia_do_prazo
+from src.services.obrigacoes import relatorio_pendente, mes_entregue
+from src.services.outbox import linha_outbox, enfileirar_notificacoes, drenar_outbox, drenar_outbox_completa
 from src.config import Config
 import json
 
 notificacoes_bp = Blueprint('notificacoes', __name__)
 
 def calcular_proximos_vencimentos():
-    """Calcula as próximas datas de vencimento das obrigações MEI"""
-    hoje = date.today()
-    ano_atual = hoje.year
-    mes_atual = hoje.month
-    
-    # Próximo vencimento do relatório mensal (dia 20)
-    if hoje.day <= 20:
-        proximo_relatorio = date(ano_atual, mes_atual, 20)
-    else:
-        if mes_atual == 12:
-            proximo_relatorio = date(ano_atual + 1, 1, 20)
-        else:
-            proximo_relatorio = date(ano_atual, mes_atual + 1, 20)
-    
-    # Próximo vencimento do DAS (dia 20)
-    proximo_das = proximo_relatorio  # Mesmo prazo do relatório
-    
-    # Próximo vencimento da DASN-SIMEI (31 de maio)
-    if hoje <= date(ano_atual, 5, 31):
-        proximo_dasn = date(ano_atual, 5, 31)
-    else:
-        proximo_dasn = date(ano_atual + 1, 5, 31)
-    
-    return {
-        'relatorio_mensal': proximo_relatorio,
-        'das': proximo_das,
-        'dasn_simei': proximo_dasn
-    }
+    """Calcula as próximas datas de vencimento das obrigações MEI (ajustadas a dias úteis)"""
+    return proximos_vencimentos()
 
-def enviar_email_notificacao(destinatario, assunto, corpo_html):
-    """Envia email de notificação"""
-    try:
-        # Configurações do email (usar variáveis de ambiente em produção)
-        smtp_server = Config.SMTP_SERVER or "smtp.gmail.com"
-        smtp_port = Config.SMTP_PORT or 587
-        email_usuario = Config.EMAIL_USER or "noreply@meicontrol.com"
-        email_senha = Config.EMAIL_PASSWORD or ""
-        
-        if not email_senha:
-            print("Configuração de email não encontrada - simulando envio")
-            return True
-        
-        # Criar mensagem
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = assunto
-        msg['From'] = f"MEIControl <{email_usuario}>"
-        msg['To'] = destinatario
-        
-        # Adicionar corpo HTML
-        html_part = MIMEText(corpo_html, 'html', 'utf-8')
-        msg.attach(html_part)
-        
-        # Enviar email
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(email_usuario, email_senha)
-            server.send_message(msg)
-        
-        return True
-        
-    except Exception as e:
-        print(f"Erro ao enviar email: {e}")
-        return False
+def enviar_email_notificacao(user_id, tipo, periodo, destinatario, assunto, corpo_html):
+    """Registra o email na outbox e tenta enviá-lo imediatamente.
+
+    Retorna a notificação: em caso de falha ela permanece na fila com nova tentativa agendada.
+    """
+    notificacao = NotificacaoOutbox(**linha_outbox(user_id, tipo, periodo, destinatario, assunto, corpo_html))
+    db.session.add(notificacao)
+    db.session.commit()
+    
+    drenar_outbox(ids=[notificacao.id])
+    db.session.refresh(notificacao)
+    return notificacao
 
 def gerar_template_email_alerta(tipo_alerta, dados_usuario, dados_alerta):
     """Gera template HTML para email de alerta"""
-    templates = {
-        'relatorio_mensal': {
-            'assunto': f'🚨 Lembrete: Relatório Mensal MEI - Prazo até {dados_alerta["prazo"]}',
-            'corpo': f'''
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
-                    .container {{ max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                    .header {{ background-color: #1a2332; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; margin: -30px -30px 30px -30px; }}
-                    .alert {{ background-color: #dc2626; color: white; padding: 15px; border-radius: 5px; margin: 20px 0; text-align: center; }}
-                    .info {{ background-color: #374151; color: white; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-                    .button {{ background-color: #dc2626; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block; margin: 20px 0; }}
-                    .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 12px; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>MEIControl</h1>
-                        <p>Sistema de Gestão Financeira para MEI</p>
-                    </div>
-                    
-                    <div class="alert">
-                        <h2>⚠️ ATENÇÃO: Relatório Mensal Pendente</h2>
-                    </div>
-                    
-                    <p>Olá, <strong>{dados_usuario["nome"]}</strong>!</p>
-                    
-                    <p>Este é um lembrete importante sobre suas obrigações como MEI:</p>
-                    
-                    <div class="info">
-                        <h3>📋 Relatório Mensal de Receitas Brutas</h3>
-                        <p><strong>Mês de referência:</strong> {dados_alerta["mes_referencia"]}</p>
-                        <p><strong>Prazo para entrega:</strong> {dados_alerta["prazo"]}</p>
-                        <p><strong>Dias restantes:</strong> {dados_alerta["dias_restantes"]} dias</p>
-                    </div>
-                    
-                    <p>O relatório mensal deve ser preenchido até o dia 20 de cada mês. O não cumprimento desta obrigação pode resultar em multas e complicações com a Receita Federal.</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="https://meicontrol.com/login" class="button">Acessar MEIControl</a>
-                    </div>
-                    
-                    <div class="footer">
-                        <p>Este é um email automático do sistema MEIControl.</p>
-                        <p>Para cancelar estes lembretes, acesse suas configurações na plataforma.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            '''
-        },
-        'das': {
-            'assunto': f'💰 Lembrete: Pagamento DAS MEI - Vence em {dados_alerta["prazo"]}',
-            'corpo': f'''
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
-                    .container {{ max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                    .header {{ background-color: #1a2332; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; margin: -30px -30px 30px -30px; }}
-                    .alert {{ background-color: #dc2626; color: white; padding: 15px; border-radius: 5px; margin: 20px 0; text-align: center; }}
-                    .info {{ background-color: #374151; color: white; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-                    .button {{ background-color: #dc2626; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block; margin: 20px 0; }}
-                    .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 12px; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>MEIControl</h1>
-                        <p>Sistema de Gestão Financeira para MEI</p>
-                    </div>
-                    
-                    <div class="alert">
-                        <h2>💰 LEMBRETE: Pagamento DAS MEI</h2>
-                    </div>
-                    
-                    <p>Olá, <strong>{dados_usuario["nome"]}</strong>!</p>
-                    
-                    <p>Não se esqueça de pagar o DAS (Documento de Arrecadação do Simples Nacional) do seu MEI:</p>
-                    
-                    <div class="info">
-                        <h3>📄 DAS MEI</h3>
-                        <p><strong>Mês de referência:</strong> {dados_alerta["mes_referencia"]}</p>
-                        <p><strong>Vencimento:</strong> {dados_alerta["prazo"]}</p>
-                        <p><strong>Dias restantes:</strong> {dados_alerta["dias_restantes"]} dias</p>
-                        <p><strong>Valor aproximado:</strong> R$ 70,60 (valor pode variar)</p>
-                    </div>
-                    
-                    <p>O DAS deve ser pago mensalmente até o dia 20. Atraso no pagamento gera multa e juros.</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="https://www8.receita.fazenda.gov.br/SimplesNacional/Aplicacoes/ATSPO/pgmei.app/Identificacao" class="button">Gerar DAS no Portal do Empreendedor</a>
-                    </div>
-                    
-                    <div class="footer">
-                        <p>Este é um email automático do sistema MEIControl.</p>
-                        <p>Para cancelar estes lembretes, acesse suas configurações na plataforma.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            '''
-        },
-        'dasn_simei': {
-            'assunto': f'📊 Lembrete: DASN-SIMEI {dados_alerta["ano"]} - Prazo até 31/05',
-            'corpo': f'''
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }}
-                    .container {{ max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}
-                    .header {{ background-color: #1a2332; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; margin: -30px -30px 30px -30px; }}
-                    .alert {{ background-color: #dc2626; color: white; padding: 15px; border-radius: 5px; margin: 20px 0; text-align: center; }}
-                    .info {{ background-color: #374151; color: white; padding: 15px; border-radius: 5px; margin: 20px 0; }}
-                    .button {{ background-color: #dc2626; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block; margin: 20px 0; }}
-                    .footer {{ text-align: center; margin-top: 30px; color: #666; font-size: 12px; }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <h1>MEIControl</h1>
-                        <p>Sistema de Gestão Financeira para MEI</p>
-                    </div>
-                    
-                    <div class="alert">
-                        <h2>📊 IMPORTANTE: Declaração Anual DASN-SIMEI</h2>
-                    </div>
-                    
-                    <p>Olá, <strong>{dados_usuario["nome"]}</strong>!</p>
-                    
-                    <p>É hora de entregar sua Declaração Anual do Simples Nacional (DASN-SIMEI):</p>
-                    
-                    <div class="info">
-                        <h3>📋 DASN-SIMEI {dados_alerta["ano"]}</h3>
-                        <p><strong>Ano de referência:</strong> {dados_alerta["ano"]}</p>
-                        <p><strong>Prazo para entrega:</strong> 31 de maio de {dados_alerta["ano"] + 1}</p>
-                        <p><strong>Dias restantes:</strong> {dados_alerta["dias_restantes"]} dias</p>
-                    </div>
-                    
-                    <p>A DASN-SIMEI é obrigatória para todos os MEIs e deve ser entregue anualmente até 31 de maio. Use o MEIControl para gerar automaticamente os dados necessários!</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="https://meicontrol.com/login" class="button">Gerar Relatório no MEIControl</a>
-                    </div>
-                    
-                    <div class="footer">
-                        <p>Este é um email automático do sistema MEIControl.</p>
-                        <p>Para cancelar estes lembretes, acesse suas configurações na plataforma.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            '''
-        }
-    }
-    
-    template = templates.get(tipo_alerta, templates['relatorio_mensal'])
-    return template['assunto'], template['corpo']
+    return renderizar_alerta(tipo_alerta, dados_usuario['nome'], dados_alerta)
 
 @notificacoes_bp.route('/notificacoes/configuracoes', methods=['GET'])
 @plano_ativo_required
@@ -262,10 +59,7 @@ def obter_configuracoes_notificacao():
         }
         
         # Buscar configurações salvas (implementar modelo NotificacaoConfig se necessário)
-        configuracoes = getattr(usuario, 'configuracoes_notificacao', None)
-        if configuracoes:
-            configuracoes_usuario = json.loads(configuracoes)
-            configuracoes_padrao.update(configuracoes_usuario)
+        configuracoes_padrao.update(ler_configuracoes(getattr(usuario, 'configuracoes_notificacao', None)))
         
         return jsonify({
             'configuracoes': configuracoes_padrao
@@ -279,23 +73,26 @@ def obter_configuracoes_notificacao():
 def atualizar_configuracoes_notificacao():
     """Atualizar configurações de notificação do usuário"""
     try:
-        dados = request.get_json()
+        dados = request.get_json() or {}
         usuario = g.current_user
         
-        # Validar dados
-        configuracoes_validas = {
-            'email_relatorio_mensal': dados.get('email_relatorio_mensal', True),
-            'email_das': dados.get('email_das', True),
-            'email_dasn_simei': dados.get('email_dasn_simei', True),
-            'dias_antecedencia_relatorio': min(max(dados.get('dias_antecedencia_relatorio', 5), 1), 15),
-            'dias_antecedencia_das': min(max(dados.get('dias_antecedencia_das', 5), 1), 15),
-            'dias_antecedencia_dasn': min(max(dados.get('dias_antecedencia_dasn', 30), 7), 90),
-            'push_notifications': dados.get('push_notifications', False),
-            'whatsapp_notifications': dados.get('whatsapp_notifications', False)
-        }
+        # Validar dados (tipos normalizados: a consulta de elegibilidade lê estes valores no banco)
+        try:
+            configuracoes_validas = {
+                'email_relatorio_mensal': converter_booleano(dados.get('email_relatorio_mensal', True)),
+                'email_das': converter_booleano(dados.get('email_das', True)),
+                'email_dasn_simei': converter_booleano(dados.get('email_dasn_simei', True)),
+                'dias_antecedencia_relatorio': min(max(int(dados.get('dias_antecedencia_relatorio', 5)), 1), 15),
+                'dias_antecedencia_das': min(max(int(dados.get('dias_antecedencia_das', 5)), 1), 15),
+                'dias_antecedencia_dasn': min(max(int(dados.get('dias_antecedencia_dasn', 30)), 7), 90),
+                'push_notifications': converter_booleano(dados.get('push_notifications', False)),
+                'whatsapp_notifications': converter_booleano(dados.get('whatsapp_notifications', False))
+            }
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Dias de antecedência devem ser números inteiros'}), 400
         
         # Salvar configurações (adicionar campo ao modelo User se necessário)
-        usuario.configuracoes_notificacao = json.dumps(configuracoes_validas)
+        usuario.configuracoes_notificacao = configuracoes_validas
         db.session.commit()
         
         return jsonify({
@@ -332,10 +129,18 @@ def enviar_notificacao_teste():
         # Gerar template
         assunto, corpo_html = gerar_template_email_alerta(tipo_teste, dados_usuario, dados_alerta)
         
-        # Enviar email
-        sucesso = enviar_email_notificacao(usuario.email, assunto, corpo_html)
+        # Enviar email (registrado na outbox; aparece no histórico)
+        notificacao = enviar_email_notificacao(
+            usuario.id, f'teste_{tipo_teste}', datetime.utcnow().isoformat(),
+            usuario.email, assunto, corpo_html
+        )
         
-        if sucesso:
+        if notificacao.status != 'enviado':
+            return jsonify({
+                'message': 'Falha no envio do email de teste; nova tentativa agendada',
+                'notificacao': notificacao.to_dict()
+            }), 200
+        elif smtp_configurado():
             return jsonify({
                 'message': f'Email de teste enviado com sucesso para {usuario.email}'
             }), 200
@@ -354,6 +159,8 @@ def enviar_notificacao_teste():
 
 @notificacoes_bp.route('/notificacoes/proximos-vencimentos', methods=['GET'])
 @plano_ativo_required
+@etag_condicional(max_age=300, por_dia=True)
+@resposta_em_cache(por_dia=True)
 def obter_proximos_vencimentos():
     """Obter próximos vencimentos das obrigações MEI"""
     try:
@@ -380,104 +187,225 @@ def obter_proximos_vencimentos():
 @notificacoes_bp.route('/notificacoes/historico', methods=['GET'])
 @plano_ativo_required
 def obter_historico_notificacoes():
-    """Obter histórico de notificações enviadas (funcionalidade futura)"""
+    """Obter histórico de notificações (enviadas, pendentes e com falha)"""
     try:
-        # Por enquanto, retornar dados simulados
-        # Em produção, implementar modelo NotificacaoHistorico
-        
-        historico_simulado = [
-            {
-                'id': 1,
-                'tipo': 'email_relatorio_mensal',
-                'assunto': 'Lembrete: Relatório Mensal MEI',
-                'enviado_em': '2025-07-20T10:00:00Z',
-                'status': 'enviado',
-                'destinatario': g.current_user.email
-            },
-            {
-                'id': 2,
-                'tipo': 'email_das',
-                'assunto': 'Lembrete: Pagamento DAS MEI',
-                'enviado_em': '2025-07-15T10:00:00Z',
-                'status': 'enviado',
-                'destinatario': g.current_user.email
-            }
-        ]
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        
+        query = NotificacaoOutbox.query.filter_by(user_id=g.current_user.id)
+        if request.args.get('status'):
+            query = query.filter_by(status=request.args.get('status'))
+        
+        historico = query.order_by(
+            NotificacaoOutbox.created_at.desc(), NotificacaoOutbox.id.desc()
+        ).paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
-            'historico': historico_simulado,
-            'total': len(historico_simulado)
+            'historico': [notificacao.to_dict() for notificacao in historico.items],
+            'total': historico.total,
+            'pages': historico.pages,
+            'current_page': page,
+            'per_page': per_page
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-# Função para ser chamada por um cron job ou scheduler
+# (tipo, ativação, antecedência, antecedência padrão, antecedência máxima aceita nas configurações)
+JANELAS_NOTIFICACAO = (
+    ('relatorio_mensal', 'email_relatorio_mensal', 'dias_antecedencia_relatorio', 5, 15),
+    ('das', 'email_das', 'dias_antecedencia_das', 5, 15),
+    ('dasn_simei', 'email_dasn_simei', 'dias_antecedencia_dasn', 30, 90)
+)
+
+def converter_booleano(valor):
+    if isinstance(valor, str):
+        return valor.strip().lower() in ('true', 'on', '1', 'sim')
+    return bool(valor)
+
+def configuracao_ativa(configuracoes, chave):
+    # Valores que não são booleanos (configurações antigas) valem o padrão, como no filtro SQL
+    valor = configuracoes.get(chave)
+    return valor if isinstance(valor, bool) else True
+
+def configuracao_dias(configuracoes, chave, padrao):
+    valor = configuracoes.get(chave)
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return padrao
+    return valor
+
+def ler_configuracoes(valor):
+    """Configurações salvas como dict (aceita também o formato texto antigo)"""
+    if not valor:
+        return {}
+    if isinstance(valor, str):
+        return json.loads(valor)
+    return valor
+
+def alertas_usuario(configuracoes, vencimentos, hoje, relatorio_entregue=False):
+    """Alertas (tipo, dados_alerta) devidos hoje conforme as configurações do usuário.
+
+    relatorio_entregue: o relatório mensal do mês de referência já foi gerado (sem lembrete).
+    """
+    alertas = []
+    
+    ano_competencia, mes_competencia = competencia_do_prazo(vencimentos['relatorio_mensal'])
+    referencia = {
+        'mes_referencia': f"{mes_competencia:02d}/{ano_competencia}",
+        'ano': vencimentos['dasn_simei'].year - 1
+    }
+    
+    for tipo, chave_ativo, chave_dias, dias_padrao, _ in JANELAS_NOTIFICACAO:
+        if not configuracao_ativa(configuracoes, chave_ativo):
+            continue
+        if tipo == 'relatorio_mensal' and relatorio_entregue:
+            continue
+        
+        dias_restantes = (vencimentos[tipo] - hoje).days
+        if 0 <= dias_restantes <= configuracao_dias(configuracoes, chave_dias, dias_padrao):
+            alertas.append((tipo, dict(
+                referencia,
+                prazo=vencimentos[tipo].strftime('%d/%m/%Y'),
+                dias_restantes=dias_restantes
+            )))
+    
+    return alertas
+
+def configuracao_sql(chave, tipo, padrao):
+    """Valor da configuração no banco, ou o padrão quando o JSON guarda outro tipo.
+    
+    O CAST só é avaliado para o tipo certo: um valor inválido de um usuário não pode
+    derrubar a consulta de elegibilidade de todos.
+    """
+    configuracoes = User.configuracoes_notificacao
+    if db.session.get_bind().dialect.name == 'postgresql':
+        tipo_json = func.jsonb_typeof(configuracoes[chave])
+        tipos = ['boolean'] if tipo == 'booleano' else ['number']
+    else:
+        tipo_json = func.json_type(configuracoes, f'$.{chave}')
+        tipos = ['true', 'false'] if tipo == 'booleano' else ['integer', 'real']
+    
+    valor = configuracoes[chave].as_boolean() if tipo == 'booleano' else configuracoes[chave].as_float()
+    return case((tipo_json.in_(tipos), valor), else_=padrao)
+
+def filtro_elegibilidade(vencimentos, hoje):
+    """Condição SQL equivalente a alertas_usuario() não vazio, avaliada no banco.
+
+    Só entram as janelas que podem estar abertas hoje (dias restantes dentro da
+    antecedência máxima); retorna None quando nenhuma está, e aí nada precisa ser lido.
+    """
+    condicoes = []
+    for tipo, chave_ativo, chave_dias, dias_padrao, dias_maximo in JANELAS_NOTIFICACAO:
+        dias_restantes = (vencimentos[tipo] - hoje).days
+        if not 0 <= dias_restantes <= dias_maximo:
+            continue
+        
+        condicao = and_(
+            configuracao_sql(chave_ativo, 'booleano', True),
+            configuracao_sql(chave_dias, 'numero', dias_padrao) >= dias_restantes
+        )
+        if tipo == 'relatorio_mensal':
+            condicao = and_(condicao, relatorio_pendente(*competencia_do_prazo(vencimentos[tipo])))
+        condicoes.append(condicao)
+    
+    return or_(*condicoes) if condicoes else None
+
+def usuarios_ativos_em_lotes(tamanho_lote, filtro=None, ano_obrigacoes=None):
+    """Percorre os usuários ativos em lotes (paginação por id), só com as colunas usadas.
+
+    Com ano_obrigacoes, cada linha traz também meses_entregues daquele ano (outer join).
+    """
+    condicoes = [User.is_active == True]
+    if filtro is not None:
+        condicoes.append(filtro)
+    
+    colunas = [User.id, User.nome, User.email, User.configuracoes_notificacao]
+    query = User.query
+    if ano_obrigacoes is not None:
+        query = query.outerjoin(EstadoObrigacoes, and_(
+            EstadoObrigacoes.user_id == User.id,
+            EstadoObrigacoes.ano == ano_obrigacoes
+        ))
+        colunas.append(EstadoObrigacoes.meses_entregues)
+    
+    ultimo_id = 0
+    while True:
+        lote = query.with_entities(*colunas).filter(
+            *condicoes,
+            User.id > ultimo_id
+        ).order_by(User.id).limit(tamanho_lote).all()
+        
+        if not lote:
+            return
+        yield from lote
+        ultimo_id = lote[-1].id
+
+# Executada pelo agendador (tarefa 'notificacoes'); pode ser chamada manualmente
 def processar_notificacoes_automaticas():
     """Processar e enviar notificações automáticas para todos os usuários"""
     try:
         hoje = date.today()
-        usuarios = User.query.filter_by(ativo=True).all()
+        vencimentos = calcular_proximos_vencimentos()
+        total_usuarios = 0
         
-        for usuario in usuarios:
-            # Verificar configurações do usuário
-            configuracoes = {}
-            if hasattr(usuario, 'configuracoes_notificacao') and usuario.configuracoes_notificacao:
-                configuracoes = json.loads(usuario.configuracoes_notificacao)
-            
-            # Configurações padrão
-            dias_antecedencia_relatorio = configuracoes.get('dias_antecedencia_relatorio', 5)
-            dias_antecedencia_das = configuracoes.get('dias_antecedencia_das', 5)
-            dias_antecedencia_dasn = configuracoes.get('dias_antecedencia_dasn', 30)
+        # Elegibilidade calculada no banco; na maior parte dos dias nenhuma janela está aberta
+        filtro = filtro_elegibilidade(vencimentos, hoje)
+        if filtro is None:
+            print("Nenhum vencimento dentro das janelas de aviso hoje")
+            return True
+        
+        # Avisos gravados na outbox por lote; (usuário, tipo, vencimento) repetidos são ignorados,
+        # então reexecuções no mesmo dia (ou em dias seguintes da janela) não duplicam emails
+        # Estado das obrigações lido na mesma passada (sem lembrete de relatório já gerado)
+        ano_competencia, mes_competencia = competencia_do_prazo(vencimentos['relatorio_mensal'])
+        
+        # As linhas vão para a outbox em blocos de OUTBOX_LOTE e cada bloco é enviado em seguida,
+        # então no máximo um bloco de emails renderizados fica em memória
+        resultado = {'enviados': 0, 'falhas': 0, 'duracao_segundos': 0}
+        linhas = []
+        
+        def gravar_e_enviar_bloco():
+            enfileirar_notificacoes(linhas)
+            db.session.commit()
+            linhas.clear()
+            parcial = drenar_outbox(Config.OUTBOX_LOTE)
+            for chave in resultado:
+                resultado[chave] += parcial[chave]
+        
+        for usuario in usuarios_ativos_em_lotes(Config.NOTIFICACOES_TAMANHO_LOTE, filtro, ano_competencia):
+            total_usuarios += 1
             
-            # Calcular vencimentos
-            vencimentos = calcular_proximos_vencimentos()
+            # Verificar configurações do usuário
+            configuracoes = ler_configuracoes(usuario.configuracoes_notificacao)
+            relatorio_entregue = mes_entregue(usuario.meses_entregues, mes_competencia)
             
             dados_usuario = {
                 'nome': usuario.nome,
                 'email': usuario.email
             }
             
-            # Verificar relatório mensal
-            if configuracoes.get('email_relatorio_mensal', True):
-                dias_para_relatorio = (vencimentos['relatorio_mensal'] - hoje).days
-                if 0 <= dias_para_relatorio <= dias_antecedencia_relatorio:
-                    dados_alerta = {
-                        'mes_referencia': f"{hoje.month:02d}/{hoje.year}",
-                        'prazo': vencimentos['relatorio_mensal'].strftime('%d/%m/%Y'),
-                        'dias_restantes': dias_para_relatorio
-                    }
-                    assunto, corpo = gerar_template_email_alerta('relatorio_mensal', dados_usuario, dados_alerta)
-                    enviar_email_notificacao(usuario.email, assunto, corpo)
-            
-            # Verificar DAS
-            if configuracoes.get('email_das', True):
-                dias_para_das = (vencimentos['das'] - hoje).days
-                if 0 <= dias_para_das <= dias_antecedencia_das:
-                    dados_alerta = {
-                        'mes_referencia': f"{hoje.month:02d}/{hoje.year}",
-                        'prazo': vencimentos['das'].strftime('%d/%m/%Y'),
-                        'dias_restantes': dias_para_das
-                    }
-                    assunto, corpo = gerar_template_email_alerta('das', dados_usuario, dados_alerta)
-                    enviar_email_notificacao(usuario.email, assunto, corpo)
-            
-            # Verificar DASN-SIMEI
-            if configuracoes.get('email_dasn_simei', True):
-                dias_para_dasn = (vencimentos['dasn_simei'] - hoje).days
-                if 0 <= dias_para_dasn <= dias_antecedencia_dasn:
-                    dados_alerta = {
-                        'ano': hoje.year - 1,
-                        'prazo': vencimentos['dasn_simei'].strftime('%d/%m/%Y'),
-                        'dias_restantes': dias_para_dasn
-                    }
-                    assunto, corpo = gerar_template_email_alerta('dasn_simei', dados_usuario, dados_alerta)
-                    enviar_email_notificacao(usuario.email, assunto, corpo)
-        
-        print(f"Processamento de notificações concluído para {len(usuarios)} usuários")
+            for tipo, dados_alerta in alertas_usuario(configuracoes, vencimentos, hoje, relatorio_entregue):
+                assunto, corpo = gerar_template_email_alerta(tipo, dados_usuario, dados_alerta)
+                linhas.append(linha_outbox(
+                    usuario.id, tipo, vencimentos[tipo].isoformat(), usuario.email, assunto, corpo
+                ))
+                if len(linhas) == Config.OUTBOX_LOTE:
+                    gravar_e_enviar_bloco()
+        
+        if linhas:
+            gravar_e_enviar_bloco()
+        
+        # Restante dos pendentes (inclui retentativas de execuções anteriores cujo backoff venceu)
+        restante = drenar_outbox_completa()
+        for chave in resultado:
+            resultado[chave] += restante[chave]
+        vazao = round(resultado['enviados'] / resultado['duracao_segundos'], 1) if resultado['duracao_segundos'] else 0
+        
+        print(f"Processamento de notificações concluído para {total_usuarios} usuários: "
+              f"{resultado['enviados']} enviados, {resultado['falhas']} falhas, "
+              f"{vazao} mensagens/s")
         return True
         
     except Exception as e:
         print(f"Erro no processamento de notificações: {e}")
         return False
-
@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
-from datetime import datetime, timedelta
-import jwt
+from datetime import datetime
+import json
 import stripe
 from src.models.user import db, User
 from src.config import Config
+from src.middleware.auth import invalidar_cache_usuario
+from src.services.tokens import revogar_tokens_usuario
+from src.services.autenticacao import autenticar_requisicao, ErroAutenticacao
+from src.services.stripe_eventos import registrar_evento, HANDLERS
 
 planos_bp = Blueprint('planos', __name__)
 
@@ -43,25 +47,16 @@ PLANOS = {
 }
 
 def verificar_token():
-    """Função auxiliar para verificar token JWT"""
-    token = request.headers.get('Authorization')
-    if not token:
-        return None, jsonify({'error': 'Token não fornecido'}), 401
-    
-    if token.startswith('Bearer '):
-        token = token[7:]
-    
+    """Função auxiliar para verificar token JWT (via serviço de autenticação)"""
     try:
-        payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-        user_id = payload['user_id']
-        user = User.query.get(user_id)
-        if not user:
-            return None, jsonify({'error': 'Usuário não encontrado'}), 404
-        return user, None, None
-    except jwt.ExpiredSignatureError:
-        return None, jsonify({'error': 'Token expirado'}), 401
-    except jwt.InvalidTokenError:
-        return None, jsonify({'error': 'Token inválido'}), 401
+        payload = autenticar_requisicao()
+    except ErroAutenticacao as e:
+        return None, jsonify({'error': e.mensagem}), e.status
+    
+    user = User.query.get(payload['user_id'])
+    if not user:
+        return None, jsonify({'error': 'Usuário não encontrado'}), 404
+    return user, None, None
 
 @planos_bp.route('/planos', methods=['GET'])
 def listar_planos():
@@ -110,7 +105,10 @@ def alterar_plano():
         if novo_plano == 'basico' and user.plano == 'avancado':
             user.data_vencimento = datetime.now().date()
         
+        # Claims de plano dos access tokens emitidos ficaram desatualizadas
+        revogar_tokens_usuario(user.id)
         db.session.commit()
+        invalidar_cache_usuario(user.id)
         
         return jsonify({
             'message': f'Plano alterado para {PLANOS[novo_plano]["nome"]} com sucesso',
@@ -175,46 +173,36 @@ def criar_checkout_session():
 
 @planos_bp.route('/webhook-stripe', methods=['POST'])
 def webhook_stripe():
-    """Webhook para receber notificações do Stripe"""
+    """Webhook do Stripe: valida a assinatura, grava o evento e responde imediatamente.
+    O processamento é feito em lote por processar_eventos_stripe."""
+    if not Config.STRIPE_WEBHOOK_SECRET:
+        return jsonify({'error': 'Webhook do Stripe não configurado'}), 503
+    
     payload = request.get_data()
     sig_header = request.headers.get('Stripe-Signature')
     
     try:
-        # Verificar assinatura do webhook (em produção, configurar endpoint_secret)
-        # event = stripe.Webhook.construct_event(payload, sig_header, endpoint_secret)
-        
-        # Para desenvolvimento, processar diretamente
-        import json
+        # Verificação local (HMAC), sem chamadas de rede
+        stripe.WebhookSignature.verify_header(
+            payload, sig_header, Config.STRIPE_WEBHOOK_SECRET,
+            tolerance=Config.STRIPE_WEBHOOK_TOLERANCIA_SEGUNDOS
+        )
         event = json.loads(payload)
-        
-        if event['type'] == 'checkout.session.completed':
-            session = event['data']['object']
-            user_id = session['metadata']['user_id']
-            plano = session['metadata']['plano']
-            
-            # Atualizar usuário
-            user = User.query.get(user_id)
-            if user:
-                user.plano = plano
-                user.status_pagamento = 'ativo'
-                user.data_vencimento = datetime.now().date() + timedelta(days=30)
-                user.updated_at = datetime.utcnow()
-                db.session.commit()
-        
-        elif event['type'] == 'invoice.payment_failed':
-            # Marcar usuário como inadimplente
-            customer_id = event['data']['object']['customer']
-            # Buscar usuário pelo customer_id do Stripe
-            # user = User.query.filter_by(stripe_customer_id=customer_id).first()
-            # if user:
-            #     user.status_pagamento = 'inadimplente'
-            #     db.session.commit()
-            pass
+    except stripe.error.SignatureVerificationError:
+        return jsonify({'error': 'Assinatura inválida'}), 400
+    except ValueError:
+        return jsonify({'error': 'Payload inválido'}), 400
+    
+    try:
+        # Tipos sem tratamento são confirmados sem ocupar a caixa de entrada
+        if event.get('type') in HANDLERS:
+            registrar_evento(event)
         
         return jsonify({'status': 'success'}), 200
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 400
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
 @planos_bp.route('/verificar-acesso', methods=['GET'])
 def verificar_acesso():
@@ -223,21 +211,16 @@ def verificar_acesso():
     if error_response:
         return error_response, status_code
     
-    # Verificar se o plano está ativo
-    acesso_liberado = user.status_pagamento == 'ativo'
-    
-    # Verificar se não está vencido
-    if user.data_vencimento and user.data_vencimento < datetime.now().date():
-        acesso_liberado = False
-        user.status_pagamento = 'vencido'
-        db.session.commit()
+    # Status considerando o vencimento (a varredura persiste 'vencido' em lote)
+    status_pagamento = user.status_efetivo
+    acesso_liberado = status_pagamento == 'ativo'
     
     plano_info = PLANOS.get(user.plano, {})
     
     return jsonify({
         'acesso_liberado': acesso_liberado,
         'plano': user.plano,
-        'status_pagamento': user.status_pagamento,
+        'status_pagamento': status_pagamento,
         'data_vencimento': user.data_vencimento.isoformat() if user.data_vencimento else None,
         'funcionalidades': plano_info.get('funcionalidades', []),
         'limite_notas_fiscais': plano_info.get('limite_notas_fiscais', 0)
@@ -2,12 +2,15 @@ from flask import Blueprint, request, jsonify, g, send_file
 from datetime import datetime, date
 from calendar import monthrange
 import os
-import tempfile
 from src.models.user import db
 from src.models.financeiro import Receita, Despesa
 from src.models.nota_fiscal import NotaFiscal
 from src.models.relatorio import RelatorioMensal
 from src.middleware.auth import token_required, plano_ativo_required
+from src.middleware.cache_http import marcar_dados_alterados, etag_condicional, resposta_em_cache
+from src.services.arquivos_temporarios import criar_arquivo_temporario
+from src.services.calendario import prazo_mensal, prazo_legal_dasn
+from src.services.obrigacoes import estado_usuario, mes_entregue, meses_entregues, marcar_relatorio_entregue
 from src.config import Config
 import json
 
@@ -40,8 +43,8 @@ def gerar_relatorio_mensal_pdf(dados_relatorio, mes, ano):
         from reportlab.lib.units import inch
         from reportlab.lib import colors
         
-        # Criar arquivo temporário
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+        # Criar arquivo temporário (removido depois pela tarefa de limpeza)
+        temp_file = criar_arquivo_temporario('.pdf')
         
         # Configurar documento
         doc = SimpleDocTemplate(temp_file.name, pagesize=A4)
@@ -181,7 +184,7 @@ def gerar_relatorio_excel(dados_relatorio, mes, ano):
         ws.column_dimensions['B'].width = 15
         
         # Salvar arquivo temporário
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
+        temp_file = criar_arquivo_temporario('.xlsx')
         wb.save(temp_file.name)
         
         return temp_file.name
@@ -192,6 +195,7 @@ def gerar_relatorio_excel(dados_relatorio, mes, ano):
 
 @relatorios_bp.route('/relatorios/mensal/<int:mes>/<int:ano>', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def gerar_relatorio_mensal(mes, ano):
     """Gerar relatório mensal de receitas brutas"""
     try:
@@ -276,6 +280,8 @@ def gerar_relatorio_mensal(mes, ano):
             )
             
             db.session.add(novo_relatorio)
+            marcar_relatorio_entregue(g.current_user.id, ano, mes)
+            marcar_dados_alterados(g.current_user.id)
             db.session.commit()
         else:
             # Atualizar relatório existente
@@ -299,6 +305,7 @@ def gerar_relatorio_mensal(mes, ano):
 
 @relatorios_bp.route('/relatorios/mensal/<int:mes>/<int:ano>/pdf', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def download_relatorio_mensal_pdf(mes, ano):
     """Download do relatório mensal em PDF"""
     try:
@@ -333,6 +340,7 @@ def download_relatorio_mensal_pdf(mes, ano):
 
 @relatorios_bp.route('/relatorios/mensal/<int:mes>/<int:ano>/excel', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def download_relatorio_mensal_excel(mes, ano):
     """Download do relatório mensal em Excel"""
     try:
@@ -367,6 +375,7 @@ def download_relatorio_mensal_excel(mes, ano):
 
 @relatorios_bp.route('/relatorios/anual/<int:ano>', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def gerar_relatorio_anual(ano):
     """Gerar relatório anual para DASN-SIMEI"""
     try:
@@ -437,6 +446,7 @@ def gerar_relatorio_anual(ano):
 
 @relatorios_bp.route('/relatorios/historico', methods=['GET'])
 @plano_ativo_required
+@etag_condicional()
 def listar_relatorios_historico():
     """Listar histórico de relatórios mensais"""
     try:
@@ -487,6 +497,8 @@ def listar_relatorios_historico():
 
 @relatorios_bp.route('/relatorios/status-obrigacoes', methods=['GET'])
 @plano_ativo_required
+@etag_condicional(por_dia=True)
+@resposta_em_cache(por_dia=True)
 def status_obrigacoes():
     """Verificar status das obrigações mensais e anuais"""
     try:
@@ -502,39 +514,34 @@ def status_obrigacoes():
             mes_anterior = mes_atual - 1
             ano_anterior = ano_atual
         
-        # Buscar relatório do mês anterior
-        relatorio_mes_anterior = RelatorioMensal.query.filter_by(
-            user_id=g.current_user.id,
-            mes=mes_anterior,
-            ano=ano_anterior
-        ).first()
+        # Estado das obrigações (meses entregues por ano) numa única consulta indexada
+        ano_dasn = ano_atual - 1  # a DASN-SIMEI declara o ano-calendário anterior
+        estado = estado_usuario(g.current_user.id, [ano_anterior, ano_dasn])
+        relatorio_mes_anterior = mes_entregue(estado[ano_anterior], mes_anterior)
         
-        # Calcular prazo do relatório mensal (dia 20)
-        prazo_relatorio_mensal = date(ano_atual, mes_atual, 20)
+        # Prazo do relatório mensal (dia 20, prorrogado para o próximo dia útil)
+        prazo_relatorio_mensal = prazo_mensal(ano_anterior, mes_anterior)
         relatorio_mensal_em_atraso = hoje > prazo_relatorio_mensal and not relatorio_mes_anterior
         
-        # Verificar DASN-SIMEI (até 31 de maio)
-        prazo_dasn = date(ano_atual, 5, 31)
+        # Verificar DASN-SIMEI (até 31 de maio; a antecipação ao dia útil vale só para os avisos)
+        prazo_dasn = prazo_legal_dasn(ano_dasn)
         dasn_em_atraso = hoje > prazo_dasn
         
-        # Buscar relatórios do ano anterior para DASN
-        relatorios_ano_anterior = RelatorioMensal.query.filter_by(
-            user_id=g.current_user.id,
-            ano=ano_anterior
-        ).count()
+        # Relatórios do ano declarado na DASN
+        relatorios_ano_dasn = meses_entregues(estado[ano_dasn])
         
         status = {
             'relatorio_mensal': {
                 'mes_referencia': f"{mes_anterior:02d}/{ano_anterior}",
                 'prazo': prazo_relatorio_mensal.strftime('%d/%m/%Y'),
-                'entregue': bool(relatorio_mes_anterior),
+                'entregue': relatorio_mes_anterior,
                 'em_atraso': relatorio_mensal_em_atraso,
                 'dias_para_vencimento': (prazo_relatorio_mensal - hoje).days if hoje <= prazo_relatorio_mensal else 0
             },
             'dasn_simei': {
-                'ano_referencia': ano_anterior,
+                'ano_referencia': ano_dasn,
                 'prazo': prazo_dasn.strftime('%d/%m/%Y'),
-                'relatorios_mensais_completos': relatorios_ano_anterior == 12,
+                'relatorios_mensais_completos': relatorios_ano_dasn == 12,
                 'em_atraso': dasn_em_atraso,
                 'dias_para_vencimento': (prazo_dasn - hoje).days if hoje <= prazo_dasn else 0
             },
@@ -555,17 +562,17 @@ def status_obrigacoes():
                 'mensagem': f'Você tem {status["relatorio_mensal"]["dias_para_vencimento"]} dias para entregar o relatório de {mes_anterior:02d}/{ano_anterior}'
             })
         
-        if dasn_em_atraso and relatorios_ano_anterior < 12:
+        if dasn_em_atraso and relatorios_ano_dasn < 12:
             status['alertas'].append({
                 'tipo': 'erro',
                 'titulo': 'DASN-SIMEI em Atraso',
-                'mensagem': f'A declaração anual de {ano_anterior} deveria ter sido entregue até {prazo_dasn.strftime("%d/%m/%Y")}'
+                'mensagem': f'A declaração anual de {ano_dasn} deveria ter sido entregue até {prazo_dasn.strftime("%d/%m/%Y")}'
             })
-        elif status['dasn_simei']['dias_para_vencimento'] <= 30 and relatorios_ano_anterior < 12:
+        elif status['dasn_simei']['dias_para_vencimento'] <= 30 and relatorios_ano_dasn < 12:
             status['alertas'].append({
                 'tipo': 'aviso',
                 'titulo': 'DASN-SIMEI Próxima do Vencimento',
-                'mensagem': f'Você tem {status["dasn_simei"]["dias_para_vencimento"]} dias para entregar a declaração anual de {ano_anterior}'
+                'mensagem': f'Você tem {status["dasn_simei"]["dias_para_vencimento"]} dias para entregar a declaração anual de {ano_dasn}'
             })
         
         return jsonify({'status_obrigacoes': status}), 200
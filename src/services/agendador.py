@@ -0,0 +1,235 @@
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from threading import Thread, Event, Lock
+from sqlalchemy import or_, case
+from src.models.user import db
+from src.models.tarefa import TarefaAgendada
+from src.services.banco import inserir_ignorando_duplicados
+from src.config import Config
+
+# nome -> (função, intervalo padrão em segundos)
+TAREFAS = {}
+# Tarefas sobre recursos do próprio contêiner (ex.: /tmp): rodam em todo processo, sem lease
+TAREFAS_LOCAIS = {}
+
+def registrar_tarefa(nome, intervalo_segundos, local=False):
+    """Decorator que inclui a função entre as tarefas periódicas do agendador.
+    
+    Com local=True a tarefa não usa o lease do banco: cada processo a executa no seu intervalo.
+    """
+    def decorator(f):
+        (TAREFAS_LOCAIS if local else TAREFAS)[nome] = (f, intervalo_segundos)
+        return f
+    return decorator
+
+def intervalo_tarefa(nome):
+    """Intervalo padrão da tarefa, sobrescrito por AGENDADOR_INTERVALOS ("nome:segundos,...")"""
+    for item in (Config.AGENDADOR_INTERVALOS or '').split(','):
+        chave, _, segundos = item.strip().partition(':')
+        if chave == nome and segundos:
+            return int(segundos)
+    return (TAREFAS.get(nome) or TAREFAS_LOCAIS[nome])[1]
+
+def _proxima_execucao(nome, agora):
+    # Jitter: execuções de tarefas com o mesmo intervalo não se concentram no mesmo instante
+    intervalo = intervalo_tarefa(nome)
+    return agora + timedelta(seconds=intervalo + random.uniform(0, intervalo * Config.AGENDADOR_JITTER))
+
+def identificacao_processo():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+def garantir_tarefas():
+    """Cria as linhas das tarefas registradas que ainda não existem no banco"""
+    agora = datetime.utcnow()
+    inserir_ignorando_duplicados(TarefaAgendada, [{
+        'nome': nome, 'proxima_execucao': agora, 'execucoes': 0, 'falhas': 0,
+        'duracao_total_ms': 0, 'duracao_maxima_ms': 0
+    } for nome in TAREFAS], ['nome'])
+    db.session.commit()
+
+def _adquirir(nome, dono, agora, forcar=False):
+    """Lease da tarefa via UPDATE condicional: entre N workers/contêineres, só um vence"""
+    condicoes = [
+        TarefaAgendada.nome == nome,
+        or_(TarefaAgendada.bloqueado_ate.is_(None), TarefaAgendada.bloqueado_ate < agora)
+    ]
+    if not forcar:
+        condicoes.append(TarefaAgendada.proxima_execucao <= agora)
+    
+    adquiridas = TarefaAgendada.query.filter(*condicoes).update({
+        'bloqueado_ate': agora + timedelta(seconds=Config.AGENDADOR_LEASE_SEGUNDOS),
+        'dono': dono
+    }, synchronize_session=False)
+    db.session.commit()
+    return adquiridas == 1
+
+def executar_tarefa(nome, dono=None, forcar=False):
+    """Executa a tarefa se ela estiver vencida e livre. Retorna None se outro processo a tem."""
+    dono = dono or identificacao_processo()
+    agora = datetime.utcnow()
+    if not _adquirir(nome, dono, agora, forcar):
+        return None
+    
+    funcao = TAREFAS[nome][0]
+    inicio = time.perf_counter()
+    erro = None
+    try:
+        resultado = funcao()
+    except Exception as e:
+        db.session.rollback()
+        resultado = None
+        erro = e
+        print(f"Erro na tarefa agendada {nome}: {e}")
+    duracao_ms = int((time.perf_counter() - inicio) * 1000)
+    
+    # Só o dono do lease registra o resultado (se o lease expirou, outro processo já o assumiu)
+    TarefaAgendada.query.filter_by(nome=nome, dono=dono).update({
+        'bloqueado_ate': None,
+        'proxima_execucao': _proxima_execucao(nome, datetime.utcnow()),
+        'ultima_execucao': agora,
+        'ultima_duracao_ms': duracao_ms,
+        'ultimo_resultado': None if erro else str(resultado)[:255],
+        'ultimo_erro': str(erro)[:1000] if erro else None,
+        'execucoes': TarefaAgendada.execucoes + 1,
+        'falhas': TarefaAgendada.falhas + (1 if erro else 0),
+        'duracao_total_ms': TarefaAgendada.duracao_total_ms + duracao_ms,
+        'duracao_maxima_ms': case(
+            (TarefaAgendada.duracao_maxima_ms < duracao_ms, duracao_ms),
+            else_=TarefaAgendada.duracao_maxima_ms
+        )
+    }, synchronize_session=False)
+    db.session.commit()
+    
+    return {'tarefa': nome, 'duracao_ms': duracao_ms, 'resultado': resultado, 'erro': str(erro) if erro else None}
+
+def executar_pendentes(dono=None):
+    """Executa todas as tarefas vencidas que este processo conseguir reservar"""
+    dono = dono or identificacao_processo()
+    return [r for r in (executar_tarefa(nome, dono) for nome in TAREFAS) if r is not None]
+
+def estatisticas_agendador():
+    return [tarefa.to_dict() for tarefa in TarefaAgendada.query.order_by(TarefaAgendada.nome).all()]
+
+class Agendador:
+    """Thread em segundo plano que verifica as tarefas a cada AGENDADOR_TICK_SEGUNDOS.
+    
+    Pode rodar em todos os workers do gunicorn: o lease no banco garante que cada
+    execução de tarefa aconteça em apenas um deles.
+    """
+    
+    def __init__(self, app, tick_segundos=None):
+        self.app = app
+        self.tick = tick_segundos or Config.AGENDADOR_TICK_SEGUNDOS
+        self.dono = identificacao_processo()
+        self._proximas_locais = {}  # nome -> time.monotonic() da próxima execução
+        self._parar = Event()
+        self._thread = None
+    
+    def iniciar(self):
+        self._thread = Thread(target=self._executar, name='agendador', daemon=True)
+        self._thread.start()
+    
+    def parar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+    
+    def _executar_locais(self):
+        agora = time.monotonic()
+        for nome, (funcao, _) in TAREFAS_LOCAIS.items():
+            if self._proximas_locais.get(nome, 0) > agora:
+                continue
+            intervalo = intervalo_tarefa(nome)
+            self._proximas_locais[nome] = agora + intervalo + random.uniform(0, intervalo * Config.AGENDADOR_JITTER)
+            try:
+                funcao()
+            except Exception as e:
+                print(f"Erro na tarefa local {nome}: {e}")
+    
+    def _executar(self):
+        # Atraso inicial aleatório: workers iniciados juntos não disputam o lease no mesmo instante
+        if self._parar.wait(random.uniform(0, self.tick)):
+            return
+        
+        with self.app.app_context():
+            garantir_tarefas()
+            db.session.remove()
+        
+        while not self._parar.is_set():
+            with self.app.app_context():
+                try:
+                    self._executar_locais()
+                    executar_pendentes(self.dono)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Erro no agendador: {e}")
+                finally:
+                    db.session.remove()
+            self._parar.wait(self.tick * random.uniform(0.8, 1.2))
+
+_agendador = None
+_lock_agendador = Lock()
+
+def iniciar_agendador(app):
+    """Inicia o agendador deste processo (uma única vez)"""
+    global _agendador
+    if _agendador is None:
+        with _lock_agendador:
+            if _agendador is None:
+                _agendador = Agendador(app)
+                _agendador.iniciar()
+    return _agendador
+
+# Tarefas (imports dentro das funções: evita ciclos com as rotas)
+
+@registrar_tarefa('notificacoes', 3600)
+def tarefa_notificacoes():
+    from src.routes.notificacoes import processar_notificacoes_automaticas
+    if not processar_notificacoes_automaticas():
+        raise RuntimeError('Falha no processamento de notificações')
+    return True
+
+@registrar_tarefa('outbox', 300)
+def tarefa_outbox():
+    from src.services.outbox import drenar_outbox_completa
+    return drenar_outbox_completa()
+
+@registrar_tarefa('expirar-planos', 3600)
+def tarefa_expirar_planos():
+    from src.services.assinaturas import expirar_planos_vencidos
+    return expirar_planos_vencidos()
+
+@registrar_tarefa('processar-stripe', 60)
+def tarefa_processar_stripe():
+    from src.services.stripe_eventos import processar_eventos_stripe
+    return processar_eventos_stripe()
+
+@registrar_tarefa('limpar-tokens', 3600)
+def tarefa_limpar_tokens():
+    from src.services.tokens import limpar_tokens_expirados
+    return limpar_tokens_expirados()
+
+@registrar_tarefa('limpar-idempotencia', 3600)
+def tarefa_limpar_idempotencia():
+    from src.middleware.idempotencia import limpar_chaves_expiradas
+    return limpar_chaves_expiradas()
+
+# /tmp é de cada contêiner: sob o lease global, só o contêiner vencedor seria limpo
+@registrar_tarefa('limpar-arquivos-temporarios', 3600, local=True)
+def tarefa_limpar_arquivos_temporarios():
+    from src.services.arquivos_temporarios import limpar_arquivos_temporarios
+    return limpar_arquivos_temporarios()
+
+@registrar_tarefa('reconstruir-sugestoes', 86400)
+def tarefa_reconstruir_sugestoes():
+    from src.services.associacao import reconstruir_sugestoes_usuarios
+    return reconstruir_sugestoes_usuarios()
+
+@registrar_tarefa('reconstruir-obrigacoes', 86400)
+def tarefa_reconstruir_obrigacoes():
+    from src.services.obrigacoes import reconstruir_estado_obrigacoes
+    return reconstruir_estado_obrigacoes()
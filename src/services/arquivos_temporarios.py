@@ -0,0 +1,27 @@
+import os
+import tempfile
+import time
+from src.config import Config
+
+def criar_arquivo_temporario(sufixo):
+    """Arquivo temporário identificável (prefixo próprio) para a limpeza periódica"""
+    return tempfile.NamedTemporaryFile(delete=False, suffix=sufixo, prefix=Config.ARQUIVOS_TEMPORARIOS_PREFIXO)
+
+def limpar_arquivos_temporarios(idade_maxima_segundos=None):
+    """Remove relatórios temporários (PDF/Excel) já entregues; retorna quantos foram removidos"""
+    idade_maxima = idade_maxima_segundos or Config.ARQUIVOS_TEMPORARIOS_IDADE_MAXIMA_SEGUNDOS
+    limite = time.time() - idade_maxima
+    removidos = 0
+    
+    with os.scandir(tempfile.gettempdir()) as entradas:
+        for entrada in entradas:
+            if not entrada.name.startswith(Config.ARQUIVOS_TEMPORARIOS_PREFIXO):
+                continue
+            try:
+                if entrada.is_file(follow_symlinks=False) and entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+                    removidos += 1
+            except FileNotFoundError:
+                pass  # removido por outro worker
+    
+    return removidos
@@ -0,0 +1,18 @@
+from datetime import datetime, date
+from src.models.user import db, User
+
+def expirar_planos_vencidos(hoje=None):
+    """Marca como 'vencido', num único UPDATE, os planos ativos com vencimento passado.
+
+    Usa o índice parcial idx_users_vencimento_ativos. Retorna quantos usuários mudaram.
+    """
+    hoje = hoje or date.today()
+    alterados = User.query.filter(
+        User.status_pagamento == 'ativo',
+        User.data_vencimento < hoje
+    ).update({
+        'status_pagamento': 'vencido',
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    return alterados
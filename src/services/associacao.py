@@ -0,0 +1,318 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+import heapq
+from sqlalchemy import func, select
+from src.models.user import db
+from src.models.nota_fiscal import NotaFiscal, SugestaoAssociacao
+from src.models.financeiro import Receita, Despesa
+from src.config import Config
+
+# Critérios de associação: valor em ±10% e data em até 7 dias
+TOLERANCIA_VALOR = 0.10
+TOLERANCIA_DIAS = 7
+CONFIANCA_MAXIMA = 100
+
+# Notas de entrada são associadas a receitas; as demais, a despesas
+TIPOS_ASSOCIACAO = {
+    'receita': (Receita, 'data_receita'),
+    'despesa': (Despesa, 'data_despesa')
+}
+
+def tipo_lancamento(modelo):
+    return 'receita' if modelo is Receita else 'despesa'
+
+def tipo_associacao_nota(nota):
+    return 'receita' if nota.tipo == 'entrada' else 'despesa'
+
+def calcular_confianca(diff_dias):
+    return max(0, CONFIANCA_MAXIMA - diff_dias * 10)
+
+class MotorAssociacao:
+    """Índice de receitas/despesas ordenado por (valor, data) para busca por intervalo"""
+    
+    def __init__(self, itens, campo_data):
+        self.campo_data = campo_data
+        self._itens = sorted(itens, key=lambda item: (float(item.valor), getattr(item, campo_data)))
+        self._valores = [float(item.valor) for item in self._itens]
+    
+    def __len__(self):
+        return len(self._itens)
+    
+    def candidatos(self, valor, data):
+        """Gera (confianca, diff_dias, item) com valor em ±10% e data em ±7 dias: O(log M + janela)"""
+        valor = float(valor)
+        inicio = bisect_left(self._valores, valor * (1 - TOLERANCIA_VALOR))
+        fim = bisect_right(self._valores, valor * (1 + TOLERANCIA_VALOR))
+        
+        for item in self._itens[inicio:fim]:
+            diff_dias = abs((getattr(item, self.campo_data) - data).days)
+            if diff_dias <= TOLERANCIA_DIAS:
+                yield calcular_confianca(diff_dias), diff_dias, item
+
+def carregar_motor(tipo, user_id):
+    """Carrega (uma única consulta) as receitas/despesas do usuário ainda sem nota fiscal"""
+    modelo, campo_data = TIPOS_ASSOCIACAO[tipo]
+    itens = modelo.query.filter_by(
+        user_id=user_id,
+        nota_fiscal_id=None
+    ).with_entities(*modelo.colunas_listagem()).all()
+    return MotorAssociacao(itens, campo_data)
+
+def atribuir_um_para_um(arestas):
+    """Atribuição bipartida gulosa: cada nota e cada item aparecem no máximo uma vez.
+
+    arestas: iterável de (confianca, diff_dias, nota, tipo, item), processadas por
+    confiança decrescente.
+    """
+    notas_usadas = set()
+    itens_usados = set()
+    resultado = []
+    
+    for aresta in sorted(arestas, key=lambda a: a[0], reverse=True):
+        _, _, nota, tipo, item = aresta
+        if nota.id in notas_usadas or (tipo, item.id) in itens_usados:
+            continue
+        notas_usadas.add(nota.id)
+        itens_usados.add((tipo, item.id))
+        resultado.append(aresta)
+    
+    return resultado
+
+def arestas_nota(nota, motores):
+    """Gera as arestas (confianca, diff_dias, nota, tipo, item) de uma nota"""
+    tipo = tipo_associacao_nota(nota)
+    motor = motores.get(tipo)
+    if not motor:
+        return
+    
+    for confianca, diff_dias, item in motor.candidatos(nota.valor_total, nota.data_emissao):
+        yield confianca, diff_dias, nota, tipo, item
+
+def serializar_sugestao(aresta):
+    confianca, diff_dias, nota, tipo, item = aresta
+    modelo, _ = TIPOS_ASSOCIACAO[tipo]
+    return {
+        'nota_fiscal': NotaFiscal.serializar(nota),
+        'item_sugerido': modelo.serializar(item),
+        'tipo': tipo,
+        'confianca': confianca,
+        'motivo': f'Valor similar (R$ {item.valor}) e data próxima ({diff_dias} dias)'
+    }
+
+def sugerir_associacoes(user_id, limite=10, um_para_um=False):
+    """Sugestões de associação lidas da tabela mantida (consulta única pelo índice user_id, confianca)"""
+    query = db.session.query(SugestaoAssociacao, NotaFiscal, Receita, Despesa).join(
+        NotaFiscal, NotaFiscal.id == SugestaoAssociacao.nota_fiscal_id
+    ).outerjoin(
+        Receita, db.and_(SugestaoAssociacao.tipo == 'receita', Receita.id == SugestaoAssociacao.item_id)
+    ).outerjoin(
+        Despesa, db.and_(SugestaoAssociacao.tipo == 'despesa', Despesa.id == SugestaoAssociacao.item_id)
+    ).filter(
+        SugestaoAssociacao.user_id == user_id
+    ).order_by(SugestaoAssociacao.confianca.desc(), SugestaoAssociacao.id)
+    
+    # No modo atribuição todas as arestas do usuário participam do emparelhamento
+    linhas = query.all() if um_para_um else query.limit(limite).all()
+    
+    arestas = [
+        (sugestao.confianca, sugestao.diff_dias, nota, sugestao.tipo, receita or despesa)
+        for sugestao, nota, receita, despesa in linhas
+        if receita or despesa
+    ]
+    
+    if um_para_um:
+        arestas = atribuir_um_para_um(arestas)[:limite]
+    
+    return [serializar_sugestao(aresta) for aresta in arestas]
+
+def inserir_sugestoes(user_id, arestas):
+    """Grava arestas na tabela de sugestões (insert em lote)"""
+    linhas = [{
+        'user_id': user_id,
+        'nota_fiscal_id': nota.id,
+        'tipo': tipo,
+        'item_id': item.id,
+        'confianca': confianca,
+        'diff_dias': diff_dias,
+        'created_at': datetime.utcnow()
+    } for confianca, diff_dias, nota, tipo, item in arestas]
+    
+    if linhas:
+        db.session.execute(SugestaoAssociacao.__table__.insert(), linhas)
+
+def melhores_por_nota(arestas):
+    """As ASSOCIACAO_SUGESTOES_POR_NOTA arestas de maior confiança (arestas de uma mesma nota)"""
+    return heapq.nlargest(Config.ASSOCIACAO_SUGESTOES_POR_NOTA, arestas, key=lambda a: a[0])
+
+def aparar_sugestoes_notas(nota_ids):
+    """Mantém só as ASSOCIACAO_SUGESTOES_POR_NOTA melhores sugestões de cada nota (DELETE único)"""
+    if not nota_ids:
+        return
+    posicoes = select(
+        SugestaoAssociacao.id,
+        func.row_number().over(
+            partition_by=SugestaoAssociacao.nota_fiscal_id,
+            order_by=(SugestaoAssociacao.confianca.desc(), SugestaoAssociacao.id)
+        ).label('posicao')
+    ).where(SugestaoAssociacao.nota_fiscal_id.in_(nota_ids)).subquery()
+    
+    SugestaoAssociacao.query.filter(SugestaoAssociacao.id.in_(
+        select(posicoes.c.id).where(posicoes.c.posicao > Config.ASSOCIACAO_SUGESTOES_POR_NOTA)
+    )).delete(synchronize_session=False)
+
+def remover_sugestoes_nota(nota_id):
+    SugestaoAssociacao.query.filter_by(nota_fiscal_id=nota_id).delete(synchronize_session=False)
+
+def remover_sugestoes_itens(tipo, ids):
+    """Remove sugestões dos itens (ids pode ser lista ou subconsulta de ids)"""
+    SugestaoAssociacao.query.filter(
+        SugestaoAssociacao.tipo == tipo,
+        SugestaoAssociacao.item_id.in_(ids)
+    ).delete(synchronize_session=False)
+
+def associar(nota, tipo, item):
+    """Associa a nota ao item e descarta as sugestões que envolvem qualquer um dos dois"""
+    item.nota_fiscal_id = nota.id
+    if tipo == 'receita':
+        nota.associada_receita = True
+    else:
+        nota.associada_despesa = True
+    nota.updated_at = datetime.utcnow()
+    
+    remover_sugestoes_nota(nota.id)
+    remover_sugestoes_itens(tipo, [item.id])
+
+def _escolher_automatica(arestas, concorrentes):
+    """Retorna a melhor aresta se tiver confiança alta e for inequívoca.
+
+    concorrentes(aresta) devolve a maior confiança já sugerida para o outro lado do par
+    (outra nota para o mesmo item ou outro item para a mesma nota).
+    """
+    if not Config.ASSOCIACAO_AUTOMATICA_ATIVA or not arestas:
+        return None
+    
+    arestas = sorted(arestas, key=lambda a: a[0], reverse=True)
+    melhor = arestas[0]
+    
+    if melhor[0] < Config.ASSOCIACAO_AUTOMATICA_CONFIANCA_MINIMA:
+        return None
+    if len(arestas) > 1 and arestas[1][0] >= melhor[0]:
+        return None
+    if (concorrentes(melhor) or 0) >= melhor[0]:
+        return None
+    
+    return melhor
+
+def _maior_confianca(*filtros):
+    return db.session.query(db.func.max(SugestaoAssociacao.confianca)).filter(*filtros).scalar()
+
+def processar_nova_nota(nota):
+    """Casamento incremental de uma nota recém-criada (já com id) contra os itens sem nota.
+
+    Busca apenas a janela de valor/data da nota. Associa automaticamente um par de alta
+    confiança ou grava os candidatos como sugestões. Retorna a aresta associada ou None.
+    """
+    if not nota.valor_total or float(nota.valor_total) <= 0:
+        return None
+    
+    tipo = tipo_associacao_nota(nota)
+    modelo, campo_data = TIPOS_ASSOCIACAO[tipo]
+    coluna_data = getattr(modelo, campo_data)
+    valor = float(nota.valor_total)
+    
+    candidatos = modelo.query.filter(
+        modelo.user_id == nota.user_id,
+        modelo.nota_fiscal_id.is_(None),
+        modelo.valor.between(valor * (1 - TOLERANCIA_VALOR), valor * (1 + TOLERANCIA_VALOR)),
+        coluna_data.between(
+            nota.data_emissao - timedelta(days=TOLERANCIA_DIAS),
+            nota.data_emissao + timedelta(days=TOLERANCIA_DIAS)
+        )
+    ).all()
+    
+    arestas = list(arestas_nota(nota, {tipo: MotorAssociacao(candidatos, campo_data)}))
+    
+    melhor = _escolher_automatica(arestas, lambda aresta: _maior_confianca(
+        SugestaoAssociacao.tipo == tipo,
+        SugestaoAssociacao.item_id == aresta[4].id
+    ))
+    if melhor:
+        associar(nota, tipo, melhor[4])
+        return melhor
+    
+    # Mesmo limite por nota da reconstrução (a tabela não cresce entre reconstruções)
+    inserir_sugestoes(nota.user_id, melhores_por_nota(arestas))
+    return None
+
+def processar_novo_lancamento(tipo, item):
+    """Casamento incremental de uma receita/despesa recém-criada contra as notas não associadas"""
+    _, campo_data = TIPOS_ASSOCIACAO[tipo]
+    data_item = getattr(item, campo_data)
+    valor = float(item.valor)
+    tipos_nota = NotaFiscal.tipo == 'entrada' if tipo == 'receita' else NotaFiscal.tipo != 'entrada'
+    
+    # valor do item em ±10% do valor da nota  <=>  nota em [valor/1.1, valor/0.9]
+    notas = NotaFiscal.query.filter(
+        NotaFiscal.user_id == item.user_id,
+        NotaFiscal.associada_receita == False,
+        NotaFiscal.associada_despesa == False,
+        tipos_nota,
+        NotaFiscal.valor_total.between(
+            valor / (1 + TOLERANCIA_VALOR), valor / (1 - TOLERANCIA_VALOR)
+        ),
+        NotaFiscal.data_emissao.between(
+            data_item - timedelta(days=TOLERANCIA_DIAS),
+            data_item + timedelta(days=TOLERANCIA_DIAS)
+        )
+    ).all()
+    
+    motor = {tipo: MotorAssociacao([item], campo_data)}
+    arestas = [aresta for nota in notas for aresta in arestas_nota(nota, motor)]
+    
+    melhor = _escolher_automatica(arestas, lambda aresta: _maior_confianca(
+        SugestaoAssociacao.nota_fiscal_id == aresta[2].id
+    ))
+    if melhor:
+        associar(melhor[2], tipo, item)
+        return melhor
+    
+    # Cada nota ganha no máximo uma aresta nova; as que passam do limite perdem a pior sugestão
+    inserir_sugestoes(item.user_id, arestas)
+    aparar_sugestoes_notas([aresta[2].id for aresta in arestas])
+    return None
+
+def reconstruir_sugestoes(user_id):
+    """Recalcula todas as sugestões do usuário com o motor indexado (após importações/edições em lote)"""
+    SugestaoAssociacao.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    
+    notas = NotaFiscal.query.filter_by(
+        user_id=user_id,
+        associada_receita=False,
+        associada_despesa=False
+    ).filter(NotaFiscal.valor_total > 0).with_entities(*NotaFiscal.colunas_listagem()).all()
+    
+    tipos = {tipo_associacao_nota(nota) for nota in notas}
+    motores = {tipo: carregar_motor(tipo, user_id) for tipo in tipos}
+    
+    # Guardar apenas as melhores sugestões de cada nota
+    total = 0
+    for nota in notas:
+        arestas = melhores_por_nota(arestas_nota(nota, motores))
+        inserir_sugestoes(user_id, arestas)
+        total += len(arestas)
+    
+    return total
+
+def reconstruir_sugestoes_usuarios():
+    """Reconstrói as sugestões de todos os usuários com notas pendentes (carga inicial e tarefa diária)"""
+    from src.middleware.cache_http import marcar_dados_alterados
+    usuarios = [user_id for (user_id,) in NotaFiscal.query.filter_by(
+        associada_receita=False, associada_despesa=False
+    ).with_entities(NotaFiscal.user_id).distinct()]
+    
+    total = 0
+    for user_id in usuarios:
+        total += reconstruir_sugestoes(user_id)
+        marcar_dados_alterados(user_id)  # ETag/cache de /sugestoes-associacao
+        db.session.commit()
+    return total
@@ -0,0 +1,141 @@
+import hashlib
+import time
+from collections import OrderedDict, defaultdict
+from threading import Lock
+import jwt
+from flask import request
+from src.services.tokens import decodificar_jwt, chave_por_kid, token_revogado
+from src.config import Config
+
+class ErroAutenticacao(Exception):
+    """Falha de autenticação com a mensagem e o status HTTP a devolver"""
+    
+    def __init__(self, mensagem, status=401):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.status = status
+
+class CacheTokens:
+    """Payloads já validados, indexados pelo hash do token (LRU, válidos até o exp).
+    Cada entrada guarda também o kid e o segredo usados na validação."""
+    
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self._dados = OrderedDict()
+        self._lock = Lock()
+        self.acertos = 0
+        self.falhas = 0
+    
+    def obter(self, chave):
+        """(payload, kid, segredo) ou None"""
+        with self._lock:
+            entrada = self._dados.get(chave)
+            if entrada is None:
+                self.falhas += 1
+                return None
+            if entrada[0]['exp'] <= time.time():
+                del self._dados[chave]
+                raise jwt.ExpiredSignatureError('Token expirado')
+            self._dados.move_to_end(chave)
+            self.acertos += 1
+            return entrada
+    
+    def guardar(self, chave, payload, kid, segredo):
+        with self._lock:
+            self._dados[chave] = (payload, kid, segredo)
+            while len(self._dados) > self.capacidade:
+                self._dados.popitem(last=False)
+
+class MetricasAutenticacao:
+    """Tempo gasto autenticando, por endpoint"""
+    
+    def __init__(self):
+        self._lock = Lock()
+        self._por_endpoint = defaultdict(lambda: {'chamadas': 0, 'falhas': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+    
+    def registrar(self, endpoint, duracao_ms, sucesso):
+        with self._lock:
+            estatistica = self._por_endpoint[endpoint or 'desconhecido']
+            estatistica['chamadas'] += 1
+            estatistica['falhas'] += 0 if sucesso else 1
+            estatistica['total_ms'] += duracao_ms
+            estatistica['max_ms'] = max(estatistica['max_ms'], duracao_ms)
+    
+    def resumo(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    'chamadas': e['chamadas'],
+                    'falhas': e['falhas'],
+                    'media_ms': round(e['total_ms'] / e['chamadas'], 3),
+                    'max_ms': round(e['max_ms'], 3)
+                }
+                for endpoint, e in self._por_endpoint.items()
+            }
+
+cache_tokens = CacheTokens(Config.JWT_CACHE_CAPACIDADE)
+metricas = MetricasAutenticacao()
+
+def extrair_token():
+    """Token do header Authorization (com ou sem o prefixo Bearer)"""
+    token = request.headers.get('Authorization')
+    if token and token.startswith('Bearer '):
+        token = token[7:]
+    return token or None
+
+def decodificar_token_acesso(token):
+    """Valida o token (assinatura via kid, expiração), reaproveitando decodificações anteriores"""
+    chave = hashlib.sha256(token.encode('utf-8')).digest()
+    entrada = cache_tokens.obter(chave)
+    if entrada is not None:
+        # O anel de chaves pode ter mudado: kid removido levanta InvalidTokenError e
+        # segredo trocado exige validar a assinatura de novo
+        payload, kid, segredo = entrada
+        if chave_por_kid(kid) == segredo:
+            return payload
+    
+    kid = jwt.get_unverified_header(token).get('kid')
+    payload = decodificar_jwt(token)
+    if 'user_id' not in payload or 'exp' not in payload:
+        raise jwt.InvalidTokenError('Claims obrigatórias ausentes')
+    cache_tokens.guardar(chave, payload, kid, chave_por_kid(kid))
+    return payload
+
+def autenticar_requisicao():
+    """Autentica a requisição atual e devolve o payload do access token.
+
+    Ponto único usado por token_required e pelas rotas que leem o token por conta própria.
+    Levanta ErroAutenticacao com a mensagem/status que a rota deve responder.
+    """
+    inicio = time.perf_counter()
+    sucesso = False
+    try:
+        token = extrair_token()
+        if not token:
+            raise ErroAutenticacao('Token não fornecido')
+        
+        try:
+            payload = decodificar_token_acesso(token)
+        except jwt.ExpiredSignatureError:
+            raise ErroAutenticacao('Token expirado')
+        except jwt.InvalidTokenError:
+            raise ErroAutenticacao('Token inválido')
+        
+        # Lista de revogação em memória (sincronizada periodicamente com o banco)
+        if token_revogado(payload):
+            raise ErroAutenticacao('Token revogado')
+        
+        sucesso = True
+        return payload
+    finally:
+        metricas.registrar(request.endpoint, (time.perf_counter() - inicio) * 1000, sucesso)
+
+def estatisticas_autenticacao():
+    return {
+        'cache_tokens': {
+            'acertos': cache_tokens.acertos,
+            'falhas': cache_tokens.falhas,
+            'tamanho': len(cache_tokens._dados)
+        },
+        'endpoints': metricas.resumo()
+    }
@@ -0,0 +1,171 @@
+import time
+from collections import deque
+from threading import Lock
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError, TimeoutError as TimeoutPool
+from sqlalchemy.pool import QueuePool
+from src.models.user import db
+from src.config import Config
+
+def normalizar_url_banco(url):
+    # Railway/Heroku/Supabase fornecem 'postgres://', que o SQLAlchemy 2 não aceita; sem driver
+    # explícito usa o psycopg2 do requirements (o SQLAlchemy 2.1 passou a assumir o psycopg 3)
+    for prefixo in ('postgres://', 'postgresql://'):
+        if url.startswith(prefixo):
+            return 'postgresql+psycopg2://' + url[len(prefixo):]
+    return url
+
+class MetricasPool:
+    """Tempo de espera por conexão no pool (checkout), por processo"""
+    
+    def __init__(self, amostras=1000):
+        self._lock = Lock()
+        self._tempos = deque(maxlen=amostras)
+        self.checkouts = 0
+        self.esperas_lentas = 0
+        self.timeouts = 0
+        self.conexoes_criadas = 0
+        self.conexoes_invalidadas = 0
+        self.espera_maxima_ms = 0.0
+    
+    def registrar_checkout(self, duracao_ms):
+        with self._lock:
+            self.checkouts += 1
+            self._tempos.append(duracao_ms)
+            self.espera_maxima_ms = max(self.espera_maxima_ms, duracao_ms)
+            if duracao_ms >= Config.DB_ESPERA_LENTA_MS:
+                self.esperas_lentas += 1
+    
+    def registrar_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+    
+    def registrar_conexao(self, invalidada=False):
+        with self._lock:
+            if invalidada:
+                self.conexoes_invalidadas += 1
+            else:
+                self.conexoes_criadas += 1
+    
+    def resumo(self):
+        with self._lock:
+            tempos = sorted(self._tempos)
+            dados = {
+                'checkouts': self.checkouts,
+                'esperas_lentas': self.esperas_lentas,
+                'timeouts': self.timeouts,
+                'conexoes_criadas': self.conexoes_criadas,
+                'conexoes_invalidadas': self.conexoes_invalidadas,
+                'espera_maxima_ms': round(self.espera_maxima_ms, 2)
+            }
+        if tempos:
+            dados['espera_media_ms'] = round(sum(tempos) / len(tempos), 3)
+            dados['espera_p95_ms'] = round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 3)
+        return dados
+
+metricas_pool = MetricasPool()
+
+class PoolMedido(QueuePool):
+    """QueuePool que mede quanto cada checkout esperou por uma conexão (fila ou abertura de uma nova)"""
+    
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexao = super()._do_get()
+        except TimeoutPool:
+            metricas_pool.registrar_timeout()
+            raise
+        metricas_pool.registrar_checkout((time.perf_counter() - inicio) * 1000)
+        return conexao
+
+
+def opcoes_engine(url):
+    """SQLALCHEMY_ENGINE_OPTIONS para a URL: pool configurável em bancos servidor, padrão no SQLite"""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return {}
+    
+    opcoes = {
+        'poolclass': PoolMedido,
+        'pool_size': Config.DB_POOL_SIZE,
+        'max_overflow': Config.DB_MAX_OVERFLOW,
+        'pool_timeout': Config.DB_POOL_TIMEOUT,
+        'pool_recycle': Config.DB_POOL_RECYCLE,
+        'pool_pre_ping': Config.DB_POOL_PRE_PING,
+        'pool_use_lifo': True  # conexões ociosas além do necessário envelhecem e são recicladas
+    }
+    
+    connect_args = {}
+    if url.get_backend_name() == 'postgresql':
+        if Config.DB_PGBOUNCER:
+            # psycopg2 não prepara statements no servidor; psycopg 3 precisa desligar explicitamente
+            if url.get_driver_name() == 'psycopg':
+                connect_args['prepare_threshold'] = None
+        elif Config.DB_STATEMENT_TIMEOUT_MS:
+            # Parâmetro de sessão na conexão: o PgBouncer (transaction) não repassa 'options'
+            connect_args['options'] = f'-c statement_timeout={Config.DB_STATEMENT_TIMEOUT_MS}'
+    if connect_args:
+        opcoes['connect_args'] = connect_args
+    return opcoes
+
+def registrar_eventos_pool(engine):
+    @event.listens_for(engine, 'connect')
+    def conexao_criada(dbapi_conexao, registro):
+        metricas_pool.registrar_conexao()
+    
+    @event.listens_for(engine, 'invalidate')
+    def conexao_invalidada(dbapi_conexao, registro, excecao):
+        metricas_pool.registrar_conexao(invalidada=True)
+
+def configurar_banco(app):
+    """Configura a URL e o engine (pool) do Flask-SQLAlchemy e inicializa a extensão"""
+    url = normalizar_url_banco(app.config.get('SQLALCHEMY_DATABASE_URI') or Config.SQLALCHEMY_DATABASE_URI)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', Config.SQLALCHEMY_TRACK_MODIFICATIONS)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', opcoes_engine(url))
+    db.init_app(app)
+    
+    with app.app_context():
+        registrar_eventos_pool(db.engine)
+
+def estatisticas_pool():
+    """Estado do pool deste worker e tempos de espera por conexão"""
+    pool = db.engine.pool
+    dados = {'pool': pool.__class__.__name__, **metricas_pool.resumo()}
+    if isinstance(pool, QueuePool):
+        dados.update({
+            'tamanho': pool.size(),
+            'em_uso': pool.checkedout(),
+            'ociosas': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'max_overflow': pool._max_overflow
+        })
+    return dados
+
+def inserir_ignorando_duplicados(modelo, linhas, colunas_unicas):
+    """INSERT ... ON CONFLICT (colunas_unicas) DO NOTHING para uma ou várias linhas.
+
+    linhas: dict ou lista de dicts. Em bancos sem ON CONFLICT cada linha é inserida num
+    savepoint e a duplicidade é ignorada. O commit fica a cargo de quem chama.
+    """
+    if isinstance(linhas, dict):
+        linhas = [linhas]
+    if not linhas:
+        return
+    
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto in ('postgresql', 'sqlite'):
+        modulo = postgresql if dialeto == 'postgresql' else sqlite
+        db.session.execute(
+            modulo.insert(modelo).values(linhas).on_conflict_do_nothing(index_elements=colunas_unicas)
+        )
+        return
+    
+    for linha in linhas:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(modelo.__table__.insert().values(**linha))
+        except IntegrityError:
+            pass
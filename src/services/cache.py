@@ -0,0 +1,164 @@
+import time
+from collections import OrderedDict, defaultdict
+from threading import Lock
+from src.config import Config
+
+try:
+    import redis
+except ImportError:  # redis é opcional (apenas para CACHE_BACKEND=redis)
+    redis = None
+
+class CacheMemoria:
+    """LRU no processo com TTL por entrada e limite de memória (tamanho aproximado dos valores)"""
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes_usados = 0
+        self.remocoes = 0
+        self._entradas = OrderedDict()  # chave -> (valor, tamanho, expira_em, user_id)
+        self._por_usuario = defaultdict(set)
+        self._lock = Lock()
+    
+    def _remover(self, chave):
+        _, tamanho, _, user_id = self._entradas.pop(chave)
+        self.bytes_usados -= tamanho
+        chaves = self._por_usuario.get(user_id)
+        if chaves is not None:
+            chaves.discard(chave)
+            if not chaves:
+                del self._por_usuario[user_id]
+    
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            if entrada[2] <= time.monotonic():
+                self._remover(chave)
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada[0]
+    
+    def guardar(self, chave, valor, ttl, user_id, tamanho):
+        if tamanho > self.max_bytes:
+            return
+        with self._lock:
+            if chave in self._entradas:
+                self._remover(chave)
+            self._entradas[chave] = (valor, tamanho, time.monotonic() + ttl, user_id)
+            self._por_usuario[user_id].add(chave)
+            self.bytes_usados += tamanho
+            while self.bytes_usados > self.max_bytes:
+                self._remover(next(iter(self._entradas)))
+                self.remocoes += 1
+    
+    def invalidar_usuario(self, user_id):
+        with self._lock:
+            for chave in list(self._por_usuario.get(user_id, ())):
+                self._remover(chave)
+    
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'backend': 'memoria',
+                'entradas': len(self._entradas),
+                'bytes_usados': self.bytes_usados,
+                'max_bytes': self.max_bytes,
+                'remocoes_por_memoria': self.remocoes
+            }
+
+class CacheRedis:
+    """Cache compartilhado entre workers. As chaves incluem a versão dos dados do usuário,
+    então uma escrita torna as entradas antigas inalcançáveis; elas expiram pelo TTL.
+    Guarda apenas respostas (corpo, mimetype)."""
+    
+    def __init__(self, cliente, prefixo='cache:'):
+        self.cliente = cliente
+        self.prefixo = prefixo
+    
+    @staticmethod
+    def _codificar(valor):
+        # Sem pickle (desserializar dados do Redis não pode executar código):
+        # 2 bytes com o tamanho do mimetype, o mimetype e o corpo
+        corpo, mimetype = valor
+        mimetype = mimetype.encode()
+        return len(mimetype).to_bytes(2, 'big') + mimetype + corpo
+    
+    @staticmethod
+    def _decodificar(dados):
+        tamanho = int.from_bytes(dados[:2], 'big')
+        if len(dados) < 2 + tamanho:
+            raise ValueError('entrada de cache truncada')
+        return dados[2 + tamanho:], dados[2:2 + tamanho].decode()
+    
+    def obter(self, chave):
+        try:
+            dados = self.cliente.get(self.prefixo + chave)
+        except redis.RedisError:
+            return None  # Redis fora do ar: calcular a resposta normalmente
+        if dados is None:
+            return None
+        try:
+            return self._decodificar(dados)
+        except ValueError:
+            return None  # entrada inválida (ex.: formato antigo): tratada como falha
+    
+    def guardar(self, chave, valor, ttl, user_id, tamanho):
+        try:
+            self.cliente.set(self.prefixo + chave, self._codificar(valor), ex=int(ttl))
+        except redis.RedisError:
+            pass
+    
+    def invalidar_usuario(self, user_id):
+        pass  # a versão nova já está na chave
+    
+    def estatisticas(self):
+        try:
+            memoria = self.cliente.info('memory').get('used_memory')
+        except redis.RedisError:
+            memoria = None
+        return {'backend': 'redis', 'memoria_redis_bytes': memoria}
+
+class MetricasCache:
+    """Acertos e falhas por rota (por processo)"""
+    
+    def __init__(self):
+        self._lock = Lock()
+        self._rotas = defaultdict(lambda: {'hits': 0, 'misses': 0})
+    
+    def registrar(self, rota, acerto):
+        with self._lock:
+            self._rotas[rota]['hits' if acerto else 'misses'] += 1
+    
+    def resumo(self):
+        with self._lock:
+            rotas = {rota: dict(valores) for rota, valores in self._rotas.items()}
+        hits = sum(r['hits'] for r in rotas.values())
+        misses = sum(r['misses'] for r in rotas.values())
+        for valores in rotas.values():
+            total = valores['hits'] + valores['misses']
+            valores['taxa_acerto'] = round(valores['hits'] / total, 3) if total else None
+        return {
+            'hits': hits,
+            'misses': misses,
+            'taxa_acerto': round(hits / (hits + misses), 3) if hits + misses else None,
+            'rotas': rotas
+        }
+
+_cache = None
+metricas_cache = MetricasCache()
+
+def get_cache():
+    """Retorna o backend configurado em CACHE_BACKEND ('memoria' ou 'redis')"""
+    global _cache
+    if _cache is None:
+        if Config.CACHE_BACKEND == 'redis' and redis is not None:
+            _cache = CacheRedis(redis.Redis.from_url(Config.REDIS_URL, socket_timeout=0.2))
+        else:
+            if Config.CACHE_BACKEND == 'redis':
+                print("Aviso: CACHE_BACKEND=redis sem o pacote redis instalado - usando cache em memória")
+            _cache = CacheMemoria(Config.CACHE_MEMORIA_MAX_MB * 1024 * 1024)
+    return _cache
+
+def estatisticas_cache():
+    return {**get_cache().estatisticas(), **metricas_cache.resumo()}
@@ -0,0 +1,137 @@
+from datetime import date, timedelta
+from functools import lru_cache
+
+# Anos cobertos pela tabela de prazos a partir do ano anterior ao atual
+ANOS_TABELA = 5
+
+# Dia de vencimento do DAS e do relatório mensal (mês seguinte ao de referência)
+DIA_VENCIMENTO_MENSAL = 20
+
+# Feriados nacionais de data fixa (mês, dia); 20/11 entra a partir de 2024 (Lei 14.759/2023)
+FERIADOS_FIXOS = ((1, 1), (4, 21), (5, 1), (9, 7), (10, 12), (11, 2), (11, 15), (12, 25))
+
+def pascoa(ano):
+    """Domingo de Páscoa (algoritmo de Meeus/Jones/Butcher, calendário gregoriano)"""
+    a = ano % 19
+    b, c = divmod(ano, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return date(ano, mes, dia + 1)
+
+@lru_cache(maxsize=32)
+def feriados_nacionais(ano):
+    """Dias sem expediente bancário no país: feriados nacionais, Carnaval e Corpus Christi"""
+    domingo_pascoa = pascoa(ano)
+    feriados = {date(ano, mes, dia) for mes, dia in FERIADOS_FIXOS}
+    if ano >= 2024:
+        feriados.add(date(ano, 11, 20))
+    feriados.update(domingo_pascoa + timedelta(days=delta) for delta in (-48, -47, -2, 60))
+    return frozenset(feriados)
+
+def dia_util(dia):
+    return dia.weekday() < 5 and dia not in feriados_nacionais(dia.year)
+
+def proximo_dia_util(dia):
+    while not dia_util(dia):
+        dia += timedelta(days=1)
+    return dia
+
+def dia_util_anterior(dia):
+    while not dia_util(dia):
+        dia -= timedelta(days=1)
+    return dia
+
+def _prazo_mensal(ano, mes):
+    # Vence no dia 20 do mês seguinte; sem expediente bancário, prorroga para o próximo dia útil
+    if mes == 12:
+        return proximo_dia_util(date(ano + 1, 1, DIA_VENCIMENTO_MENSAL))
+    return proximo_dia_util(date(ano, mes + 1, DIA_VENCIMENTO_MENSAL))
+
+def _prazo_dasn(ano_referencia):
+    # Último dia de maio do ano seguinte; se não for dia útil, o aviso considera o dia útil anterior
+    return dia_util_anterior(date(ano_referencia + 1, 5, 31))
+
+class CalendarioPrazos:
+    """Tabela pré-calculada dos prazos MEI para uma faixa de anos.
+    
+    Para cada dia da faixa guarda o próximo vencimento mensal e o próximo da DASN-SIMEI,
+    então as consultas por data são acesso direto a uma lista.
+    """
+    
+    def __init__(self, ano_inicial, anos=ANOS_TABELA):
+        self.inicio = date(ano_inicial, 1, 1)
+        fim = date(ano_inicial + anos, 1, 1)
+        anos_referencia = range(ano_inicial - 1, ano_inicial + anos)
+        
+        self.prazos_mensais = {
+            (ano, mes): _prazo_mensal(ano, mes) for ano in anos_referencia for mes in range(1, 13)
+        }
+        self.prazos_dasn = {ano: _prazo_dasn(ano) for ano in anos_referencia}
+        
+        # Próximos vencimentos de cada dia (o último prazo de cada lista fica após o fim da faixa)
+        mensais = sorted(self.prazos_mensais.values())
+        anuais = sorted(self.prazos_dasn.values())
+        self._proximos = []
+        i = j = 0
+        for indice in range((fim - self.inicio).days):
+            dia = self.inicio + timedelta(days=indice)
+            while mensais[i] < dia:
+                i += 1
+            while anuais[j] < dia:
+                j += 1
+            self._proximos.append((mensais[i], anuais[j]))
+    
+    def proximos(self, dia):
+        indice = (dia - self.inicio).days
+        if 0 <= indice < len(self._proximos):
+            return self._proximos[indice]
+        return None
+    
+    def prazo_mensal(self, ano, mes):
+        return self.prazos_mensais.get((ano, mes)) or _prazo_mensal(ano, mes)
+    
+    def prazo_dasn(self, ano_referencia):
+        return self.prazos_dasn.get(ano_referencia) or _prazo_dasn(ano_referencia)
+
+@lru_cache(maxsize=4)
+def _calendario(ano_inicial):
+    return CalendarioPrazos(ano_inicial)
+
+def get_calendario(hoje=None):
+    """Tabela compartilhada (por processo) que cobre o ano anterior e os próximos anos"""
+    hoje = hoje or date.today()
+    return _calendario(hoje.year - 1)
+
+def proximos_vencimentos(hoje=None):
+    """Próximos prazos (>= hoje) do relatório mensal, DAS e DASN-SIMEI, já ajustados a dias úteis"""
+    hoje = hoje or date.today()
+    mensal, dasn = get_calendario(hoje).proximos(hoje)
+    return {
+        'relatorio_mensal': mensal,
+        'das': mensal,
+        'dasn_simei': dasn
+    }
+
+def competencia_do_prazo(prazo):
+    """(ano, mes) de referência de um prazo mensal: o mês anterior ao do vencimento"""
+    if prazo.month == 1:
+        return prazo.year - 1, 12
+    return prazo.year, prazo.month - 1
+
+def prazo_mensal(ano, mes):
+    """Prazo do relatório mensal/DAS referente ao mês (ano, mes)"""
+    return get_calendario().prazo_mensal(ano, mes)
+
+def prazo_dasn(ano_referencia):
+    """Data do aviso da DASN-SIMEI referente ao ano informado (dia útil anterior a 31/05)"""
+    return get_calendario().prazo_dasn(ano_referencia)
+
+def prazo_legal_dasn(ano_referencia):
+    """Prazo legal da DASN-SIMEI: 31 de maio do ano seguinte (base para considerar em atraso)"""
+    return date(ano_referencia + 1, 5, 31)
@@ -0,0 +1,182 @@
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from queue import LifoQueue, Empty
+from threading import BoundedSemaphore, Lock
+from src.config import Config
+
+def montar_mensagem(remetente, destinatario, assunto, corpo_html):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = assunto
+    msg['From'] = f"MEIControl <{remetente}>"
+    msg['To'] = destinatario
+    msg.attach(MIMEText(corpo_html, 'html', 'utf-8'))
+    return msg
+
+class PoolSMTP:
+    """Conexões SMTP autenticadas reaproveitadas entre mensagens (STARTTLS + login uma vez)"""
+    
+    def __init__(self, servidor, porta, usuario=None, senha=None, usar_tls=True,
+                 tamanho=4, mensagens_por_conexao=100, timeout=30, ociosidade_maxima=60):
+        self.servidor = servidor
+        self.porta = porta
+        self.usuario = usuario
+        self.senha = senha
+        self.usar_tls = usar_tls
+        self.mensagens_por_conexao = mensagens_por_conexao
+        self.timeout = timeout
+        self.ociosidade_maxima = ociosidade_maxima
+        self._livres = LifoQueue()
+        self._vagas = BoundedSemaphore(tamanho)
+        self.conexoes_abertas = 0
+        self._lock = Lock()
+    
+    def _conectar(self):
+        smtp = smtplib.SMTP(self.servidor, self.porta, timeout=self.timeout)
+        if self.usar_tls:
+            smtp.starttls()
+        if self.usuario and self.senha:
+            smtp.login(self.usuario, self.senha)
+        with self._lock:
+            self.conexoes_abertas += 1
+        return smtp
+    
+    @staticmethod
+    def _fechar(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+    
+    def _obter(self):
+        self._vagas.acquire()
+        try:
+            while True:
+                try:
+                    smtp, enviadas, devolvida_em = self._livres.get_nowait()
+                except Empty:
+                    return self._conectar(), 0
+                
+                # Conexão parada há muito tempo pode ter sido derrubada pelo servidor
+                if time.monotonic() - devolvida_em > self.ociosidade_maxima:
+                    try:
+                        if smtp.noop()[0] != 250:
+                            raise smtplib.SMTPServerDisconnected()
+                    except smtplib.SMTPException:
+                        self._fechar(smtp)
+                        continue
+                return smtp, enviadas
+        except Exception:
+            self._vagas.release()
+            raise
+    
+    def _devolver(self, smtp, enviadas, quebrada=False):
+        try:
+            if quebrada or enviadas >= self.mensagens_por_conexao:
+                self._fechar(smtp)
+            else:
+                self._livres.put((smtp, enviadas, time.monotonic()))
+        finally:
+            self._vagas.release()
+    
+    @contextmanager
+    def conexao(self):
+        smtp, enviadas = self._obter()
+        contador = [enviadas]
+        try:
+            yield smtp, contador
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self._devolver(smtp, contador[0], quebrada=True)
+            raise
+        except Exception:
+            self._devolver(smtp, contador[0])
+            raise
+        else:
+            self._devolver(smtp, contador[0])
+    
+    def enviar(self, msg):
+        """Envia a mensagem; se a conexão reaproveitada caiu, tenta uma vez com outra"""
+        for tentativa in range(2):
+            try:
+                with self.conexao() as (smtp, contador):
+                    smtp.send_message(msg)
+                    contador[0] += 1
+                return
+            except (smtplib.SMTPServerDisconnected, OSError):
+                if tentativa == 1:
+                    raise
+    
+    def fechar(self):
+        while True:
+            try:
+                smtp, _, _ = self._livres.get_nowait()
+            except Empty:
+                return
+            self._fechar(smtp)
+
+_pool = None
+_lock_pool = Lock()
+
+def smtp_configurado():
+    """Sem senha (e com autenticação exigida) os envios são apenas simulados"""
+    return bool(Config.EMAIL_PASSWORD) or not Config.SMTP_AUTENTICAR
+
+def get_pool_smtp():
+    global _pool
+    with _lock_pool:
+        if _pool is None:
+            _pool = PoolSMTP(
+                Config.SMTP_SERVER or 'smtp.gmail.com',
+                Config.SMTP_PORT or 587,
+                usuario=Config.EMAIL_USER if Config.SMTP_AUTENTICAR else None,
+                senha=Config.EMAIL_PASSWORD if Config.SMTP_AUTENTICAR else None,
+                usar_tls=Config.SMTP_USE_TLS,
+                tamanho=Config.EMAIL_POOL_CONEXOES,
+                mensagens_por_conexao=Config.EMAIL_MENSAGENS_POR_CONEXAO
+            )
+    return _pool
+
+def remetente_padrao():
+    return Config.EMAIL_USER or 'noreply@meicontrol.com'
+
+def enviar_email(destinatario, assunto, corpo_html):
+    """Envia um email usando o pool de conexões SMTP"""
+    msg = montar_mensagem(remetente_padrao(), destinatario, assunto, corpo_html)
+    get_pool_smtp().enviar(msg)
+
+def enviar_lote_emails(mensagens, max_threads=None):
+    """Envia [(chave, destinatario, assunto, corpo_html)] concorrentemente com um pool limitado.
+
+    Retorna {chave: erro} somente para as mensagens que falharam. Com EMAIL_MOTOR=asyncio
+    (e aiosmtplib instalado) o envio é feito pelo motor assíncrono.
+    """
+    if not smtp_configurado():
+        for _, destinatario, assunto, _ in mensagens:
+            print(f"Configuração de email não encontrada - simulando envio para {destinatario}: {assunto}")
+        return {}
+    
+    from src.services.email_async import motor_async_disponivel, enviar_lote_async
+    if motor_async_disponivel():
+        return enviar_lote_async(mensagens)
+    
+    def enviar(mensagem):
+        chave, destinatario, assunto, corpo_html = mensagem
+        try:
+            enviar_email(destinatario, assunto, corpo_html)
+            return chave, None
+        except Exception as e:
+            print(f"Erro ao enviar email: {e}")
+            return chave, e
+    
+    erros = {}
+    with ThreadPoolExecutor(max_workers=max_threads or Config.EMAIL_THREADS, thread_name_prefix='envio-email') as executor:
+        for chave, erro in executor.map(enviar, mensagens):
+            if erro is not None:
+                erros[chave] = erro
+    return erros
@@ -0,0 +1,159 @@
+import asyncio
+from collections import defaultdict
+from threading import Thread, Lock
+from src.config import Config
+from src.services.email import montar_mensagem, remetente_padrao
+
+try:
+    import aiosmtplib
+except ImportError:  # aiosmtplib é opcional (apenas para EMAIL_MOTOR=asyncio)
+    aiosmtplib = None
+
+_FIM = object()
+
+class MotorEmailAsync:
+    """Envio de emails com asyncio num event loop próprio (thread em segundo plano).
+    
+    Cada worker mantém uma conexão SMTP aberta entre mensagens e lotes; a concorrência
+    total é o número de workers, e cada domínio de destino tem um limite próprio de
+    envios simultâneos. A fila entre o produtor e os workers é limitada: quem gera as
+    mensagens espera quando os workers não dão conta (backpressure).
+    """
+    
+    def __init__(self, servidor, porta, usuario=None, senha=None, usar_tls=True,
+                 concorrencia=20, por_dominio=5, tamanho_fila=1000,
+                 mensagens_por_conexao=100, timeout=30):
+        self.servidor = servidor
+        self.porta = porta
+        self.usuario = usuario
+        self.senha = senha
+        self.usar_tls = usar_tls
+        self.concorrencia = concorrencia
+        self.por_dominio = por_dominio
+        self.tamanho_fila = tamanho_fila
+        self.mensagens_por_conexao = mensagens_por_conexao
+        self.timeout = timeout
+        self.conexoes_abertas = 0
+        
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, name='motor-email', daemon=True)
+        self._thread.start()
+        
+        # Estado abaixo só é usado dentro do event loop
+        self._livres = []
+        self._dominios = defaultdict(lambda: asyncio.Semaphore(self.por_dominio))
+    
+    async def _conectar(self):
+        smtp = aiosmtplib.SMTP(
+            hostname=self.servidor, port=self.porta, timeout=self.timeout, start_tls=self.usar_tls
+        )
+        await smtp.connect()
+        if self.usuario and self.senha:
+            await smtp.login(self.usuario, self.senha)
+        self.conexoes_abertas += 1
+        return smtp
+    
+    @staticmethod
+    async def _fechar(smtp):
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+    
+    async def _enviar(self, conexao, msg):
+        """Envia pela conexão do worker ([smtp, enviadas]); reconecta uma vez se ela caiu"""
+        for tentativa in range(2):
+            if conexao[0] is None or not conexao[0].is_connected:
+                conexao[0], conexao[1] = await self._conectar(), 0
+            try:
+                await conexao[0].send_message(msg)
+            except (aiosmtplib.SMTPServerDisconnected, OSError):
+                conexao[0] = None
+                if tentativa == 1:
+                    raise
+                continue
+            
+            conexao[1] += 1
+            if conexao[1] >= self.mensagens_por_conexao:
+                await self._fechar(conexao[0])
+                conexao[0] = None
+            return
+    
+    async def _worker(self, fila, erros):
+        # Conexões sobrevivem entre lotes (drenagens da outbox chamam o motor várias vezes)
+        conexao = self._livres.pop() if self._livres else [None, 0]
+        try:
+            while True:
+                item = await fila.get()
+                if item is _FIM:
+                    return
+                
+                chave, destinatario, assunto, corpo_html = item
+                dominio = destinatario.rpartition('@')[2].lower()
+                try:
+                    async with self._dominios[dominio]:
+                        msg = montar_mensagem(remetente_padrao(), destinatario, assunto, corpo_html)
+                        await self._enviar(conexao, msg)
+                except Exception as e:
+                    print(f"Erro ao enviar email: {e}")
+                    erros[chave] = e
+        finally:
+            if conexao[0] is not None and conexao[0].is_connected:
+                self._livres.append(conexao)
+    
+    async def _enviar_lote(self, mensagens):
+        fila = asyncio.Queue(maxsize=self.tamanho_fila)
+        erros = {}
+        workers = [asyncio.create_task(self._worker(fila, erros)) for _ in range(self.concorrencia)]
+        
+        for mensagem in mensagens:
+            await fila.put(mensagem)  # espera quando a fila está cheia
+        for _ in workers:
+            await fila.put(_FIM)
+        
+        await asyncio.gather(*workers)
+        return erros
+    
+    def enviar_lote(self, mensagens):
+        """Fachada síncrona: envia [(chave, destinatario, assunto, corpo_html)] e retorna {chave: erro}.
+        
+        O iterável é consumido dentro do event loop, então não deve fazer I/O bloqueante
+        (passe uma lista ou um gerador sobre dados já carregados).
+        """
+        return asyncio.run_coroutine_threadsafe(self._enviar_lote(mensagens), self._loop).result()
+    
+    def fechar(self):
+        async def fechar_conexoes():
+            while self._livres:
+                smtp, _ = self._livres.pop()
+                await self._fechar(smtp)
+        
+        asyncio.run_coroutine_threadsafe(fechar_conexoes(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+_motor = None
+_lock_motor = Lock()
+
+def motor_async_disponivel():
+    return aiosmtplib is not None and Config.EMAIL_MOTOR == 'asyncio'
+
+def get_motor_email():
+    global _motor
+    with _lock_motor:
+        if _motor is None:
+            _motor = MotorEmailAsync(
+                Config.SMTP_SERVER or 'smtp.gmail.com',
+                Config.SMTP_PORT or 587,
+                usuario=Config.EMAIL_USER if Config.SMTP_AUTENTICAR else None,
+                senha=Config.EMAIL_PASSWORD if Config.SMTP_AUTENTICAR else None,
+                usar_tls=Config.SMTP_USE_TLS,
+                concorrencia=Config.EMAIL_CONCORRENCIA,
+                por_dominio=Config.EMAIL_CONEXOES_POR_DOMINIO,
+                tamanho_fila=Config.EMAIL_TAMANHO_FILA,
+                mensagens_por_conexao=Config.EMAIL_MENSAGENS_POR_CONEXAO
+            )
+    return _motor
+
+def enviar_lote_async(mensagens):
+    return get_motor_email().enviar_lote(mensagens)
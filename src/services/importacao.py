@@ -0,0 +1,125 @@
+import csv
+import io
+import re
+from datetime import datetime
+from itertools import chain
+from src.models.user import db
+
+# Tags OFX (SGML v1 ou XML v2), podem vir várias na mesma linha
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+def normalizar_valor(valor):
+    """Converte valores no formato brasileiro (1.234,56) para o formato decimal"""
+    valor = (valor or '').strip().replace('R$', '').strip()
+    if ',' in valor:
+        valor = valor.replace('.', '').replace(',', '.')
+    return valor
+
+def normalizar_data(data):
+    """Aceita DD/MM/AAAA (planilhas) e devolve AAAA-MM-DD; demais formatos seguem inalterados"""
+    data = (data or '').strip()
+    try:
+        return datetime.strptime(data, '%d/%m/%Y').strftime('%Y-%m-%d')
+    except ValueError:
+        return data
+
+def ler_csv(stream, campo_data, categoria_padrao=None):
+    """Lê o CSV linha a linha, gerando (numero_linha, dados) sem carregar o arquivo inteiro"""
+    texto = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    cabecalho = texto.readline()
+    if not cabecalho:
+        return
+
+    # Planilhas brasileiras costumam exportar com ';'
+    delimitador = ';' if cabecalho.count(';') > cabecalho.count(',') else ','
+    leitor = csv.DictReader(chain([cabecalho], texto), delimiter=delimitador)
+    leitor.fieldnames = [campo.strip().lower() for campo in leitor.fieldnames]
+
+    for linha in leitor:
+        yield leitor.line_num, {
+            'descricao': (linha.get('descricao') or '').strip(),
+            'valor': normalizar_valor(linha.get('valor')),
+            campo_data: normalizar_data(linha.get(campo_data) or linha.get('data')),
+            'categoria': (linha.get('categoria') or '').strip().lower() or categoria_padrao
+        }
+
+def ler_ofx(stream, campo_data, sinal, categoria_padrao):
+    """Lê transações (STMTTRN) de um extrato OFX de forma incremental.
+
+    sinal=1 importa créditos (receitas), sinal=-1 importa débitos (despesas);
+    transações do sinal oposto são ignoradas (geram None).
+    """
+    texto = io.TextIOWrapper(stream, encoding='cp1252', errors='replace')
+    transacao = None
+    numero = 0
+
+    for linha in texto:
+        for fechamento, tag, conteudo in OFX_TAG.findall(linha):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if not fechamento:
+                    transacao = {}
+                    numero += 1
+                elif transacao is not None:
+                    yield numero, _transacao_ofx(transacao, campo_data, sinal, categoria_padrao)
+                    transacao = None
+            elif transacao is not None and not fechamento:
+                transacao[tag] = conteudo.strip()
+
+def _transacao_ofx(transacao, campo_data, sinal, categoria_padrao):
+    try:
+        valor = float(normalizar_valor(transacao.get('TRNAMT')))
+    except ValueError:
+        valor = None
+
+    if valor is not None and valor * sinal <= 0:
+        return None
+
+    # DTPOSTED: AAAAMMDD[HHMMSS[.XXX]][fuso]
+    data = transacao.get('DTPOSTED', '')[:8]
+    if len(data) == 8:
+        data = f'{data[:4]}-{data[4:6]}-{data[6:]}'
+
+    return {
+        'descricao': (transacao.get('MEMO') or transacao.get('NAME') or '')[:200],
+        'valor': abs(valor) if valor is not None else transacao.get('TRNAMT'),
+        campo_data: data,
+        'categoria': categoria_padrao
+    }
+
+def importar_lancamentos(modelo, linhas, validar, user_id, tamanho_lote=1000, max_erros=1000):
+    """Valida e insere lançamentos em lotes (executemany) numa única transação.
+
+    linhas: iterável de (numero_linha, dados); dados None indica linha ignorada.
+    validar: mesma função usada pelos endpoints de criação, retorna (dados, erro).
+    O commit fica a cargo de quem chama.
+    """
+    tabela = modelo.__table__
+    lote = []
+    resumo = {'importadas': 0, 'ignoradas': 0, 'total_erros': 0, 'erros': []}
+
+    for numero_linha, dados in linhas:
+        if dados is None:
+            resumo['ignoradas'] += 1
+            continue
+
+        valido, erro = validar(dados)
+        if erro:
+            resumo['total_erros'] += 1
+            if len(resumo['erros']) < max_erros:
+                resumo['erros'].append({'linha': numero_linha, 'erro': erro})
+            continue
+
+        valido['user_id'] = user_id
+        lote.append(valido)
+
+        if len(lote) >= tamanho_lote:
+            db.session.execute(tabela.insert(), lote)
+            resumo['importadas'] += len(lote)
+            lote = []
+
+    if lote:
+        db.session.execute(tabela.insert(), lote)
+        resumo['importadas'] += len(lote)
+
+    return resumo
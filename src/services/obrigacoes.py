@@ -0,0 +1,110 @@
+from datetime import datetime
+from sqlalchemy import exists, bindparam
+from src.models.user import db, User
+from src.models.relatorio import RelatorioMensal
+from src.models.obrigacao import EstadoObrigacoes
+from src.services.banco import inserir_ignorando_duplicados
+
+TODOS_OS_MESES = (1 << 12) - 1
+
+# Linhas por INSERT multi-valores na reconstrução (limite de parâmetros por comando)
+TAMANHO_LOTE_RECONSTRUCAO = 1000
+
+def bit_mes(mes):
+    return 1 << (mes - 1)
+
+def mes_entregue(mascara, mes):
+    return bool((mascara or 0) & bit_mes(mes))
+
+def meses_entregues(mascara):
+    """Quantidade de meses com relatório na máscara"""
+    return bin((mascara or 0) & TODOS_OS_MESES).count('1')
+
+def marcar_relatorio_entregue(user_id, ano, mes):
+    """Liga o bit do mês no estado do usuário (OR atômico no banco). O commit fica com quem chama."""
+    inserir_ignorando_duplicados(EstadoObrigacoes, {
+        'user_id': user_id, 'ano': ano, 'meses_entregues': 0, 'updated_at': datetime.utcnow()
+    }, ['user_id', 'ano'])
+    
+    EstadoObrigacoes.query.filter_by(user_id=user_id, ano=ano).update({
+        'meses_entregues': EstadoObrigacoes.meses_entregues.op('|')(bit_mes(mes)),
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+
+def estado_usuario(user_id, anos):
+    """{ano: máscara} dos anos pedidos numa única consulta (anos sem linha valem 0)"""
+    estado = dict.fromkeys(anos, 0)
+    linhas = EstadoObrigacoes.query.with_entities(
+        EstadoObrigacoes.ano, EstadoObrigacoes.meses_entregues
+    ).filter(
+        EstadoObrigacoes.user_id == user_id,
+        EstadoObrigacoes.ano.in_(list(estado))
+    ).all()
+    for ano, mascara in linhas:
+        estado[ano] = mascara
+    return estado
+
+def relatorio_pendente(ano, mes):
+    """Condição SQL sobre User: relatório (ano, mes) ainda não gerado (usa a chave única user_id, ano)"""
+    return ~exists().where(
+        EstadoObrigacoes.user_id == User.id,
+        EstadoObrigacoes.ano == ano,
+        EstadoObrigacoes.meses_entregues.op('&')(bit_mes(mes)) != 0
+    ).correlate(User)
+
+def reconstruir_estado_obrigacoes(user_id=None):
+    """Recalcula as máscaras a partir de relatorios_mensais (backfill e correção de divergências).
+    
+    Upsert com OR por (user_id, ano), como em marcar_relatorio_entregue: só liga bits, então um
+    relatório gerado durante a reconstrução nunca é apagado (relatórios não são removidos).
+    """
+    query = RelatorioMensal.query.with_entities(
+        RelatorioMensal.user_id, RelatorioMensal.ano, RelatorioMensal.mes
+    ).distinct()
+    if user_id is not None:
+        query = query.filter(RelatorioMensal.user_id == user_id)
+    
+    mascaras = {}
+    for usuario, ano, mes in query:
+        mascaras[(usuario, ano)] = mascaras.get((usuario, ano), 0) | bit_mes(mes)
+    
+    # Usuários com algum bit novo: a versão dos dados muda (ETag/cache do status de obrigações)
+    atuais = EstadoObrigacoes.query.with_entities(
+        EstadoObrigacoes.user_id, EstadoObrigacoes.ano, EstadoObrigacoes.meses_entregues
+    )
+    if user_id is not None:
+        atuais = atuais.filter(EstadoObrigacoes.user_id == user_id)
+    atuais = {(usuario, ano): mascara for usuario, ano, mascara in atuais}
+    alterados = {
+        usuario for (usuario, ano), mascara in mascaras.items()
+        if mascara & ~atuais.get((usuario, ano), 0)
+    }
+    
+    agora = datetime.utcnow()
+    chaves = list(mascaras)
+    for inicio in range(0, len(chaves), TAMANHO_LOTE_RECONSTRUCAO):
+        inserir_ignorando_duplicados(EstadoObrigacoes, [
+            {'user_id': usuario, 'ano': ano, 'meses_entregues': 0, 'updated_at': agora}
+            for usuario, ano in chaves[inicio:inicio + TAMANHO_LOTE_RECONSTRUCAO]
+        ], ['user_id', 'ano'])
+    
+    if mascaras:
+        tabela = EstadoObrigacoes.__table__
+        db.session.execute(
+            tabela.update().where(
+                tabela.c.user_id == bindparam('p_user_id'),
+                tabela.c.ano == bindparam('p_ano')
+            ).values(
+                meses_entregues=tabela.c.meses_entregues.op('|')(bindparam('p_mascara')),
+                updated_at=agora
+            ),
+            [
+                {'p_user_id': usuario, 'p_ano': ano, 'p_mascara': mascara}
+                for (usuario, ano), mascara in mascaras.items()
+            ]
+        )
+    
+    from src.middleware.cache_http import marcar_dados_alterados_usuarios
+    marcar_dados_alterados_usuarios(alterados)
+    db.session.commit()
+    return len(mascaras)
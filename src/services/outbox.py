@@ -0,0 +1,119 @@
+import time
+from datetime import datetime, timedelta
+from src.models.user import db
+from src.models.notificacao import NotificacaoOutbox
+from src.services.banco import inserir_ignorando_duplicados
+from src.services.email import enviar_lote_emails
+from src.config import Config
+
+def linha_outbox(user_id, tipo, periodo, destinatario, assunto, corpo):
+    agora = datetime.utcnow()
+    return {
+        'user_id': user_id,
+        'tipo': tipo,
+        'periodo': periodo,
+        'destinatario': destinatario,
+        'assunto': assunto,
+        'corpo': corpo,
+        'status': 'pendente',
+        'tentativas': 0,
+        'proxima_tentativa_em': agora,
+        'created_at': agora
+    }
+
+def enfileirar_notificacoes(linhas):
+    """Grava avisos na outbox; (user_id, tipo, periodo) já existentes são ignorados.
+    O commit fica a cargo de quem chama (junto com o restante da transação)."""
+    inserir_ignorando_duplicados(NotificacaoOutbox, linhas, ['user_id', 'tipo', 'periodo'])
+
+def calcular_backoff(tentativas):
+    """Espera exponencial: base * 2^(tentativas-1), limitada ao máximo configurado"""
+    espera = Config.OUTBOX_BACKOFF_BASE_SEGUNDOS * (2 ** max(tentativas - 1, 0))
+    return timedelta(seconds=min(espera, Config.OUTBOX_BACKOFF_MAXIMO_SEGUNDOS))
+
+def _reservar_lote(limite, ids=None):
+    """Marca um lote como 'enviando' e faz commit (workers concorrentes não pegam o mesmo).
+    Retorna as mensagens (id, destinatario, assunto, corpo), lidas antes do commit expirar os objetos."""
+    agora = datetime.utcnow()
+    
+    # Itens presos em 'enviando' (worker caiu no meio) voltam para a fila após o lease
+    NotificacaoOutbox.query.filter(
+        NotificacaoOutbox.status == 'enviando',
+        NotificacaoOutbox.bloqueado_em < agora - timedelta(seconds=Config.OUTBOX_LEASE_SEGUNDOS)
+    ).update({'status': 'pendente'}, synchronize_session=False)
+    
+    query = NotificacaoOutbox.query.filter(
+        NotificacaoOutbox.status == 'pendente',
+        NotificacaoOutbox.proxima_tentativa_em <= agora
+    )
+    if ids is not None:
+        query = query.filter(NotificacaoOutbox.id.in_(ids))
+    
+    lote = query.order_by(NotificacaoOutbox.id).limit(limite).with_for_update(skip_locked=True).all()
+    mensagens = []
+    for item in lote:
+        item.status = 'enviando'
+        item.bloqueado_em = agora
+        mensagens.append((item.id, item.destinatario, item.assunto, item.corpo))
+    db.session.commit()
+    return mensagens
+
+def drenar_outbox(limite=None, ids=None):
+    """Envia os avisos pendentes cuja próxima tentativa já chegou.
+
+    Falhas voltam para a fila com backoff exponencial; após OUTBOX_MAX_TENTATIVAS ficam
+    como 'falhou'. Retorna estatísticas do lote, incluindo a vazão (mensagens/s).
+    """
+    limite = limite or Config.OUTBOX_LOTE
+    inicio = time.perf_counter()
+    resultado = {'enviados': 0, 'falhas': 0, 'desistencias': 0}
+    
+    mensagens = _reservar_lote(limite, ids)
+    if mensagens:
+        erros = enviar_lote_emails(mensagens)
+        
+        # Enviados marcados num único UPDATE; só os que falharam são carregados para o backoff
+        agora = datetime.utcnow()
+        enviados = [item_id for item_id, _, _, _ in mensagens if item_id not in erros]
+        if enviados:
+            NotificacaoOutbox.query.filter(NotificacaoOutbox.id.in_(enviados)).update({
+                'status': 'enviado',
+                'enviado_em': agora,
+                'ultimo_erro': None,
+                'bloqueado_em': None
+            }, synchronize_session=False)
+            resultado['enviados'] = len(enviados)
+        
+        for item_id, erro in erros.items():
+            item = db.session.get(NotificacaoOutbox, item_id)
+            item.bloqueado_em = None
+            item.tentativas += 1
+            item.ultimo_erro = str(erro)[:1000]
+            resultado['falhas'] += 1
+            if item.tentativas >= Config.OUTBOX_MAX_TENTATIVAS:
+                item.status = 'falhou'
+                resultado['desistencias'] += 1
+            else:
+                item.status = 'pendente'
+                item.proxima_tentativa_em = agora + calcular_backoff(item.tentativas)
+        db.session.commit()
+    
+    duracao = time.perf_counter() - inicio
+    resultado['duracao_segundos'] = round(duracao, 3)
+    resultado['mensagens_por_segundo'] = round(len(mensagens) / duracao, 1) if mensagens and duracao else 0
+    return resultado
+
+def drenar_outbox_completa(limite=None):
+    """Drena lotes até não haver mais avisos prontos para envio"""
+    total = {'enviados': 0, 'falhas': 0, 'desistencias': 0, 'duracao_segundos': 0}
+    while True:
+        resultado = drenar_outbox(limite)
+        for chave in total:
+            total[chave] += resultado[chave]
+        if resultado['enviados'] + resultado['falhas'] == 0:
+            break
+    total['duracao_segundos'] = round(total['duracao_segundos'], 3)
+    total['mensagens_por_segundo'] = round(
+        total['enviados'] / total['duracao_segundos'], 1
+    ) if total['duracao_segundos'] else 0
+    return total
@@ -0,0 +1,102 @@
+from datetime import datetime
+from sqlalchemy import func, select, update, literal
+from src.models.user import db
+from src.models.quota import UsoQuota
+from src.models.nota_fiscal import NotaFiscal
+from src.services.banco import inserir_ignorando_duplicados
+
+# Recurso -> chave do limite mensal na definição dos planos (-1 = ilimitado)
+LIMITES_PLANO = {
+    'notas_fiscais': 'limite_notas_fiscais'
+}
+
+def periodo_atual():
+    """Mês de referência (AAAA-MM), no mesmo relógio UTC dos created_at"""
+    return datetime.utcnow().strftime('%Y-%m')
+
+def limite_recurso(plano, recurso):
+    """Limite mensal do recurso no plano; None quando ilimitado"""
+    from src.routes.planos import PLANOS
+    limite = PLANOS.get(plano, {}).get(LIMITES_PLANO[recurso], 0)
+    return None if limite < 0 else limite
+
+def _uso_notas_fiscais(user_id, periodo):
+    """Notas enviadas no período (semeia o contador na primeira vez no mês)"""
+    inicio = datetime.strptime(periodo, '%Y-%m')
+    fim = inicio.replace(year=inicio.year + 1, month=1) if inicio.month == 12 else inicio.replace(month=inicio.month + 1)
+    return select(func.count(NotaFiscal.id)).where(
+        NotaFiscal.user_id == user_id,
+        NotaFiscal.created_at >= inicio,
+        NotaFiscal.created_at < fim
+    ).scalar_subquery()
+
+# Recurso -> expressão com o uso já existente, usada ao criar o contador do mês
+CONTADORES = {
+    'notas_fiscais': _uso_notas_fiscais
+}
+
+def _garantir_contador(user_id, recurso, periodo):
+    """Cria o contador do mês se ainda não existir (INSERT ... ON CONFLICT DO NOTHING)"""
+    contador = CONTADORES.get(recurso)
+    valores = {
+        'user_id': user_id,
+        'recurso': recurso,
+        'periodo': periodo,
+        'quantidade': contador(user_id, periodo) if contador else literal(0),
+        'updated_at': datetime.utcnow()
+    }
+    
+    inserir_ignorando_duplicados(UsoQuota, valores, ['user_id', 'recurso', 'periodo'])
+
+def consumir_quota(user_id, plano, recurso, quantidade=1):
+    """Reserva `quantidade` unidades do recurso no mês corrente, de forma atômica.
+
+    O incremento só acontece se couber no limite do plano (UPDATE condicional com
+    RETURNING), então uploads concorrentes nunca ultrapassam o limite. Faz commit
+    imediatamente para não segurar o lock da linha durante o processamento; em caso
+    de falha posterior, devolver com liberar_quota. Retorna o novo uso ou None se o
+    limite foi atingido.
+    """
+    periodo = periodo_atual()
+    limite = limite_recurso(plano, recurso)
+    _garantir_contador(user_id, recurso, periodo)
+    
+    condicao = [
+        UsoQuota.user_id == user_id,
+        UsoQuota.recurso == recurso,
+        UsoQuota.periodo == periodo
+    ]
+    if limite is not None:
+        condicao.append(UsoQuota.quantidade + quantidade <= limite)
+    
+    uso = db.session.execute(
+        update(UsoQuota)
+        .where(*condicao)
+        .values(quantidade=UsoQuota.quantidade + quantidade, updated_at=datetime.utcnow())
+        .returning(UsoQuota.quantidade)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    db.session.commit()
+    return uso
+
+def liberar_quota(user_id, recurso, quantidade=1, periodo=None):
+    """Devolve unidades consumidas (falha no upload ou exclusão no próprio mês).
+    O commit fica a cargo de quem chama."""
+    db.session.execute(
+        update(UsoQuota)
+        .where(
+            UsoQuota.user_id == user_id,
+            UsoQuota.recurso == recurso,
+            UsoQuota.periodo == (periodo or periodo_atual()),
+            UsoQuota.quantidade >= quantidade
+        )
+        .values(quantidade=UsoQuota.quantidade - quantidade, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+def uso_quota(user_id, recurso, periodo=None):
+    """Uso registrado do recurso no mês (0 se o contador ainda não existe)"""
+    uso = UsoQuota.query.with_entities(UsoQuota.quantidade).filter_by(
+        user_id=user_id, recurso=recurso, periodo=periodo or periodo_atual()
+    ).scalar()
+    return uso or 0
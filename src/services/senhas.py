@@ -0,0 +1,103 @@
+import hmac
+import time
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from werkzeug.security import generate_password_hash, check_password_hash
+from src.config import Config
+
+try:
+    from argon2 import PasswordHasher
+    from argon2.exceptions import VerificationError, InvalidHashError
+except ImportError:  # argon2-cffi é opcional
+    PasswordHasher = None
+
+ALGORITMOS = ('bcrypt', 'argon2', 'pbkdf2')
+
+def _argon2():
+    if PasswordHasher is None:
+        raise RuntimeError('argon2-cffi não instalado (pip install argon2-cffi)')
+    return PasswordHasher(
+        time_cost=Config.SENHA_ARGON2_TEMPO,
+        memory_cost=Config.SENHA_ARGON2_MEMORIA_KIB,
+        parallelism=Config.SENHA_ARGON2_PARALELISMO
+    )
+
+def _metodo_pbkdf2():
+    return f'pbkdf2:sha256:{Config.SENHA_PBKDF2_ITERACOES}'
+
+def gerar_hash(senha, algoritmo=None):
+    """Gera o hash da senha com o algoritmo e os custos configurados"""
+    algoritmo = algoritmo or Config.SENHA_ALGORITMO
+    if algoritmo == 'bcrypt':
+        salt = bcrypt.gensalt(rounds=Config.SENHA_BCRYPT_ROUNDS)
+        return bcrypt.hashpw(senha.encode('utf-8'), salt).decode('ascii')
+    if algoritmo == 'argon2':
+        return _argon2().hash(senha)
+    if algoritmo == 'pbkdf2':
+        return generate_password_hash(senha, method=_metodo_pbkdf2())
+    raise ValueError(f'Algoritmo de senha desconhecido: {algoritmo}')
+
+def verificar_senha(hash_armazenado, senha):
+    """Confere a senha contra qualquer formato suportado (bcrypt, argon2 ou Werkzeug)"""
+    if not hash_armazenado:
+        return False
+    
+    if hash_armazenado.startswith('$2'):
+        try:
+            return bcrypt.checkpw(senha.encode('utf-8'), hash_armazenado.encode('ascii'))
+        except ValueError:
+            return False
+    
+    if hash_armazenado.startswith('$argon2'):
+        try:
+            return _argon2().verify(hash_armazenado, senha)
+        except (VerificationError, InvalidHashError):
+            return False
+    
+    # Hashes legados gerados pelo Werkzeug (pbkdf2:..., scrypt:...)
+    return check_password_hash(hash_armazenado, senha)
+
+def precisa_rehash(hash_armazenado):
+    """Indica se o hash foi gerado com algoritmo ou parâmetros diferentes dos atuais"""
+    algoritmo = Config.SENHA_ALGORITMO
+    
+    if hash_armazenado.startswith('$2'):
+        rounds = int(hash_armazenado.split('$')[2])
+        return algoritmo != 'bcrypt' or rounds != Config.SENHA_BCRYPT_ROUNDS
+    
+    if hash_armazenado.startswith('$argon2'):
+        return algoritmo != 'argon2' or _argon2().check_needs_rehash(hash_armazenado)
+    
+    metodo = hash_armazenado.split('$', 1)[0]
+    return algoritmo != 'pbkdf2' or not hmac.compare_digest(metodo, _metodo_pbkdf2())
+
+def _benchmark(senha='Senha123', repeticoes=20, threads=4):
+    """Latência (ms) e verificações/s por custo: python -m src.services.senhas"""
+    cenarios = [('pbkdf2', 'SENHA_PBKDF2_ITERACOES', n) for n in (100000, 260000, 600000)]
+    cenarios += [('bcrypt', 'SENHA_BCRYPT_ROUNDS', n) for n in (10, 11, 12, 13)]
+    if PasswordHasher is not None:
+        cenarios += [('argon2', 'SENHA_ARGON2_TEMPO', n) for n in (1, 2, 3)]
+    
+    print(f'{"algoritmo":<10}{"custo":>10}{"ms/login":>12}{"logins/s (1)":>15}{f"logins/s ({threads})":>15}')
+    for algoritmo, parametro, valor in cenarios:
+        original = getattr(Config, parametro)
+        setattr(Config, parametro, valor)
+        try:
+            hash_senha = gerar_hash(senha, algoritmo)
+            
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                verificar_senha(hash_senha, senha)
+            latencia = (time.perf_counter() - inicio) / repeticoes
+            
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                inicio = time.perf_counter()
+                list(executor.map(lambda _: verificar_senha(hash_senha, senha), range(repeticoes)))
+                vazao = repeticoes / (time.perf_counter() - inicio)
+        finally:
+            setattr(Config, parametro, original)
+        
+        print(f'{algoritmo:<10}{valor:>10}{latencia * 1000:>12.1f}{1 / latencia:>15.1f}{vazao:>15.1f}')
+
+if __name__ == '__main__':
+    _benchmark()
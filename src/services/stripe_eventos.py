@@ -0,0 +1,160 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db, User
+from src.models.evento_stripe import EventoStripe
+from src.config import Config
+
+def registrar_evento(evento):
+    """Grava o evento na caixa de entrada; False se já recebido (reenvio do Stripe).
+    Faz commit imediatamente para o webhook responder o quanto antes."""
+    try:
+        db.session.add(EventoStripe(
+            stripe_id=evento['id'],
+            tipo=evento['type'],
+            payload=json.dumps(evento)
+        ))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def _data_evento(evento):
+    return datetime.utcfromtimestamp(evento.get('created') or datetime.utcnow().timestamp()).date()
+
+def _usuario_por_cliente(objeto):
+    customer = objeto.get('customer')
+    if not customer:
+        return None
+    return User.query.filter_by(stripe_customer_id=customer).first()
+
+def _evento_mais_recente(user, evento):
+    """Marca o evento como o último aplicado ao status do usuário, se não for mais antigo que ele.
+    
+    O Stripe não garante a ordem de entrega: uma falha de pagamento atrasada não pode
+    sobrescrever um pagamento mais novo (nem um checkout antigo trocar o plano atual).
+    """
+    criado = evento.get('created')
+    if criado is None:
+        return True
+    if user.stripe_ultimo_evento is not None and criado < user.stripe_ultimo_evento:
+        return False
+    user.stripe_ultimo_evento = criado
+    return True
+
+def _validar_plano(plano):
+    from src.routes.planos import PLANOS
+    if plano not in PLANOS:
+        raise ValueError(f'Plano desconhecido no metadata do checkout: {plano}')
+    return plano
+
+def _prorrogar(user, vencimento):
+    # Nunca reduzir o vencimento: eventos podem chegar fora de ordem ou repetidos
+    if user.data_vencimento is None or vencimento > user.data_vencimento:
+        user.data_vencimento = vencimento
+
+def _checkout_concluido(evento):
+    sessao = evento['data']['object']
+    metadata = sessao.get('metadata') or {}
+    user = User.query.get(int(metadata['user_id'])) if metadata.get('user_id') else None
+    if user is None:
+        return None
+    
+    plano = _validar_plano(metadata['plano']) if metadata.get('plano') else None
+    if sessao.get('customer'):
+        user.stripe_customer_id = sessao['customer']
+    if _evento_mais_recente(user, evento):
+        if plano:
+            user.plano = plano
+        user.status_pagamento = 'ativo'
+    _prorrogar(user, _data_evento(evento) + timedelta(days=30))
+    return user
+
+def _fatura_paga(evento):
+    fatura = evento['data']['object']
+    user = _usuario_por_cliente(fatura)
+    if user is None:
+        return None
+    
+    linhas = (fatura.get('lines') or {}).get('data') or []
+    fim_periodo = linhas[0].get('period', {}).get('end') if linhas else None
+    vencimento = (
+        datetime.utcfromtimestamp(fim_periodo).date() if fim_periodo
+        else _data_evento(evento) + timedelta(days=30)
+    )
+    if _evento_mais_recente(user, evento):
+        user.status_pagamento = 'ativo'
+    _prorrogar(user, vencimento)
+    return user
+
+def _fatura_falhou(evento):
+    user = _usuario_por_cliente(evento['data']['object'])
+    if user is not None and _evento_mais_recente(user, evento):
+        user.status_pagamento = 'inadimplente'
+    return user
+
+def _assinatura_cancelada(evento):
+    user = _usuario_por_cliente(evento['data']['object'])
+    if user is not None and _evento_mais_recente(user, evento):
+        user.status_pagamento = 'cancelado'
+    return user
+
+# Tipo de evento -> handler (devolve o usuário alterado ou None); demais tipos são ignorados
+HANDLERS = {
+    'checkout.session.completed': _checkout_concluido,
+    'invoice.paid': _fatura_paga,
+    'invoice.payment_succeeded': _fatura_paga,
+    'invoice.payment_failed': _fatura_falhou,
+    'customer.subscription.deleted': _assinatura_cancelada,
+}
+
+def consulta_eventos_pendentes(tamanho_lote):
+    """Próximos eventos pendentes em ordem de chegada, travados sem esperar pelos de outro worker"""
+    return EventoStripe.query.filter_by(status='pendente').order_by(
+        EventoStripe.id
+    ).limit(tamanho_lote).with_for_update(skip_locked=True)
+
+def processar_eventos_stripe(tamanho_lote=None, max_tentativas=None):
+    """Processa um lote de eventos pendentes em ordem de chegada, numa transação.
+
+    Cada evento roda num savepoint: uma falha não desfaz os demais, apenas incrementa
+    tentativas (após max_tentativas o evento fica com status 'erro'). Com PostgreSQL,
+    workers concorrentes não pegam os mesmos eventos (FOR UPDATE SKIP LOCKED).
+    Retorna o número de eventos processados com sucesso.
+    """
+    from src.middleware.auth import invalidar_cache_usuario
+    from src.services.tokens import revogar_tokens_usuario
+    
+    tamanho_lote = tamanho_lote or Config.STRIPE_EVENTOS_LOTE
+    max_tentativas = max_tentativas or Config.STRIPE_EVENTOS_MAX_TENTATIVAS
+    
+    eventos = consulta_eventos_pendentes(tamanho_lote).all()
+    
+    processados = 0
+    alterados = set()
+    for evento in eventos:
+        handler = HANDLERS.get(evento.tipo)
+        try:
+            with db.session.begin_nested():
+                user = handler(json.loads(evento.payload)) if handler else None
+                if user is not None:
+                    user.updated_at = datetime.utcnow()
+                    alterados.add(user.id)
+            evento.status = 'processado'
+            evento.processado_em = datetime.utcnow()
+            evento.erro = None
+            processados += 1
+        except Exception as e:
+            evento.tentativas += 1
+            evento.erro = str(e)[:1000]
+            if evento.tentativas >= max_tentativas:
+                evento.status = 'erro'
+    
+    for user_id in alterados:
+        revogar_tokens_usuario(user_id)
+    db.session.commit()
+    
+    for user_id in alterados:
+        invalidar_cache_usuario(user_id)
+    return processados
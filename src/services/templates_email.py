@@ -0,0 +1,170 @@
+from functools import lru_cache
+from html import escape
+from string import Template
+
+# Estilo e moldura comuns a todos os emails (um único lugar para alterar a identidade visual)
+ESTILO = '''
+                    body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f5f5f5; }
+                    .container { max-width: 600px; margin: 0 auto; background-color: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
+                    .header { background-color: #1a2332; color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; margin: -30px -30px 30px -30px; }
+                    .alert { background-color: #dc2626; color: white; padding: 15px; border-radius: 5px; margin: 20px 0; text-align: center; }
+                    .info { background-color: #374151; color: white; padding: 15px; border-radius: 5px; margin: 20px 0; }
+                    .button { background-color: #dc2626; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; display: inline-block; margin: 20px 0; }
+                    .footer { text-align: center; margin-top: 30px; color: #666; font-size: 12px; }
+'''
+
+LAYOUT = '''
+            <html>
+            <head>
+                <style>%(estilo)s                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <div class="header">
+                        <h1>MEIControl</h1>
+                        <p>Sistema de Gestão Financeira para MEI</p>
+                    </div>
+
+                    <div class="alert">
+                        <h2>%(titulo)s</h2>
+                    </div>
+
+                    <p>Olá, <strong>$nome</strong>!</p>
+                    %(conteudo)s
+                    <div style="text-align: center;">
+                        <a href="%(link)s" class="button">%(botao)s</a>
+                    </div>
+
+                    <div class="footer">
+                        <p>Este é um email automático do sistema MEIControl.</p>
+                        <p>Para cancelar estes lembretes, acesse suas configurações na plataforma.</p>
+                    </div>
+                </div>
+            </body>
+            </html>
+            '''
+
+# Conteúdo específico de cada alerta (placeholders no formato $variavel; "R$$" é o "R$" literal)
+ALERTAS = {
+    'relatorio_mensal': {
+        'assunto': '🚨 Lembrete: Relatório Mensal MEI - Prazo até $prazo',
+        'titulo': '⚠️ ATENÇÃO: Relatório Mensal Pendente',
+        'link': 'https://meicontrol.com/login',
+        'botao': 'Acessar MEIControl',
+        'conteudo': '''
+                    <p>Este é um lembrete importante sobre suas obrigações como MEI:</p>
+
+                    <div class="info">
+                        <h3>📋 Relatório Mensal de Receitas Brutas</h3>
+                        <p><strong>Mês de referência:</strong> $mes_referencia</p>
+                        <p><strong>Prazo para entrega:</strong> $prazo</p>
+                        <p><strong>Dias restantes:</strong> $dias_restantes dias</p>
+                    </div>
+
+                    <p>O relatório mensal deve ser preenchido até o dia 20 de cada mês. O não cumprimento desta obrigação pode resultar em multas e complicações com a Receita Federal.</p>
+                    '''
+    },
+    'das': {
+        'assunto': '💰 Lembrete: Pagamento DAS MEI - Vence em $prazo',
+        'titulo': '💰 LEMBRETE: Pagamento DAS MEI',
+        'link': 'https://www8.receita.fazenda.gov.br/SimplesNacional/Aplicacoes/ATSPO/pgmei.app/Identificacao',
+        'botao': 'Gerar DAS no Portal do Empreendedor',
+        'conteudo': '''
+                    <p>Não se esqueça de pagar o DAS (Documento de Arrecadação do Simples Nacional) do seu MEI:</p>
+
+                    <div class="info">
+                        <h3>📄 DAS MEI</h3>
+                        <p><strong>Mês de referência:</strong> $mes_referencia</p>
+                        <p><strong>Vencimento:</strong> $prazo</p>
+                        <p><strong>Dias restantes:</strong> $dias_restantes dias</p>
+                        <p><strong>Valor aproximado:</strong> R$$ 70,60 (valor pode variar)</p>
+                    </div>
+
+                    <p>O DAS deve ser pago mensalmente até o dia 20. Atraso no pagamento gera multa e juros.</p>
+                    '''
+    },
+    'dasn_simei': {
+        'assunto': '📊 Lembrete: DASN-SIMEI $ano - Prazo até 31/05',
+        'titulo': '📊 IMPORTANTE: Declaração Anual DASN-SIMEI',
+        'link': 'https://meicontrol.com/login',
+        'botao': 'Gerar Relatório no MEIControl',
+        'conteudo': '''
+                    <p>É hora de entregar sua Declaração Anual do Simples Nacional (DASN-SIMEI):</p>
+
+                    <div class="info">
+                        <h3>📋 DASN-SIMEI $ano</h3>
+                        <p><strong>Ano de referência:</strong> $ano</p>
+                        <p><strong>Prazo para entrega:</strong> 31 de maio de $ano_seguinte</p>
+                        <p><strong>Dias restantes:</strong> $dias_restantes dias</p>
+                    </div>
+
+                    <p>A DASN-SIMEI é obrigatória para todos os MEIs e deve ser entregue anualmente até 31 de maio. Use o MEIControl para gerar automaticamente os dados necessários!</p>
+                    '''
+    }
+}
+
+TIPO_PADRAO = 'relatorio_mensal'
+
+# Marcador do nome do destinatário no corpo pré-renderizado (não aparece em dados legítimos)
+_MARCADOR_NOME = '\x00'
+
+def _compilar(definicao):
+    """Monta o documento completo uma única vez: (Template do assunto, Template do corpo, variáveis)"""
+    corpo = Template(LAYOUT % {
+        'estilo': ESTILO,
+        'titulo': definicao['titulo'],
+        'conteudo': definicao['conteudo'],
+        'link': definicao['link'],
+        'botao': definicao['botao']
+    })
+    assunto = Template(definicao['assunto'])
+    variaveis = tuple(sorted(
+        (set(corpo.get_identifiers()) | set(assunto.get_identifiers())) - {'nome', 'ano_seguinte'}
+    ))
+    return assunto, corpo, variaveis
+
+# Templates analisados na importação do módulo
+TEMPLATES = {tipo: _compilar(definicao) for tipo, definicao in ALERTAS.items()}
+
+@lru_cache(maxsize=256)
+def _pre_renderizar(tipo, valores):
+    """Renderiza tudo exceto o nome do destinatário; retorna (assunto, antes_do_nome, depois_do_nome)"""
+    assunto, corpo, variaveis = TEMPLATES[tipo]
+    dados = {chave: escape(str(valor)) for chave, valor in zip(variaveis, valores)}
+    if 'ano' in dados:
+        dados['ano_seguinte'] = int(dados['ano']) + 1
+
+    antes, depois = corpo.substitute(dados, nome=_MARCADOR_NOME).split(_MARCADOR_NOME)
+    return assunto.substitute(dados), antes, depois
+
+def renderizar_alerta(tipo_alerta, nome, dados_alerta):
+    """Renderiza (assunto, corpo_html) de um alerta.
+
+    Só o template solicitado é renderizado, e a parte comum a todos os destinatários
+    fica em cache por (tipo, valores usados pelo template): no envio em massa cada
+    email custa apenas a concatenação com o nome.
+    """
+    tipo = tipo_alerta if tipo_alerta in TEMPLATES else TIPO_PADRAO
+    variaveis = TEMPLATES[tipo][2]
+    assunto, antes, depois = _pre_renderizar(tipo, tuple(dados_alerta[chave] for chave in variaveis))
+    return assunto, antes + escape(nome or '') + depois
+
+def estatisticas_cache_templates():
+    info = _pre_renderizar.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'tamanho': info.currsize}
+
+def _benchmark(destinatarios=100000):
+    """Vazão de renderização para um envio em massa (python -m src.services.templates_email)"""
+    import time
+
+    dados_alerta = {'mes_referencia': '10/2026', 'prazo': '20/10/2026', 'dias_restantes': 5, 'ano': 2025}
+    for tipo in TEMPLATES:
+        _pre_renderizar.cache_clear()
+        inicio = time.perf_counter()
+        for i in range(destinatarios):
+            renderizar_alerta(tipo, f'Usuário {i}', dados_alerta)
+        duracao = time.perf_counter() - inicio
+        print(f'{tipo}: {destinatarios} emails em {duracao:.3f}s ({destinatarios / duracao:,.0f} emails/s)')
+
+if __name__ == '__main__':
+    _benchmark()
@@ -0,0 +1,277 @@
+import hashlib
+import hmac
+import time
+import uuid
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+from threading import Lock
+import jwt
+from src.models.user import db
+from src.models.token import RefreshToken, RevogacaoToken
+from src.config import Config
+
+@lru_cache(maxsize=4)
+def _interpretar_chaves(configuracao):
+    chaves = {}
+    for item in filter(None, (parte.strip() for parte in configuracao.split(','))):
+        kid, segredo = item.split(':', 1)
+        chaves[kid.strip()] = segredo.strip()
+    return chaves
+
+def chaves_jwt():
+    """kid -> segredo a partir de JWT_CHAVES ('kid1:segredo1,kid2:segredo2').
+
+    Para rotacionar: incluir a chave nova, apontar JWT_KID_ATIVO para ela e remover a
+    antiga depois que os tokens assinados com ela expirarem.
+    """
+    return _interpretar_chaves(Config.JWT_CHAVES or '')
+
+def chave_por_kid(kid, tipo='acesso'):
+    """Segredo para o kid do header; tokens sem kid (legados) usam SECRET_KEY.
+    Refresh tokens usam uma chave derivada e não são aceitos como access token."""
+    if kid is None:
+        segredo = Config.SECRET_KEY
+    else:
+        segredo = chaves_jwt().get(kid)
+        if segredo is None:
+            raise jwt.InvalidTokenError('kid desconhecido')
+    
+    if tipo == 'refresh':
+        return hmac.new(segredo.encode('utf-8'), b'refresh', hashlib.sha256).hexdigest()
+    return segredo
+
+def _assinar(payload, tipo):
+    kid = Config.JWT_KID_ATIVO if chaves_jwt() else None
+    headers = {'kid': kid} if kid else None
+    return jwt.encode(payload, chave_por_kid(kid, tipo), algorithm='HS256', headers=headers)
+
+def decodificar_jwt(token, tipo='acesso'):
+    """Valida assinatura/expiração com a chave do kid; levanta jwt.InvalidTokenError"""
+    kid = jwt.get_unverified_header(token).get('kid')
+    return jwt.decode(token, chave_por_kid(kid, tipo), algorithms=['HS256'])
+
+def claims_usuario(user):
+    """Campos de autorização embutidos no access token"""
+    return {
+        'is_active': bool(user.is_active),
+        'is_admin': bool(user.is_admin),
+        'plano': user.plano,
+        'status_pagamento': user.status_pagamento,
+        'data_vencimento': user.data_vencimento.isoformat() if user.data_vencimento else None
+    }
+
+def dados_principal(payload):
+    """Tupla no formato de UsuarioAutenticado.CAMPOS a partir das claims; None em tokens legados"""
+    if payload.get('tipo') != 'acesso':
+        return None
+    vencimento = payload.get('data_vencimento')
+    return (
+        payload['user_id'],
+        payload['is_active'],
+        payload['is_admin'],
+        payload['plano'],
+        payload['status_pagamento'],
+        date.fromisoformat(vencimento) if vencimento else None
+    )
+
+def emitir_token_acesso(user):
+    agora = int(time.time())
+    payload = {
+        'user_id': user.id,
+        'tipo': 'acesso',
+        'jti': str(uuid.uuid4()),
+        'iat': agora,
+        'exp': agora + Config.JWT_ACESSO_MINUTOS * 60
+    }
+    payload.update(claims_usuario(user))
+    return _assinar(payload, 'acesso')
+
+def emitir_refresh_token(user, familia=None):
+    """Emite e registra um refresh token (o commit fica a cargo de quem chama)"""
+    jti = str(uuid.uuid4())
+    familia = familia or jti
+    expira_em = datetime.utcnow() + timedelta(days=Config.JWT_REFRESH_DIAS)
+    
+    db.session.add(RefreshToken(user_id=user.id, jti=jti, familia=familia, expira_em=expira_em))
+    return _assinar({
+        'user_id': user.id,
+        'tipo': 'refresh',
+        'jti': jti,
+        'familia': familia,
+        'iat': int(time.time()),
+        'exp': expira_em
+    }, 'refresh')
+
+def emitir_tokens(user, familia=None):
+    """Par access + refresh no formato devolvido por login, register e refresh"""
+    return {
+        'token': emitir_token_acesso(user),
+        'refresh_token': emitir_refresh_token(user, familia),
+        'expires_in': Config.JWT_ACESSO_MINUTOS * 60
+    }
+
+def decodificar_refresh_token(token):
+    """Levanta jwt.InvalidTokenError se o token não for um refresh token válido"""
+    payload = decodificar_jwt(token, 'refresh')
+    if payload.get('tipo') != 'refresh':
+        raise jwt.InvalidTokenError('Tipo de token inválido')
+    return payload
+
+def rotacionar_refresh_token(payload):
+    """Marca o refresh token como usado (UPDATE condicional, seguro sob concorrência).
+
+    Retorna a família para emitir o próximo par, ou None se o token já foi trocado ou
+    revogado; reuso de um token trocado indica roubo e revoga a família inteira.
+    O commit fica a cargo de quem chama.
+    """
+    agora = datetime.utcnow()
+    atualizados = RefreshToken.query.filter(
+        RefreshToken.jti == payload['jti'],
+        RefreshToken.usado_em.is_(None),
+        RefreshToken.revogado.is_(False),
+        RefreshToken.expira_em > agora
+    ).update({'usado_em': agora}, synchronize_session=False)
+    
+    if atualizados:
+        return payload['familia']
+    
+    revogar_familia(payload['familia'])
+    return None
+
+def revogar_familia(familia):
+    RefreshToken.query.filter_by(familia=familia).update(
+        {'revogado': True}, synchronize_session=False
+    )
+
+def limpar_tokens_expirados():
+    """Remove refresh tokens e revogações vencidos (para ser chamada periodicamente)"""
+    agora = datetime.utcnow()
+    removidos = RefreshToken.query.filter(RefreshToken.expira_em <= agora).delete(synchronize_session=False)
+    removidos += RevogacaoToken.query.filter(RevogacaoToken.expira_em <= agora).delete(synchronize_session=False)
+    db.session.commit()
+    lista_revogacao.limpar_expirados()
+    return removidos
+
+class ListaRevogacao:
+    """Conjunto de revogações em memória: bloom filter + TTL por jti e corte por usuário.
+
+    A consulta é feita sem banco; a tabela revogacoes_token só é lida periodicamente
+    (a cada JWT_REVOGACAO_SINCRONIA_SEGUNDOS) para receber revogações de outros workers.
+    """
+    
+    def __init__(self, bits, funcoes_hash):
+        if funcoes_hash < 1:
+            raise ValueError('JWT_REVOGACAO_BLOOM_HASHES deve ser pelo menos 1')
+        self.bits = bits
+        self.funcoes_hash = funcoes_hash
+        self._filtro = bytearray(bits // 8)
+        self._jtis = {}        # jti -> exp (epoch)
+        self._usuarios = {}    # user_id -> revogado_antes (epoch)
+        self._vistas = {}      # id -> created_at das revogações já aplicadas dentro da janela
+        self._ultima_criacao = None
+        self._ultima_sincronia = 0
+        self._lock = Lock()
+    
+    def _posicoes(self, jti):
+        # Hashing duplo (Kirsch-Mitzenmacher): h1 + i*h2 gera quantas funções forem configuradas
+        digest = hashlib.sha256(jti.encode('utf-8')).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        for i in range(self.funcoes_hash):
+            yield (h1 + i * h2) % self.bits
+    
+    def _adicionar_filtro(self, jti):
+        for posicao in self._posicoes(jti):
+            self._filtro[posicao // 8] |= 1 << (posicao % 8)
+    
+    def _talvez_no_filtro(self, jti):
+        return all(self._filtro[p // 8] & (1 << (p % 8)) for p in self._posicoes(jti))
+    
+    def adicionar_jti(self, jti, exp):
+        with self._lock:
+            self._jtis[jti] = exp
+            self._adicionar_filtro(jti)
+    
+    def revogar_usuario(self, user_id, revogado_antes):
+        with self._lock:
+            if revogado_antes > self._usuarios.get(user_id, 0):
+                self._usuarios[user_id] = revogado_antes
+    
+    def revogado(self, payload):
+        if payload.get('iat', 0) < self._usuarios.get(payload['user_id'], 0):
+            return True
+        
+        jti = payload.get('jti')
+        if not jti or not self._talvez_no_filtro(jti):
+            return False
+        # Filtro indicou presença: confirmar no TTL store (elimina falsos positivos)
+        return jti in self._jtis
+    
+    def limpar_expirados(self):
+        """Descarta jtis expirados e reconstrói o filtro (bloom não suporta remoção)"""
+        agora = time.time()
+        with self._lock:
+            self._jtis = {jti: exp for jti, exp in self._jtis.items() if exp > agora}
+            self._filtro = bytearray(self.bits // 8)
+            for jti in self._jtis:
+                self._adicionar_filtro(jti)
+            # Cortes mais antigos que a vida de um access token não afetam mais nada
+            limite = agora - Config.JWT_ACESSO_MINUTOS * 60
+            self._usuarios = {u: t for u, t in self._usuarios.items() if t > limite}
+    
+    def sincronizar(self, forcar=False):
+        """Carrega revogações novas da tabela (no máximo uma consulta por intervalo).
+        
+        Os ids (SERIAL) não chegam em ordem de commit entre transações concorrentes, então
+        cada leitura relê uma janela de JWT_REVOGACAO_MARGEM_SEGUNDOS antes da revogação mais
+        recente já vista e ignora as que já foram aplicadas.
+        """
+        agora = time.monotonic()
+        if not forcar and agora - self._ultima_sincronia < Config.JWT_REVOGACAO_SINCRONIA_SEGUNDOS:
+            return
+        self._ultima_sincronia = agora
+        
+        query = RevogacaoToken.query.filter(RevogacaoToken.expira_em > datetime.utcnow())
+        if self._ultima_criacao is not None:
+            corte = self._ultima_criacao - timedelta(seconds=Config.JWT_REVOGACAO_MARGEM_SEGUNDOS)
+            query = query.filter(RevogacaoToken.created_at >= corte)
+        
+        for revogacao in query.all():
+            if revogacao.id in self._vistas:
+                continue
+            if revogacao.jti:
+                self.adicionar_jti(revogacao.jti, (revogacao.expira_em - datetime(1970, 1, 1)).total_seconds())
+            if revogacao.user_id and revogacao.revogado_antes:
+                self.revogar_usuario(revogacao.user_id, revogacao.revogado_antes)
+            self._vistas[revogacao.id] = revogacao.created_at
+            if self._ultima_criacao is None or revogacao.created_at > self._ultima_criacao:
+                self._ultima_criacao = revogacao.created_at
+        
+        # Fora da janela nenhuma linha volta a ser lida: esquecer os ids
+        if self._ultima_criacao is not None:
+            corte = self._ultima_criacao - timedelta(seconds=Config.JWT_REVOGACAO_MARGEM_SEGUNDOS)
+            self._vistas = {id_: criada for id_, criada in self._vistas.items() if criada >= corte}
+        
+        if len(self._jtis) > Config.JWT_REVOGACAO_BLOOM_BITS // 16:
+            self.limpar_expirados()
+
+lista_revogacao = ListaRevogacao(Config.JWT_REVOGACAO_BLOOM_BITS, Config.JWT_REVOGACAO_BLOOM_HASHES)
+
+def token_revogado(payload):
+    lista_revogacao.sincronizar()
+    return lista_revogacao.revogado(payload)
+
+def revogar_token_acesso(payload):
+    """Revoga um access token até a sua expiração (o commit fica a cargo de quem chama)"""
+    expira_em = datetime.utcfromtimestamp(payload['exp'])
+    db.session.add(RevogacaoToken(jti=payload['jti'], user_id=payload['user_id'], expira_em=expira_em))
+    lista_revogacao.adicionar_jti(payload['jti'], payload['exp'])
+
+def revogar_tokens_usuario(user_id):
+    """Invalida todos os access tokens já emitidos para o usuário (desativação, troca de
+    plano/status): o cliente precisa usar o refresh token para receber claims novas.
+    O commit fica a cargo de quem chama."""
+    agora = int(time.time())
+    expira_em = datetime.utcnow() + timedelta(minutes=Config.JWT_ACESSO_MINUTOS)
+    db.session.add(RevogacaoToken(user_id=user_id, revogado_antes=agora, expira_em=expira_em))
+    lista_revogacao.revogar_usuario(user_id, agora)
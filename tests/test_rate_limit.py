@@ -0,0 +1,71 @@
+import pytest
+import fakeredis
+from flask import Flask
+from redis.exceptions import ConnectionError
+from src.config import Config
+from src.middleware import rate_limit
+from src.middleware.rate_limit import BaldesMemoria, BaldesRedis, limitar_taxa
+
+@pytest.fixture
+def servidor():
+    return fakeredis.FakeServer()
+
+@pytest.fixture
+def baldes(servidor):
+    return BaldesRedis(fakeredis.FakeRedis(server=servidor))
+
+def test_redis_esvazia_balde_e_informa_espera(baldes):
+    resultados = [baldes.consumir('login:ip:1', 3, 1.0) for _ in range(4)]
+    
+    assert [permitido for permitido, _ in resultados] == [True, True, True, False]
+    assert resultados[-1][1] == pytest.approx(1.0, abs=0.05)
+
+def test_redis_compartilha_balde_entre_workers(servidor):
+    worker_a = BaldesRedis(fakeredis.FakeRedis(server=servidor))
+    worker_b = BaldesRedis(fakeredis.FakeRedis(server=servidor))
+    
+    assert worker_a.consumir('login:email:x', 2, 0.1)[0]
+    assert worker_b.consumir('login:email:x', 2, 0.1)[0]
+    assert not worker_a.consumir('login:email:x', 2, 0.1)[0]
+    assert not worker_b.consumir('login:email:x', 2, 0.1)[0]
+
+def test_redis_chaves_independentes_e_com_ttl(baldes):
+    assert baldes.consumir('a', 1, 0.5)[0]
+    assert not baldes.consumir('a', 1, 0.5)[0]
+    assert baldes.consumir('b', 1, 0.5)[0]
+    
+    ttl_ms = baldes.cliente.pttl('rl:a')
+    assert 0 < ttl_ms <= 2000
+
+def test_redis_fora_do_ar_usa_baldes_do_processo(servidor):
+    baldes = BaldesRedis(fakeredis.FakeRedis(server=servidor))
+    servidor.connected = False
+    
+    assert baldes.consumir('login:ip:1', 1, 0.01)[0]
+    assert not baldes.consumir('login:ip:1', 1, 0.01)[0]
+
+def test_memoria_divide_limites_entre_workers():
+    baldes = BaldesMemoria(workers=4)
+    
+    permitidos = sum(baldes.consumir('login:ip:1', 20, 1.0)[0] for _ in range(20))
+    assert permitidos == 5
+    
+    # Nunca abaixo de uma ficha por worker
+    assert BaldesMemoria(workers=4).consumir('x', 2, 1.0)[0]
+
+def test_decorator_responde_429_com_retry_after(monkeypatch, baldes):
+    monkeypatch.setattr(Config, 'RATE_LIMIT_ATIVO', True)
+    monkeypatch.setattr(rate_limit, '_baldes', baldes)
+    
+    app = Flask(__name__)
+    
+    @app.route('/login', methods=['POST'])
+    @limitar_taxa('login', ('ip', '2/1'), ('email', '5/1'))
+    def login():
+        return {'ok': True}
+    
+    cliente = app.test_client()
+    respostas = [cliente.post('/login', json={'email': 'A@b.com'}) for _ in range(3)]
+    
+    assert [r.status_code for r in respostas] == [200, 200, 429]
+    assert int(respostas[-1].headers['Retry-After']) >= 1
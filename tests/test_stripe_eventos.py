@@ -0,0 +1,128 @@
+import hashlib
+import hmac
+import json
+import time
+from datetime import date
+from pathlib import Path
+import pytest
+from sqlalchemy.dialects import postgresql
+from src.config import Config
+from src.models.user import db, User
+from src.models.evento_stripe import EventoStripe
+from src.services.stripe_eventos import processar_eventos_stripe, consulta_eventos_pendentes
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'stripe'
+SEGREDO = 'whsec_teste_meicontrol'
+
+def carregar_evento(nome):
+    return json.loads((FIXTURES / f'{nome}.json').read_text())
+
+def assinar(payload, segredo=SEGREDO, timestamp=None):
+    """Cabeçalho Stripe-Signature (t=...,v1=HMAC-SHA256 de "t.payload")"""
+    timestamp = timestamp or int(time.time())
+    assinatura = hmac.new(segredo.encode(), f'{timestamp}.'.encode() + payload, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={assinatura}'
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', 'sqlite://')
+    monkeypatch.setattr(Config, 'STRIPE_WEBHOOK_SECRET', SEGREDO)
+    from src.main import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def usuario(app):
+    user = User(email='mei@exemplo.com.br', nome='MEI Teste', cnpj='12345678000190', plano='basico',
+                status_pagamento='pendente')
+    user.set_password('Senha123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def enviar(app, evento, segredo=SEGREDO):
+    payload = json.dumps(evento).encode()
+    return app.test_client().post(
+        '/api/planos/webhook-stripe', data=payload,
+        headers={'Stripe-Signature': assinar(payload, segredo), 'Content-Type': 'application/json'}
+    )
+
+def test_webhook_confirma_e_grava_evento(app):
+    resposta = enviar(app, carregar_evento('checkout_session_completed'))
+    
+    assert resposta.status_code == 200
+    evento = EventoStripe.query.one()
+    assert (evento.stripe_id, evento.tipo, evento.status) == (
+        'evt_1PkQ2rLz8mYc3aBdT0xkR7Wd', 'checkout.session.completed', 'pendente'
+    )
+
+def test_webhook_rejeita_assinatura_invalida(app):
+    resposta = enviar(app, carregar_evento('invoice_paid'), segredo='whsec_outro')
+    
+    assert resposta.status_code == 400
+    assert EventoStripe.query.count() == 0
+
+def test_webhook_ignora_reenvio_e_tipos_sem_handler(app):
+    evento = carregar_evento('invoice_paid')
+    desconhecido = dict(evento, id='evt_desconhecido', type='customer.updated')
+    
+    assert [enviar(app, e).status_code for e in (evento, evento, desconhecido)] == [200, 200, 200]
+    assert EventoStripe.query.count() == 1
+
+def test_processa_checkout_e_fatura(app, usuario):
+    enviar(app, carregar_evento('checkout_session_completed'))
+    enviar(app, carregar_evento('invoice_paid'))
+    
+    assert processar_eventos_stripe() == 2
+    user = db.session.get(User, usuario.id)
+    assert (user.plano, user.status_pagamento, user.stripe_customer_id) == ('avancado', 'ativo', 'cus_QbXh2kQd1LmZ9a')
+    assert user.data_vencimento == date(2024, 10, 5)  # fim do período da fatura
+    assert {e.status for e in EventoStripe.query} == {'processado'}
+    assert processar_eventos_stripe() == 0
+
+def test_evento_atrasado_nao_sobrescreve_status_mais_novo(app, usuario):
+    # A falha (04/09) chega depois do pagamento (05/09) que a resolveu
+    enviar(app, carregar_evento('checkout_session_completed'))
+    enviar(app, carregar_evento('invoice_paid'))
+    enviar(app, carregar_evento('invoice_payment_failed'))
+    
+    assert processar_eventos_stripe() == 3
+    user = db.session.get(User, usuario.id)
+    assert user.status_pagamento == 'ativo'
+    assert user.stripe_ultimo_evento == carregar_evento('invoice_paid')['created']
+    
+    enviar(app, carregar_evento('customer_subscription_deleted'))
+    processar_eventos_stripe()
+    assert db.session.get(User, usuario.id).status_pagamento == 'cancelado'
+
+def test_plano_desconhecido_fica_pendente_com_erro(app, usuario):
+    evento = carregar_evento('checkout_session_completed')
+    evento['data']['object']['metadata']['plano'] = 'ilimitado'
+    enviar(app, evento)
+    
+    assert processar_eventos_stripe(max_tentativas=2) == 0
+    registro = EventoStripe.query.one()
+    assert (registro.status, registro.tentativas) == ('pendente', 1)
+    assert 'ilimitado' in registro.erro
+    assert db.session.get(User, usuario.id).plano == 'basico'
+    
+    processar_eventos_stripe(max_tentativas=2)
+    assert EventoStripe.query.one().status == 'erro'
+
+def test_lote_respeita_tamanho_e_ordem_de_chegada(app, usuario):
+    for nome in ('checkout_session_completed', 'invoice_paid', 'customer_subscription_deleted'):
+        enviar(app, carregar_evento(nome))
+    
+    assert processar_eventos_stripe(tamanho_lote=2) == 2
+    assert [e.status for e in EventoStripe.query.order_by(EventoStripe.id)] == ['processado', 'processado', 'pendente']
+
+def test_consulta_pendentes_pula_eventos_travados(app):
+    sql = str(consulta_eventos_pendentes(10).statement.compile(dialect=postgresql.dialect()))
+    
+    assert 'FOR UPDATE SKIP LOCKED' in sql
+    assert 'ORDER BY eventos_stripe.id' in sql